@@ -1,23 +1,24 @@
 package com.app.sixtyseven
 
-import android.util.Base64
 import android.util.Log
 import kotlinx.coroutines.Dispatchers
 import kotlinx.coroutines.withContext
 import okhttp3.MediaType.Companion.toMediaType
+import okhttp3.MultipartBody
 import okhttp3.OkHttpClient
 import okhttp3.Request
 import okhttp3.RequestBody.Companion.toRequestBody
 import okhttp3.logging.HttpLoggingInterceptor
 import org.json.JSONObject
 import java.io.IOException
+import java.util.UUID
 import java.util.concurrent.TimeUnit
 
 /**
  * HTTP client for the SixSeven (67) API.
  * 
- * Endpoint: POST /v1/command
- * Content-Type: application/json
+ * Endpoints: POST /v1/command (application/json) and
+ * POST /v1/command/upload (multipart/form-data, when an image is attached)
  */
 class ApiClient(private val baseUrl: String) {
     
@@ -56,35 +57,50 @@ class ApiClient(private val baseUrl: String) {
      * @param commandText The voice command text (e.g., "research quantum computing")
      * @param imageBytes Optional JPEG image bytes
      * @param sessionId Session identifier
+     * @param idempotencyKey One key per user action; pass the same key when
+     *        re-sending that action so the server creates only one job
      */
     suspend fun sendCommand(
         commandText: String,
         imageBytes: ByteArray? = null,
-        sessionId: String = "android-67-app"
+        sessionId: String = "android-67-app",
+        idempotencyKey: String = UUID.randomUUID().toString()
     ): CommandResponse {
         return withContext(Dispatchers.IO) {
             try {
-                val jsonBody = JSONObject().apply {
-                    put("command_text", commandText)
-                    put("session_id", sessionId)
+                Log.d(TAG, "Sending command: $commandText, image: ${imageBytes?.size ?: 0} bytes")
+                
+                val request = if (imageBytes != null && imageBytes.isNotEmpty()) {
+                    // Send the JPEG as a binary part instead of base64 JSON
+                    val multipartBody = MultipartBody.Builder()
+                        .setType(MultipartBody.FORM)
+                        .addFormDataPart("command_text", commandText)
+                        .addFormDataPart("session_id", sessionId)
+                        .addFormDataPart(
+                            "image",
+                            "frame.jpg",
+                            imageBytes.toRequestBody("image/jpeg".toMediaType())
+                        )
+                        .build()
                     
-                    // Add base64 image if provided
-                    if (imageBytes != null && imageBytes.isNotEmpty()) {
-                        val base64Image = Base64.encodeToString(imageBytes, Base64.NO_WRAP)
-                        put("image_base64", base64Image)
+                    Request.Builder()
+                        .url("$baseUrl/v1/command/upload")
+                        .header("Idempotency-Key", idempotencyKey)
+                        .post(multipartBody)
+                        .build()
+                } else {
+                    val jsonBody = JSONObject().apply {
+                        put("command_text", commandText)
+                        put("session_id", sessionId)
                     }
+                    
+                    Request.Builder()
+                        .url("$baseUrl/v1/command")
+                        .header("Idempotency-Key", idempotencyKey)
+                        .post(jsonBody.toString().toRequestBody("application/json".toMediaType()))
+                        .build()
                 }
                 
-                Log.d(TAG, "Sending command: $commandText, image: ${imageBytes?.size ?: 0} bytes")
-                
-                val requestBody = jsonBody.toString()
-                    .toRequestBody("application/json".toMediaType())
-                
-                val request = Request.Builder()
-                    .url("$baseUrl/v1/command")
-                    .post(requestBody)
-                    .build()
-                
                 client.newCall(request).execute().use { response ->
                     val body = response.body?.string() ?: ""
                     Log.d(TAG, "Response: ${response.code} - $body")
@@ -24,6 +24,7 @@ import kotlinx.coroutines.launch
 import java.text.SimpleDateFormat
 import java.util.Date
 import java.util.Locale
+import java.util.UUID
 
 class MainActivity : AppCompatActivity() {
     
@@ -410,6 +411,9 @@ class MainActivity : AppCompatActivity() {
             }
             log("🔍 Intent: $intent")
             
+            // One key for this voice command, reused if it is sent again
+            val idempotencyKey = UUID.randomUUID().toString()
+            
             if (isResearch) {
                 // RESEARCH: Voice only, no photo needed
                 log("📤 Sending research command (no photo)...")
@@ -417,7 +421,8 @@ class MainActivity : AppCompatActivity() {
                 
                 val response = apiClient.sendCommand(
                     commandText = command,
-                    imageBytes = null
+                    imageBytes = null,
+                    idempotencyKey = idempotencyKey
                 )
                 
                 log("📥 Response: ${response.intent}")
@@ -466,7 +471,8 @@ class MainActivity : AppCompatActivity() {
                     speaker.speak("Creating image")
                     val response = apiClient.sendCommand(
                         commandText = command,
-                        imageBytes = imageBytes
+                        imageBytes = imageBytes,
+                        idempotencyKey = idempotencyKey
                     )
                     
                     log("📥 Response: ${response.intent}")
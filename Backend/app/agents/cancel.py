@@ -1,5 +1,4 @@
 from typing import Optional
-from app.models import Job
 from app.store import JobStore
 import logging
 
@@ -33,15 +32,11 @@ class CancellationAgent:
         if not job:
             return None
         
-        if job.status in ["succeeded", "failed", "cancelled"]:
+        # Set cancellation flag; the running agent picks it up from the store
+        job, cancelled = self.store.modify_job(job.job_id, lambda j: j.cancel("Job cancelled by user"))
+        if not cancelled:
             return None
         
-        # Set cancellation flag
-        job.cancelled = True
-        job.status = "cancelled"
-        job.add_event("info", "Job cancelled by user")
-        self.store.update_job(job)
-        
         logger.info(f"Job {job.job_id} cancelled")
         
         return job.job_id
@@ -1,10 +1,13 @@
 import os
 import time
-import asyncio
 from typing import Dict, Any, Optional
-from app.models import Job
+from app.records import JobRecord, JobStatus
 from app.store import JobStore
-from app.utils.http import http_post_with_retry, http_get_with_retry
+from app.blobs import BlobStore, blob_store
+from app.utils.http import http_post_with_retry, http_get_with_retry, default_retry_policy, poll_retry_policy
+from app.utils.images import MIN_IMAGE_BYTES, InvalidImageError, encode_base64_image, prepare_image
+from app.scheduler import poll_scheduler
+from app.webhooks import webhook_url, poll_policy
 from app.observability import get_logger
 
 logger = get_logger(__name__)
@@ -13,137 +16,129 @@ logger = get_logger(__name__)
 class CreativeAgent:
     """Freepik Creative Agent - generates images using Seedream 4.5 Edit."""
     
-    def __init__(self, store: JobStore, observer=None):
+    def __init__(self, store: JobStore, observer=None, blobs: Optional[BlobStore] = None):
         self.store = store
         self.observer = observer
+        self.blobs = blobs or blob_store
         self.api_key = os.getenv("FREEPIK_API_KEY", "")
         self.base_url = "https://api.freepik.com/v1/ai/text-to-image/seedream-v4-5-edit"
+        # Image generation usually finishes within seconds: start at 1.5s, back off to 10s
+        self.poll_policy = poll_policy(initial=1.5, max_interval=10.0)
+        self.create_retry = default_retry_policy
+        self.poll_retry = poll_retry_policy
+        # Unchanged poll results are saved at most this often (SSE still sees every poll)
+        self.heartbeat_interval = float(os.getenv("HEARTBEAT_SAVE_SECONDS", "10"))
     
-    async def execute(self, job: Job, image_base64: Optional[str], 
+    async def execute(self, job: JobRecord, image_ref: Optional[str],
                      imagination: str = "vivid", aspect_ratio: str = "original"):
-        """Execute creative workflow."""
-        job.status = "running"
+        """Execute creative workflow for an image held in the blob store."""
+        job.status = JobStatus.RUNNING
         job.add_event("info", "Creative task started")
-        self.store.update_job(job)
+        self.store.save_job(job)
+        if job.cancelled:
+            # Cancelled just before a worker picked it up
+            return
         
         logger.info("creative_started", job_id=job.job_id, prompt=job.input.query_or_prompt[:100])
         
         try:
-            if not image_base64:
-                job.status = "failed"
+            if not image_ref:
+                job.status = JobStatus.FAILED
                 job.error = {"message": "No image provided for creative task"}
                 job.add_event("error", "No image provided")
-                self.store.update_job(job)
+                self.store.save_job(job)
                 logger.error("creative_no_image", job_id=job.job_id)
                 return
             
-            # Validate image size (base64 length gives rough estimate)
-            # A 1x1 pixel PNG is ~100 chars, 512x512 JPEG is typically 50KB+ (70K+ base64)
-            if len(image_base64) < 10000:  # Less than ~7KB
-                job.status = "failed"
+            image = self.blobs.get(image_ref)
+            if image is None:
+                job.status = JobStatus.FAILED
+                job.error = {"message": "Image is no longer available, please send it again"}
+                job.add_event("error", "Image evicted from blob store")
+                self.store.save_job(job)
+                logger.error("creative_image_missing", job_id=job.job_id, image_ref=image_ref)
+                return
+            
+            # Validate image size - a 512x512 JPEG is typically 50KB+
+            if len(image) < MIN_IMAGE_BYTES:
+                job.status = JobStatus.FAILED
                 job.error = {
                     "message": "Image too small or invalid",
-                    "details": f"Image base64 length: {len(image_base64)} chars. Minimum recommended: 10000 chars (~7KB). Please provide a real image (at least 512x512 pixels)."
+                    "details": f"Image size: {len(image)} bytes. Minimum recommended: {MIN_IMAGE_BYTES} bytes (~7KB). Please provide a real image (at least 512x512 pixels)."
                 }
                 job.add_event("error", "Image validation failed: too small")
-                self.store.update_job(job)
-                logger.error("creative_image_too_small", job_id=job.job_id, base64_length=len(image_base64))
+                self.store.save_job(job)
+                logger.error("creative_image_too_small", job_id=job.job_id, image_bytes=len(image))
                 return
             
+            # Downscale to what Seedream can use before uploading
+            original_bytes = len(image)
+            try:
+                image = await prepare_image(image, aspect_ratio)
+            except InvalidImageError as e:
+                job.status = JobStatus.FAILED
+                job.error = {"message": "Image could not be decoded", "details": str(e)}
+                job.add_event("error", "Image validation failed: undecodable")
+                self.store.save_job(job)
+                logger.error("creative_image_invalid", job_id=job.job_id, error=str(e))
+                return
+            if len(image) != original_bytes:
+                job.add_event("info", "Image downscaled", {
+                    "original_bytes": original_bytes,
+                    "image_bytes": len(image)
+                })
+            
             # Call Freepik API
             start_time = time.time()
             result = await self._generate_image(
-                image_base64, 
+                image, 
                 job.input.query_or_prompt,
                 imagination,
                 aspect_ratio
             )
             api_duration = time.time() - start_time
+            # Only the blob ref stays alive while the task is polled
+            del image
             
             if self.observer:
                 self.observer.external_api_call("freepik", "generate_image", api_duration, not result.get("error"))
             
             if result.get("error"):
-                job.status = "failed"
+                job.status = JobStatus.FAILED
                 job.error = {
                     "message": "Failed to generate image",
                     "details": result.get("message", "Unknown error"),
-                    "status_code": result.get("status_code"),
-                    "payload": str(result)[:1000]  # Increased from 500 to see more
+                    "status_code": result.get("status_code")
                 }
                 job.add_event("error", "Image generation failed", result)
-                self.store.update_job(job)
+                self.store.save_job(job)
                 logger.error("creative_failed", job_id=job.job_id, error=result, status_code=result.get("status_code"))
                 return
             
             # Check if response is async (CREATED/IN_PROGRESS)
-            status = result.get("status", "").upper()
-            
-            # Also check data.status
-            if "data" in result and "status" in result["data"]:
-                status = result["data"]["status"].upper()
-            
-            task_id = result.get("task_id") or (result.get("data", {}).get("task_id"))
+            status = result.get("status", "")
+            task_id = result.get("task_id")
             
             if status in ["CREATED", "IN_PROGRESS", "PENDING"]:
-                # Async response - poll for completion
+                # Async response - checkpoint the provider task so a restart
+                # can re-attach to it, then poll for completion
+                job.provider_task_id = task_id
                 job.add_event("info", f"Creative task async: {status}", {"status": status, "task_id": task_id})
+                self.store.save_job(job)
                 logger.info("creative_async", job_id=job.job_id, status=status, task_id=task_id)
                 
-                # Poll until completion
-                poll_result = await self._poll_task(job, task_id)
-                
-                if job.cancelled:
-                    job.status = "cancelled"
-                    job.add_event("info", "Creative task cancelled")
-                    self.store.update_job(job)
-                    logger.info("creative_cancelled", job_id=job.job_id)
-                    return
-                
-                if poll_result.get("error"):
-                    job.status = "failed"
-                    job.error = {
-                        "message": "Creative task failed during polling",
-                        "details": poll_result.get("message", "Unknown error"),
-                        "freepik_status": poll_result.get("status"),
-                        "full_response": str(poll_result.get("full_response", {}))[:1000]
-                    }
-                    job.add_event("error", "Creative task failed", poll_result)
-                    self.store.update_job(job)
-                    logger.error("creative_poll_failed", job_id=job.job_id, error=poll_result)
-                    return
-                
-                # Extract URLs from poll result
-                generated_urls = self._extract_urls(poll_result)
-                
-                job.status = "succeeded"
-                job.progress = 100
-                job.result = {
-                    "task_id": task_id,
-                    "status": "COMPLETED",
-                    "generated_urls": generated_urls,
-                    "full_response": poll_result
-                }
-                job.add_event("info", "Creative task succeeded", {
-                    "url_count": len(generated_urls)
-                })
-                logger.info(
-                    "creative_succeeded",
-                    job_id=job.job_id,
-                    url_count=len(generated_urls),
-                    api_duration=api_duration
-                )
+                await self._await_result(job, task_id, api_duration)
+                return
             else:
                 # Synchronous response or already completed - extract URLs
                 generated_urls = self._extract_urls(result)
                 
-                job.status = "succeeded"
+                job.status = JobStatus.SUCCEEDED
                 job.progress = 100
                 job.result = {
                     "task_id": task_id,
                     "status": status or "COMPLETED",
-                    "generated_urls": generated_urls,
-                    "full_response": result
+                    "generated_urls": generated_urls
                 }
                 job.add_event("info", "Creative task succeeded", {
                     "url_count": len(generated_urls)
@@ -155,16 +150,79 @@ class CreativeAgent:
                     api_duration=api_duration
                 )
             
-            self.store.update_job(job)
+            self.store.save_job(job)
             
         except Exception as e:
             logger.error("creative_error", job_id=job.job_id, error=str(e), exc_info=True)
-            job.status = "failed"
+            job.status = JobStatus.FAILED
+            job.error = {"message": str(e)}
+            job.add_event("error", f"Unexpected error: {str(e)}")
+            self.store.save_job(job)
+    
+    async def resume(self, job: JobRecord):
+        """Re-attach to the checkpointed Freepik task after a restart."""
+        task_id = job.provider_task_id
+        job.status = JobStatus.RUNNING
+        job.add_event("info", f"Creative task resumed: {task_id}", {"task_id": task_id})
+        self.store.save_job(job)
+        
+        logger.info("creative_resumed", job_id=job.job_id, task_id=task_id)
+        
+        try:
+            await self._await_result(job, task_id)
+        except Exception as e:
+            logger.error("creative_error", job_id=job.job_id, error=str(e), exc_info=True)
+            job.status = JobStatus.FAILED
             job.error = {"message": str(e)}
             job.add_event("error", f"Unexpected error: {str(e)}")
-            self.store.update_job(job)
+            self.store.save_job(job)
+    
+    async def _await_result(self, job: JobRecord, task_id: str, api_duration: Optional[float] = None):
+        """Poll an async Freepik task and record its outcome on the job."""
+        # Poll until completion
+        poll_result = await self._poll_task(job, task_id)
+        
+        if job.cancelled or self.store.is_cancelled(job.job_id):
+            job.status = JobStatus.CANCELLED
+            job.add_event("info", "Creative task cancelled")
+            self.store.save_job(job)
+            logger.info("creative_cancelled", job_id=job.job_id)
+            return
+        
+        if poll_result.get("error"):
+            job.status = JobStatus.FAILED
+            job.error = {
+                "message": "Creative task failed during polling",
+                "details": poll_result.get("message", "Unknown error"),
+                "freepik_status": poll_result.get("status")
+            }
+            job.add_event("error", "Creative task failed", poll_result)
+            self.store.save_job(job)
+            logger.error("creative_poll_failed", job_id=job.job_id, error=poll_result)
+            return
+        
+        # Extract URLs from poll result
+        generated_urls = self._extract_urls(poll_result)
+        
+        job.status = JobStatus.SUCCEEDED
+        job.progress = 100
+        job.result = {
+            "task_id": task_id,
+            "status": "COMPLETED",
+            "generated_urls": generated_urls
+        }
+        job.add_event("info", "Creative task succeeded", {
+            "url_count": len(generated_urls)
+        })
+        self.store.save_job(job)
+        logger.info(
+            "creative_succeeded",
+            job_id=job.job_id,
+            url_count=len(generated_urls),
+            api_duration=api_duration
+        )
     
-    async def _generate_image(self, image_base64: str, prompt: str,
+    async def _generate_image(self, image: bytes, prompt: str,
                              imagination: str, aspect_ratio: str) -> Dict[str, Any]:
         """Call Freepik Seedream 4.5 Edit API."""
         headers = {
@@ -187,64 +245,69 @@ class CreativeAgent:
         
         seedream_aspect_ratio = aspect_ratio_map.get(aspect_ratio, "square_1_1")
         
-        # Clean base64 string - remove data URI prefix if present
-        clean_base64 = image_base64
-        if image_base64.startswith('data:'):
-            # Remove "data:image/jpeg;base64," or similar prefix
-            clean_base64 = image_base64.split(',', 1)[1] if ',' in image_base64 else image_base64
+        # Freepik only takes JSON, so this is the one place the image is base64-encoded
+        image_base64 = encode_base64_image(image)
         
         logger.info(
             "freepik_request",
             prompt_length=len(prompt),
-            image_base64_length=len(clean_base64),
-            aspect_ratio=seedream_aspect_ratio,
-            has_data_uri_prefix=image_base64.startswith('data:')
+            image_bytes=len(image),
+            aspect_ratio=seedream_aspect_ratio
         )
         
         payload = {
             "prompt": prompt,
-            "reference_images": [clean_base64],
+            "reference_images": [image_base64],
             "aspect_ratio": seedream_aspect_ratio,
             "enable_safety_checker": True
         }
         
-        return await http_post_with_retry(self.base_url, headers, payload, timeout=60.0)
+        callback_url = webhook_url("freepik")
+        if callback_url:
+            payload["webhook_url"] = callback_url
+        
+        return await http_post_with_retry(self.base_url, headers, payload, timeout=60.0,
+                                          retry=self.create_retry, project=self._project_task)
     
-    async def _poll_task(self, job: Job, task_id: str) -> Dict[str, Any]:
-        """Poll Freepik task until completion."""
+    async def _poll_task(self, job: JobRecord, task_id: str) -> Dict[str, Any]:
+        """Poll Freepik task until completion via the shared poll scheduler."""
         headers = {
             "x-freepik-api-key": self.api_key
         }
         
         poll_url = f"{self.base_url}/{task_id}"
         poll_count = 0
+        poll_started = time.time()
+        last_saved = 0.0
         
-        while not job.cancelled:
-            await asyncio.sleep(3.0)  # Poll every 3 seconds
-            poll_count += 1
-            
+        async def fetch() -> Dict[str, Any]:
             start_time = time.time()
-            result = await http_get_with_retry(poll_url, headers)
+            result = await http_get_with_retry(poll_url, headers, retry=self.poll_retry,
+                                               project=self._project_task)
             poll_duration = time.time() - start_time
             
             if self.observer:
                 self.observer.external_api_call("freepik", "poll_task", poll_duration, not result.get("error"))
+            return result
+        
+        def handle(result: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+            nonlocal poll_count, last_saved
+            poll_count += 1
             
             if result.get("error"):
+                # Rate limited, briefly unavailable or circuit open: poll again later
+                if result.get("status_code") in (429, 503) or result.get("circuit_open"):
+                    return None
                 return result
             
-            # Check status in response
-            status = result.get("status", "").upper()
-            if "data" in result and "status" in result["data"]:
-                status = result["data"]["status"].upper()
+            status = result.get("status", "")
             
-            elapsed = poll_count * 3.0
+            elapsed = time.time() - poll_started
             
-            job.add_event("info", f"Polling update: {status}", {
-                "status": status,
-                "elapsed_seconds": int(elapsed)
-            })
-            self.store.update_job(job)
+            changed = job.beat(status, int(elapsed))
+            if changed or time.monotonic() - last_saved >= self.heartbeat_interval:
+                self.store.save_job(job)
+                last_saved = time.monotonic()
             
             if self.observer:
                 self.observer.job_progress(job, None, f"Status: {status}, elapsed: {int(elapsed)}s")
@@ -254,47 +317,56 @@ class CreativeAgent:
                 logger.info("creative_poll_completed", job_id=job.job_id, poll_count=poll_count)
                 return result
             elif status in ["FAILED", "ERROR"]:
-                # Get more error details from Freepik response
-                error_msg = (
-                    result.get("error_message") or 
-                    result.get("message") or
-                    result.get("data", {}).get("error_message") or
-                    result.get("data", {}).get("message") or
-                    "Task failed"
-                )
+                error_msg = result.get("error_message") or "Task failed"
                 error_details = {
                     "error": True,
                     "message": error_msg,
-                    "status": status,
-                    "full_response": result
+                    "status": status
                 }
                 logger.error(
-                    "creative_poll_failed", 
-                    job_id=job.job_id, 
+                    "creative_poll_failed",
+                    job_id=job.job_id,
                     error_msg=error_msg,
-                    freepik_status=status,
-                    full_response=str(result)[:500]
+                    freepik_status=status
                 )
                 return error_details
             
             # Continue polling for CREATED/IN_PROGRESS/PENDING
+            return None
         
-        return {"error": True, "message": "Task cancelled"}
+        return await poll_scheduler.poll(
+            "freepik", task_id, fetch, handle,
+            is_cancelled=lambda: job.cancelled or self.store.is_cancelled(job.job_id),
+            policy=self.poll_policy
+        )
     
     def _extract_urls(self, result: Dict[str, Any]) -> list:
-        """Extract image URLs from Freepik Seedream response."""
-        urls = []
-        
-        # Seedream returns data.generated array
-        if "data" in result and "generated" in result["data"]:
-            generated = result["data"]["generated"]
-            if isinstance(generated, list):
-                urls.extend(generated)
+        """Image URLs from a projected Freepik response."""
+        return list(result.get("generated", []))
+    
+    @staticmethod
+    def _project_task(raw: Any) -> Dict[str, Any]:
+        """Keep only the Freepik task fields the agent reads."""
+        if not isinstance(raw, dict):
+            return {}
+        data = raw.get("data") if isinstance(raw.get("data"), dict) else {}
         
-        # Also check top-level generated field
-        if "generated" in result:
-            generated = result["generated"]
-            if isinstance(generated, list):
-                urls.extend(generated)
+        # Seedream returns data.generated; also accept a top-level array
+        generated = []
+        for source in (data.get("generated"), raw.get("generated")):
+            if isinstance(source, list):
+                generated.extend(source)
         
-        return urls
+        fields = {
+            "task_id": raw.get("task_id") or data.get("task_id"),
+            "status": (data.get("status") or raw.get("status") or "").upper(),
+            "generated": generated,
+            "error_message": (
+                raw.get("error_message") or
+                raw.get("message") or
+                data.get("error_message") or
+                data.get("message")
+            ),
+            "eta_seconds": raw.get("eta_seconds") or data.get("eta_seconds")
+        }
+        return {key: value for key, value in fields.items() if value is not None}
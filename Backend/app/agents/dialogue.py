@@ -1,11 +1,11 @@
 from typing import Dict, Any, Optional
-from app.models import Job
+from app.records import JobRecord
 
 
 class DialogueAgent:
     """Turns internal job results into speakable summaries and structured JSON."""
     
-    def format_research_result(self, job: Job) -> Dict[str, Any]:
+    def format_research_result(self, job: JobRecord) -> Dict[str, Any]:
         """Format research job result into speakable + structured output."""
         if not job.result:
             return {
@@ -42,7 +42,7 @@ class DialogueAgent:
             }
         }
     
-    def format_creative_result(self, job: Job) -> Dict[str, Any]:
+    def format_creative_result(self, job: JobRecord) -> Dict[str, Any]:
         """Format creative job result into speakable + structured output."""
         if not job.result:
             return {
@@ -68,7 +68,7 @@ class DialogueAgent:
             }
         }
     
-    def format_error(self, job: Job) -> str:
+    def format_error(self, job: JobRecord) -> str:
         """Format error into speakable message."""
         if not job.error:
             return "An unknown error occurred."
@@ -76,7 +76,7 @@ class DialogueAgent:
         error_msg = job.error.get("message", "An error occurred")
         return f"Task failed: {error_msg}"
     
-    def format_status_message(self, active_job: Optional[Job]) -> str:
+    def format_status_message(self, active_job: Optional[JobRecord]) -> str:
         """Format status into speakable message."""
         if not active_job:
             return "No active tasks."
@@ -1,10 +1,12 @@
-import asyncio
 import os
 import time
-from typing import Dict, Any
-from app.models import Job
+from typing import Dict, Any, Optional
+from app.records import JobRecord, JobStatus
 from app.store import JobStore
-from app.utils.http import http_post_with_retry, http_get_with_retry
+from app.research_cache import CacheKey, ResearchCache, research_cache
+from app.utils.http import http_post_with_retry, http_get_with_retry, default_retry_policy, poll_retry_policy
+from app.scheduler import poll_scheduler
+from app.webhooks import webhook_url, poll_policy
 from app.observability import get_logger
 
 logger = get_logger(__name__)
@@ -13,97 +15,162 @@ logger = get_logger(__name__)
 class ResearchAgent:
     """Yutori Research Agent - creates and polls research tasks."""
     
-    def __init__(self, store: JobStore, observer=None):
+    def __init__(self, store: JobStore, observer=None, cache: Optional[ResearchCache] = None):
         self.store = store
         self.observer = observer
+        self.cache = cache or research_cache
         self.api_key = os.getenv("YUTORI_API_KEY", "")
         self.base_url = "https://api.yutori.com/v1/research/tasks"
+        # Research takes minutes: start at 2s, back off to 20s
+        self.poll_policy = poll_policy(initial=2.0, max_interval=20.0)
+        self.create_retry = default_retry_policy
+        self.poll_retry = poll_retry_policy
+        # Unchanged poll results are saved at most this often (SSE still sees every poll)
+        self.heartbeat_interval = float(os.getenv("HEARTBEAT_SAVE_SECONDS", "10"))
     
-    async def execute(self, job: Job, timezone: str = "America/Los_Angeles"):
+    async def execute(self, job: JobRecord, timezone: str = "America/Los_Angeles"):
         """Execute research workflow."""
-        job.status = "running"
+        job.status = JobStatus.RUNNING
         job.add_event("info", "Research task started")
-        self.store.update_job(job)
+        self.store.save_job(job)
+        if job.cancelled:
+            # Cancelled just before a worker picked it up
+            return
         
         logger.info("research_started", job_id=job.job_id, query=job.input.query_or_prompt[:100])
         
         try:
-            # Create Yutori task
+            cache_key = self.cache.key(job.input.query_or_prompt, timezone)
+            cached = self.cache.get(cache_key)
+            if cached is not None:
+                if self.observer:
+                    self.observer.research_cache("hit", job)
+                job.status = JobStatus.SUCCEEDED
+                job.progress = 100
+                job.result = dict(cached)
+                job.add_event("info", "Research result served from cache", {"task_id": cached.get("task_id")})
+                self.store.save_job(job)
+                logger.info("research_cache_hit", job_id=job.job_id, task_id=cached.get("task_id"))
+                return
+            
+            # Create Yutori task, or join an identical one already running
             start_time = time.time()
-            task_data = await self._create_task(job.input.query_or_prompt, timezone)
+            task_data, coalesced = await self.cache.join(
+                cache_key,
+                lambda: self._create_task(job.input.query_or_prompt, timezone)
+            )
             create_duration = time.time() - start_time
             
             if self.observer:
-                self.observer.external_api_call("yutori", "create_task", create_duration, not task_data.get("error"))
+                self.observer.research_cache("coalesced" if coalesced else "miss", job)
+                if not coalesced:
+                    self.observer.external_api_call("yutori", "create_task", create_duration, not task_data.get("error"))
             
             if task_data.get("error"):
-                job.status = "failed"
+                job.status = JobStatus.FAILED
                 job.error = {
                     "message": "Failed to create research task",
                     "details": task_data.get("message", "Unknown error")
                 }
                 job.add_event("error", "Failed to create research task", task_data)
-                self.store.update_job(job)
+                self.store.save_job(job)
                 logger.error("research_create_failed", job_id=job.job_id, error=task_data)
                 return
             
             task_id = task_data.get("id") or task_data.get("task_id")
-            job.add_event("info", f"Research task created: {task_id}", {"task_id": task_id})
-            self.store.update_job(job)
-            
-            logger.info("research_task_created", job_id=job.job_id, task_id=task_id)
-            
-            # Poll until completion
-            result = await self._poll_task(job, task_id)
+            # Checkpoint the provider task so a restart can re-attach to it
+            job.provider_task_id = task_id
+            if coalesced:
+                job.add_event("info", f"Joined running research task: {task_id}", {"task_id": task_id})
+            else:
+                job.add_event("info", f"Research task created: {task_id}", {"task_id": task_id})
+            self.store.save_job(job)
             
-            if job.cancelled:
-                job.status = "cancelled"
-                job.add_event("info", "Research task cancelled")
-                self.store.update_job(job)
-                logger.info("research_cancelled", job_id=job.job_id)
-                return
+            logger.info("research_task_created", job_id=job.job_id, task_id=task_id, coalesced=coalesced)
             
-            if result.get("error"):
-                job.status = "failed"
-                job.error = {
-                    "message": "Research task failed",
-                    "details": result.get("message", "Unknown error")
-                }
-                job.add_event("error", "Research task failed", result)
-                self.store.update_job(job)
-                logger.error("research_failed", job_id=job.job_id, error=result)
-                return
-            
-            # Extract structured result - Yutori returns it in 'structured_result' field
-            structured_result = result.get("structured_result", {})
-            markdown_result = result.get("result")  # Markdown format
-            
-            job.status = "succeeded"
-            job.progress = 100
-            job.result = {
-                "task_id": task_id,
-                "view_url": result.get("view_url"),
-                "structured_result": structured_result,
-                "markdown_result": markdown_result
-            }
-            job.add_event("info", "Research task succeeded")
-            self.store.update_job(job)
-            
-            logger.info(
-                "research_succeeded",
-                job_id=job.job_id,
-                task_id=task_id,
-                has_answer=bool(structured_result.get("answer")),
-                bullet_count=len(structured_result.get("bullets", [])),
-                citation_count=len(structured_result.get("citations", []))
-            )
+            try:
+                await self._await_result(job, task_id, cache_key)
+            finally:
+                self.cache.leave(cache_key, task_id)
             
         except Exception as e:
             logger.error("research_error", job_id=job.job_id, error=str(e), exc_info=True)
-            job.status = "failed"
+            job.status = JobStatus.FAILED
+            job.error = {"message": str(e)}
+            job.add_event("error", f"Unexpected error: {str(e)}")
+            self.store.save_job(job)
+    
+    async def resume(self, job: JobRecord):
+        """Re-attach to the checkpointed Yutori task after a restart."""
+        task_id = job.provider_task_id
+        job.status = JobStatus.RUNNING
+        job.add_event("info", f"Research task resumed: {task_id}", {"task_id": task_id})
+        self.store.save_job(job)
+        
+        logger.info("research_resumed", job_id=job.job_id, task_id=task_id)
+        
+        timezone = job.input.params.get("timezone", "America/Los_Angeles")
+        cache_key = self.cache.key(job.input.query_or_prompt, timezone)
+        self.cache.attach(cache_key, task_id)
+        try:
+            await self._await_result(job, task_id, cache_key)
+        except Exception as e:
+            logger.error("research_error", job_id=job.job_id, error=str(e), exc_info=True)
+            job.status = JobStatus.FAILED
             job.error = {"message": str(e)}
             job.add_event("error", f"Unexpected error: {str(e)}")
-            self.store.update_job(job)
+            self.store.save_job(job)
+        finally:
+            self.cache.leave(cache_key, task_id)
+    
+    async def _await_result(self, job: JobRecord, task_id: str, cache_key: Optional[CacheKey] = None):
+        """Poll a created Yutori task and record its outcome on the job."""
+        # Poll until completion
+        result = await self._poll_task(job, task_id)
+        
+        if job.cancelled or self.store.is_cancelled(job.job_id):
+            job.status = JobStatus.CANCELLED
+            job.add_event("info", "Research task cancelled")
+            self.store.save_job(job)
+            logger.info("research_cancelled", job_id=job.job_id)
+            return
+        
+        if result.get("error"):
+            job.status = JobStatus.FAILED
+            job.error = {
+                "message": "Research task failed",
+                "details": result.get("message", "Unknown error")
+            }
+            job.add_event("error", "Research task failed", result)
+            self.store.save_job(job)
+            logger.error("research_failed", job_id=job.job_id, error=result)
+            return
+        
+        # Extract structured result - Yutori returns it in 'structured_result' field
+        structured_result = result.get("structured_result", {})
+        markdown_result = result.get("result")  # Markdown format
+        
+        job.status = JobStatus.SUCCEEDED
+        job.progress = 100
+        job.result = {
+            "task_id": task_id,
+            "view_url": result.get("view_url"),
+            "structured_result": structured_result,
+            "markdown_result": markdown_result
+        }
+        job.add_event("info", "Research task succeeded")
+        self.store.save_job(job)
+        if cache_key is not None:
+            self.cache.put(cache_key, job.result)
+        
+        logger.info(
+            "research_succeeded",
+            job_id=job.job_id,
+            task_id=task_id,
+            has_answer=bool(structured_result.get("answer")),
+            bullet_count=len(structured_result.get("bullets", [])),
+            citation_count=len(structured_result.get("citations", []))
+        )
     
     async def _create_task(self, query: str, timezone: str) -> Dict[str, Any]:
         """Create Yutori research task."""
@@ -137,39 +204,51 @@ class ResearchAgent:
             }
         }
         
-        return await http_post_with_retry(self.base_url, headers, payload)
+        callback_url = webhook_url("yutori")
+        if callback_url:
+            payload["webhook_url"] = callback_url
+        
+        return await http_post_with_retry(self.base_url, headers, payload,
+                                          retry=self.create_retry, project=self._project_task)
     
-    async def _poll_task(self, job: Job, task_id: str) -> Dict[str, Any]:
-        """Poll Yutori task until completion."""
+    async def _poll_task(self, job: JobRecord, task_id: str) -> Dict[str, Any]:
+        """Poll Yutori task until completion via the shared poll scheduler."""
         headers = {
             "X-API-Key": self.api_key
         }
         
         poll_url = f"{self.base_url}/{task_id}"
         poll_count = 0
+        poll_started = time.time()
+        last_saved = 0.0
         
-        while not job.cancelled:
-            await asyncio.sleep(2.5)
-            poll_count += 1
-            
+        async def fetch() -> Dict[str, Any]:
             start_time = time.time()
-            result = await http_get_with_retry(poll_url, headers)
+            result = await http_get_with_retry(poll_url, headers, retry=self.poll_retry,
+                                               project=self._project_task)
             poll_duration = time.time() - start_time
             
             if self.observer:
                 self.observer.external_api_call("yutori", "poll_task", poll_duration, not result.get("error"))
+            return result
+        
+        def handle(result: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+            nonlocal poll_count, last_saved
+            poll_count += 1
             
             if result.get("error"):
+                # Rate limited, briefly unavailable or circuit open: poll again later
+                if result.get("status_code") in (429, 503) or result.get("circuit_open"):
+                    return None
                 return result
             
             status = result.get("status", "").lower()
-            elapsed = poll_count * 2.5
+            elapsed = time.time() - poll_started
             
-            job.add_event("info", f"Polling update: {status}", {
-                "status": status,
-                "elapsed_seconds": int(elapsed)
-            })
-            self.store.update_job(job)
+            changed = job.beat(status, int(elapsed))
+            if changed or time.monotonic() - last_saved >= self.heartbeat_interval:
+                self.store.save_job(job)
+                last_saved = time.monotonic()
             
             if self.observer:
                 self.observer.job_progress(job, None, f"Status: {status}, elapsed: {int(elapsed)}s")
@@ -181,5 +260,28 @@ class ResearchAgent:
                 return {"error": True, "message": result.get("error_message", "Task failed")}
             
             # Continue polling for queued/running/in_progress
+            return None
         
-        return {"error": True, "message": "Task cancelled"}
+        return await poll_scheduler.poll(
+            "yutori", task_id, fetch, handle,
+            is_cancelled=lambda: job.cancelled or self.store.is_cancelled(job.job_id),
+            policy=self.poll_policy
+        )
+    
+    @staticmethod
+    def _project_task(raw: Any) -> Dict[str, Any]:
+        """Keep only the Yutori task fields the agent reads."""
+        if not isinstance(raw, dict):
+            return {}
+        data = raw.get("data") if isinstance(raw.get("data"), dict) else {}
+        fields = {
+            "id": raw.get("id") or data.get("id"),
+            "task_id": raw.get("task_id") or data.get("task_id"),
+            "status": raw.get("status") or data.get("status"),
+            "error_message": raw.get("error_message"),
+            "view_url": raw.get("view_url"),
+            "result": raw.get("result"),
+            "structured_result": raw.get("structured_result"),
+            "eta_seconds": raw.get("eta_seconds") or data.get("eta_seconds")
+        }
+        return {key: value for key, value in fields.items() if value is not None}
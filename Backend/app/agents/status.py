@@ -1,5 +1,4 @@
-from typing import Optional, Dict, Any
-from app.models import Job, Session
+from typing import Dict, Any
 from app.store import JobStore
 from app.agents.dialogue import DialogueAgent
 
@@ -0,0 +1,186 @@
+"""
+Content-addressed blob store for creative input images
+"""
+import hashlib
+import os
+from collections import OrderedDict
+from typing import Dict, Optional
+from app.observability import get_logger, BLOB_STORE_BYTES, BLOB_STORE_EVENTS
+
+logger = get_logger(__name__)
+
+
+class BlobStore:
+    """Image bytes keyed by SHA-256, held in memory with an optional disk spill.
+
+    Identical uploads share one entry. When memory use exceeds
+    memory_budget, the least recently used blobs move to spill_dir (or
+    are dropped when no spill directory is configured), and the disk tier
+    is trimmed to disk_budget the same way. Blobs pinned by put() are
+    never dropped until release(); they may still be spilled to disk.
+    """
+
+    def __init__(self, memory_budget: int = 64 * 1024 * 1024,
+                 spill_dir: Optional[str] = None,
+                 disk_budget: int = 512 * 1024 * 1024):
+        self.memory_budget = memory_budget
+        self.spill_dir = spill_dir
+        self.disk_budget = disk_budget
+        # LRU order: oldest first
+        self._memory: "OrderedDict[str, bytes]" = OrderedDict()
+        self._disk: "OrderedDict[str, int]" = OrderedDict()
+        self._pins: Dict[str, int] = {}
+        self.memory_bytes = 0
+        self.disk_bytes = 0
+        if spill_dir:
+            os.makedirs(spill_dir, exist_ok=True)
+            self._load_spilled()
+
+    @classmethod
+    def from_env(cls) -> "BlobStore":
+        return cls(
+            memory_budget=int(os.getenv("BLOB_MEMORY_BUDGET_BYTES", str(64 * 1024 * 1024))),
+            spill_dir=os.getenv("BLOB_SPILL_DIR") or None,
+            disk_budget=int(os.getenv("BLOB_DISK_BUDGET_BYTES", str(512 * 1024 * 1024)))
+        )
+
+    def put(self, data: bytes) -> str:
+        """Store bytes (once per content hash) and pin them; returns the ref."""
+        ref = hashlib.sha256(data).hexdigest()
+        self._pins[ref] = self._pins.get(ref, 0) + 1
+        if ref in self._memory:
+            self._memory.move_to_end(ref)
+            BLOB_STORE_EVENTS.labels(event="deduplicated").inc()
+            return ref
+        if ref in self._disk:
+            self._disk.move_to_end(ref)
+            BLOB_STORE_EVENTS.labels(event="deduplicated").inc()
+            return ref
+        self._memory[ref] = data
+        self.memory_bytes += len(data)
+        BLOB_STORE_EVENTS.labels(event="stored").inc()
+        self._enforce_budget()
+        return ref
+
+    def get(self, ref: str) -> Optional[bytes]:
+        """Bytes for a ref, or None if it was evicted."""
+        data = self._memory.get(ref)
+        if data is not None:
+            self._memory.move_to_end(ref)
+            return data
+        if ref in self._disk:
+            try:
+                with open(self._path(ref), "rb") as f:
+                    data = f.read()
+            except OSError as e:
+                logger.error("blob_read_failed", ref=ref, error=str(e))
+                self._forget_disk(ref)
+            else:
+                # Promote back to memory; the file is dropped with the disk entry
+                self._remove_spilled(ref)
+                self._memory[ref] = data
+                self.memory_bytes += len(data)
+                self._enforce_budget()
+                return data
+        BLOB_STORE_EVENTS.labels(event="miss").inc()
+        return None
+
+    def contains(self, ref: str) -> bool:
+        return ref in self._memory or ref in self._disk
+
+    def pin(self, ref: str) -> bool:
+        """Pin an existing blob again (e.g. when resuming a job); False if gone."""
+        if not self.contains(ref):
+            return False
+        self._pins[ref] = self._pins.get(ref, 0) + 1
+        return True
+
+    def release(self, ref: str):
+        """Drop one pin; unpinned blobs become eligible for eviction."""
+        count = self._pins.get(ref, 0) - 1
+        if count > 0:
+            self._pins[ref] = count
+            return
+        self._pins.pop(ref, None)
+        self._enforce_budget()
+
+    def close(self):
+        """Spill pinned blobs so unfinished jobs can be resumed after a restart."""
+        if not self.spill_dir:
+            return
+        for ref in [ref for ref in self._memory if ref in self._pins]:
+            self._spill(ref)
+
+    # Internals
+
+    def _path(self, ref: str) -> str:
+        return os.path.join(self.spill_dir, ref)
+
+    def _load_spilled(self):
+        entries = []
+        for name in os.listdir(self.spill_dir):
+            path = os.path.join(self.spill_dir, name)
+            if len(name) == 64 and os.path.isfile(path):
+                stat = os.stat(path)
+                entries.append((stat.st_mtime, name, stat.st_size))
+        for _, ref, size in sorted(entries):
+            self._disk[ref] = size
+            self.disk_bytes += size
+        self._update_gauges()
+        self._enforce_budget()
+
+    def _enforce_budget(self):
+        if self.memory_bytes > self.memory_budget:
+            for ref in list(self._memory):
+                if self.memory_bytes <= self.memory_budget:
+                    break
+                if self.spill_dir:
+                    self._spill(ref)
+                elif ref not in self._pins:
+                    self.memory_bytes -= len(self._memory.pop(ref))
+                    BLOB_STORE_EVENTS.labels(event="evicted").inc()
+        if self.disk_bytes > self.disk_budget:
+            for ref in list(self._disk):
+                if self.disk_bytes <= self.disk_budget:
+                    break
+                if ref not in self._pins:
+                    self._remove_spilled(ref)
+                    BLOB_STORE_EVENTS.labels(event="evicted").inc()
+        self._update_gauges()
+
+    def _spill(self, ref: str):
+        data = self._memory.pop(ref)
+        self.memory_bytes -= len(data)
+        try:
+            with open(self._path(ref), "wb") as f:
+                f.write(data)
+        except OSError as e:
+            logger.error("blob_spill_failed", ref=ref, error=str(e))
+            if ref in self._pins:
+                # Keep pinned bytes rather than lose a queued job's image
+                self._memory[ref] = data
+                self.memory_bytes += len(data)
+            return
+        self._disk[ref] = len(data)
+        self.disk_bytes += len(data)
+        BLOB_STORE_EVENTS.labels(event="spilled").inc()
+
+    def _remove_spilled(self, ref: str):
+        self._forget_disk(ref)
+        try:
+            os.remove(self._path(ref))
+        except OSError:
+            pass
+
+    def _forget_disk(self, ref: str):
+        size = self._disk.pop(ref, None)
+        if size is not None:
+            self.disk_bytes -= size
+
+    def _update_gauges(self):
+        BLOB_STORE_BYTES.labels(tier="memory").set(self.memory_bytes)
+        BLOB_STORE_BYTES.labels(tier="disk").set(self.disk_bytes)
+
+
+# Global blob store instance
+blob_store = BlobStore.from_env()
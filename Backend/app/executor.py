@@ -0,0 +1,186 @@
+"""
+Bounded job execution queue with per-type worker pools
+"""
+import asyncio
+import os
+import time
+from collections import OrderedDict, deque
+from typing import Awaitable, Callable, Deque, Dict, List, Optional, Tuple
+from app.records import JobRecord
+from app.observability import get_logger, JOB_QUEUE_DEPTH, JOB_QUEUE_WAIT
+
+logger = get_logger(__name__)
+
+JobRunner = Callable[[], Awaitable[None]]
+JobDiscard = Optional[Callable[[], None]]
+
+
+class QueueFullError(Exception):
+    """Raised when a job type's queue cannot admit more work."""
+
+    def __init__(self, job_type: str, depth: int):
+        self.job_type = job_type
+        self.depth = depth
+        super().__init__(f"Too many {job_type} jobs queued ({depth}). Try again shortly.")
+
+
+class ExecutorClosedError(Exception):
+    """Raised when the executor is draining for shutdown."""
+
+    def __init__(self):
+        super().__init__("Server is shutting down. Try again shortly.")
+
+
+class _TypeQueue:
+    """Queued jobs of one type, served round-robin across sessions."""
+
+    def __init__(self, workers: int):
+        self.workers = workers
+        self.sessions: "OrderedDict[str, Deque[Tuple[JobRecord, JobRunner, JobDiscard, float]]]" = OrderedDict()
+        self.depth = 0
+        self.ready = asyncio.Semaphore(0)
+
+    def put(self, job: JobRecord, run: JobRunner, discard: JobDiscard):
+        key = job.session_id or job.job_id
+        self.sessions.setdefault(key, deque()).append((job, run, discard, time.monotonic()))
+        self.depth += 1
+        self.ready.release()
+
+    def take(self) -> Tuple[JobRecord, JobRunner, JobDiscard, float]:
+        # Oldest session in the rotation goes first, then moves to the back
+        key, items = next(iter(self.sessions.items()))
+        item = items.popleft()
+        if items:
+            self.sessions.move_to_end(key)
+        else:
+            del self.sessions[key]
+        self.depth -= 1
+        return item
+
+
+class JobExecutor:
+    """Runs jobs on a fixed number of workers per job type.
+
+    Jobs stay "queued" until a worker picks them up. Each type has a
+    bounded queue; when it is full, submissions are rejected so callers
+    can answer 429 instead of fanning out unbounded provider calls.
+    Within a type, sessions take turns so one busy session cannot
+    starve the others.
+    """
+
+    def __init__(self, limits: Dict[str, int], max_queue: int = 100,
+                 is_cancelled: Optional[Callable[[str], bool]] = None):
+        self.limits = limits
+        self.max_queue = max_queue
+        # Queued jobs are copies; this asks the store whether one was cancelled
+        self.is_cancelled = is_cancelled
+        self._queues: Dict[str, _TypeQueue] = {}
+        self._workers: List[asyncio.Task] = []
+        self._running = 0
+        self._draining = False
+        self._idle: Optional[asyncio.Event] = None
+
+    @classmethod
+    def from_env(cls, is_cancelled: Optional[Callable[[str], bool]] = None) -> "JobExecutor":
+        return cls(
+            limits={
+                "research": int(os.getenv("EXECUTOR_RESEARCH_WORKERS", "8")),
+                "creative": int(os.getenv("EXECUTOR_CREATIVE_WORKERS", "4"))
+            },
+            max_queue=int(os.getenv("EXECUTOR_MAX_QUEUE", "100")),
+            is_cancelled=is_cancelled
+        )
+
+    def start(self):
+        """Spawn the worker pools (needs a running event loop)."""
+        # Queues, not workers: a type may be configured with no workers
+        if self._queues:
+            return
+        self._draining = False
+        self._idle = asyncio.Event()
+        self._idle.set()
+        for job_type, workers in self.limits.items():
+            queue = _TypeQueue(workers)
+            self._queues[job_type] = queue
+            for i in range(workers):
+                self._workers.append(asyncio.create_task(self._worker(job_type, queue)))
+        logger.info("executor_started", limits=self.limits, max_queue=self.max_queue)
+
+    async def drain(self, timeout: float) -> bool:
+        """Stop admitting jobs and wait up to timeout for queued/running ones.
+
+        Returns True if everything finished. Jobs still running afterwards
+        keep their checkpointed provider task id and are resumed on the
+        next startup.
+        """
+        self._draining = True
+        if self._idle is None:
+            return True
+        logger.info("executor_draining", running=self._running,
+                    queued=sum(q.depth for q in self._queues.values()))
+        try:
+            await asyncio.wait_for(self._idle.wait(), timeout=timeout)
+            return True
+        except asyncio.TimeoutError:
+            logger.warning("executor_drain_timeout", running=self._running,
+                           queued=sum(q.depth for q in self._queues.values()))
+            return False
+
+    async def stop(self):
+        for worker in self._workers:
+            worker.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers = []
+        self._queues = {}
+
+    def queue_depth(self, job_type: str) -> int:
+        queue = self._queues.get(job_type)
+        return queue.depth if queue else 0
+
+    def ensure_capacity(self, job_type: str):
+        """Raise QueueFullError if a job of this type would be rejected."""
+        if self._draining:
+            raise ExecutorClosedError()
+        depth = self.queue_depth(job_type)
+        if depth >= self.max_queue:
+            raise QueueFullError(job_type, depth)
+
+    def submit(self, job: JobRecord, run: JobRunner, discard: JobDiscard = None):
+        """Queue a job; run() is awaited on a worker for its type.
+
+        discard() is called instead if the job is cancelled while queued.
+        """
+        self.start()
+        self.ensure_capacity(job.type)
+        queue = self._queues[job.type]
+        queue.put(job, run, discard)
+        self._idle.clear()
+        JOB_QUEUE_DEPTH.labels(job_type=job.type).set(queue.depth)
+
+    async def _worker(self, job_type: str, queue: _TypeQueue):
+        while True:
+            await queue.ready.acquire()
+            job, run, discard, enqueued_at = queue.take()
+            JOB_QUEUE_DEPTH.labels(job_type=job_type).set(queue.depth)
+            JOB_QUEUE_WAIT.labels(job_type=job_type).observe(time.monotonic() - enqueued_at)
+
+            # Cancelled while waiting for a worker
+            if job.cancelled or (self.is_cancelled and self.is_cancelled(job.job_id)):
+                if discard is not None:
+                    discard()
+                self._check_idle()
+                continue
+            self._running += 1
+            try:
+                await run()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error("executor_job_error", job_id=job.job_id, error=str(e), exc_info=True)
+            finally:
+                self._running -= 1
+                self._check_idle()
+
+    def _check_idle(self):
+        if self._running == 0 and all(q.depth == 0 for q in self._queues.values()):
+            self._idle.set()
@@ -0,0 +1,104 @@
+"""
+Idempotent command handling - replay the first response for duplicate submissions
+"""
+import asyncio
+import hashlib
+import os
+import time
+from collections import OrderedDict
+from typing import Awaitable, Callable, Optional, Tuple
+from app.models import CommandResponse
+
+
+class _Entry:
+    __slots__ = ("future", "expires_at")
+
+    def __init__(self, future: asyncio.Future, expires_at: float):
+        self.future = future
+        self.expires_at = expires_at
+
+
+class IdempotencyCache:
+    """Recent command responses by idempotency key, bounded and TTL'd.
+
+    The first request for a key runs; duplicates that arrive while it is
+    running wait for it, and later ones get its response until the entry
+    expires. Failed requests are not remembered, so a retry runs again.
+    """
+
+    def __init__(self, ttl: float = 3600.0, fingerprint_ttl: float = 30.0,
+                 max_entries: int = 10000):
+        self.ttl = ttl
+        self.fingerprint_ttl = fingerprint_ttl
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[str, _Entry]" = OrderedDict()
+
+    @classmethod
+    def from_env(cls) -> "IdempotencyCache":
+        return cls(
+            ttl=float(os.getenv("IDEMPOTENCY_TTL_SECONDS", "3600")),
+            fingerprint_ttl=float(os.getenv("IDEMPOTENCY_FINGERPRINT_TTL_SECONDS", "30")),
+            max_entries=int(os.getenv("IDEMPOTENCY_MAX_ENTRIES", "10000"))
+        )
+
+    @staticmethod
+    def fingerprint(session_id: str, command_text: str, image: Optional[bytes] = None,
+                    image_base64: Optional[str] = None) -> str:
+        """Key for clients that send no Idempotency-Key: session + command + image."""
+        digest = hashlib.sha256()
+        digest.update(session_id.encode())
+        digest.update(b"\0")
+        digest.update(" ".join(command_text.split()).encode())
+        digest.update(b"\0")
+        if image is not None:
+            digest.update(image)
+        elif image_base64:
+            digest.update(image_base64.encode())
+        return "fp:" + digest.hexdigest()
+
+    async def run(self, key: str, produce: Callable[[], Awaitable[CommandResponse]],
+                  ttl: Optional[float] = None,
+                  replayable: Optional[Callable[[CommandResponse], bool]] = None) -> Tuple[CommandResponse, bool]:
+        """Run produce() once per key; returns (response, replayed).
+
+        replayable, if given, can refuse a finished response (e.g. its job
+        was cancelled), in which case produce() runs again.
+        """
+        now = time.monotonic()
+        entry = self._entries.get(key)
+        if entry is not None and entry.expires_at > now:
+            if replayable is None or not entry.future.done() or replayable(entry.future.result()):
+                return await asyncio.shield(entry.future), True
+
+        entry = _Entry(asyncio.get_running_loop().create_future(), float("inf"))
+        self._entries[key] = entry
+        self._entries.move_to_end(key)
+        try:
+            response = await produce()
+        except BaseException as e:
+            if self._entries.get(key) is entry:
+                del self._entries[key]
+            if isinstance(e, asyncio.CancelledError):
+                entry.future.cancel()
+            else:
+                entry.future.set_exception(e)
+                # Nobody may be waiting; mark the exception as retrieved
+                entry.future.exception()
+            raise
+
+        entry.expires_at = time.monotonic() + (self.ttl if ttl is None else ttl)
+        entry.future.set_result(response)
+        self._trim()
+        return response, False
+
+    def _trim(self):
+        if len(self._entries) <= self.max_entries:
+            return
+        now = time.monotonic()
+        for key in list(self._entries):
+            if len(self._entries) <= self.max_entries:
+                break
+            entry = self._entries[key]
+            # Oldest first; never drop a request that is still running
+            if entry.future.done() or entry.expires_at <= now:
+                del self._entries[key]
@@ -0,0 +1,132 @@
+"""
+Job ownership leases, so several processes can share one job store
+"""
+import asyncio
+import os
+import socket
+from datetime import datetime, timedelta
+from typing import Callable, Optional, Set
+from uuid import uuid4
+from app.records import JobRecord
+from app.store import JobConflictError, JobNotFoundError, JobStore, TERMINAL_STATUSES
+from app.observability import get_logger
+
+logger = get_logger(__name__)
+
+
+class JobLeases:
+    """Records which process runs each unfinished job, and until when.
+
+    Jobs this process creates or takes over carry its owner id and a
+    lease_expires_at ttl seconds ahead; a background task renews them
+    every ttl/3 seconds. Another process only takes a job over once its
+    lease has run out (its process died or hung), and claims it with a
+    versioned write, so two processes never both run the same job. A
+    graceful shutdown gives its leases up so the next process resumes
+    those jobs straight away. Jobs written without an owner count as
+    expired.
+    """
+
+    def __init__(self, store: JobStore, ttl: float = 60.0, owner: Optional[str] = None):
+        self.store = store
+        self.ttl = ttl
+        self.owner = owner or f"{socket.gethostname()}:{os.getpid()}:{uuid4().hex[:8]}"
+        # Unfinished jobs this process runs or has queued
+        self._held: Set[str] = set()
+        self._task: Optional[asyncio.Task] = None
+
+    @classmethod
+    def from_env(cls, store: JobStore) -> "JobLeases":
+        return cls(store, ttl=float(os.getenv("JOB_LEASE_SECONDS", "60")))
+
+    def _expires_at(self) -> datetime:
+        return datetime.utcnow() + timedelta(seconds=self.ttl)
+
+    def stamp(self, job: JobRecord):
+        """Own a job this process is about to create."""
+        job.owner = self.owner
+        job.lease_expires_at = self._expires_at()
+        self._held.add(job.job_id)
+
+    def expired(self, job: JobRecord) -> bool:
+        return job.lease_expires_at is None or job.lease_expires_at <= datetime.utcnow()
+
+    def claim(self, job: JobRecord) -> bool:
+        """Take over a job whose lease ran out; False if it is still owned.
+
+        job must be a fresh copy from the store: the claim only succeeds
+        if nobody wrote the job since it was read.
+        """
+        if job.job_id in self._held or not self.expired(job):
+            return False
+        previous = job.owner
+        job.owner = self.owner
+        job.lease_expires_at = self._expires_at()
+        try:
+            self.store.update_job(job)
+        except (JobConflictError, JobNotFoundError):
+            return False
+        self._held.add(job.job_id)
+        logger.info("job_lease_claimed", job_id=job.job_id, previous_owner=previous)
+        return True
+
+    def release(self, job_id: str):
+        """Give a job up so any process can take it over now."""
+        self._held.discard(job_id)
+        self.store.modify_job(job_id, self._clear)
+
+    def renew(self) -> int:
+        """Extend the lease on every job still held; returns how many."""
+        renewed = 0
+        for job_id in list(self._held):
+            job, written = self.store.modify_job(job_id, self._extend)
+            if written:
+                renewed += 1
+                continue
+            # Finished, evicted or taken over: nothing left to renew
+            self._held.discard(job_id)
+            if job is not None and job.status not in TERMINAL_STATUSES:
+                # Only happens after this process stalled for longer than the ttl
+                logger.warning("job_lease_lost", job_id=job_id, owner=job.owner)
+        return renewed
+
+    def start(self, take_over: Callable[[], int]):
+        """Renew leases and call take_over() (e.g. resume_jobs) every ttl/3."""
+        if self._task is None:
+            self._task = asyncio.create_task(self._run(take_over))
+
+    async def stop(self):
+        """Stop renewing and give up every held lease."""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        for job_id in list(self._held):
+            try:
+                self.release(job_id)
+            except Exception as e:
+                logger.error("job_lease_release_error", job_id=job_id, error=str(e))
+
+    async def _run(self, take_over: Callable[[], int]):
+        while True:
+            await asyncio.sleep(self.ttl / 3)
+            try:
+                self.renew()
+                take_over()
+            except Exception as e:
+                logger.error("job_lease_error", error=str(e), exc_info=True)
+
+    def _extend(self, job: JobRecord) -> bool:
+        if job.status in TERMINAL_STATUSES or job.owner != self.owner:
+            return False
+        job.lease_expires_at = self._expires_at()
+        return True
+
+    def _clear(self, job: JobRecord) -> bool:
+        if job.status in TERMINAL_STATUSES or job.owner != self.owner:
+            return False
+        job.lease_expires_at = None
+        return True
@@ -1,14 +1,31 @@
-from fastapi import FastAPI, HTTPException, Query
+from fastapi import FastAPI, Header, HTTPException, Query, Request
+from fastapi.responses import JSONResponse, ORJSONResponse, Response, StreamingResponse
 from fastapi.middleware.cors import CORSMiddleware
+from starlette.datastructures import UploadFile
 from contextlib import asynccontextmanager
-from typing import Optional, List
+from pydantic import BaseModel, TypeAdapter
+from typing import Any, Literal, Optional, List, Union
+from datetime import datetime, timezone
+import hmac
+import json
 import logging
 import os
 from dotenv import load_dotenv
 
-from app.models import CommandRequest, CommandResponse, Job, JobListQuery
-from app.store import InMemoryJobStore
+from app.models import CommandRequest, CommandResponse, Job, JobListQuery, JobSummary
+from app.store import JobStore, InMemoryJobStore, encode_cursor, decode_cursor
+from app.sqlite_store import SqliteJobStore
+from app.sharded_store import ShardedJobStore
+from app.retention import RetentionPolicy, RetentionSweeper
+from app.streaming import JobEventStream, sse_stream
+from app.scheduler import poll_scheduler
+from app.webhooks import PROVIDERS, extract_task_id
 from app.orchestrator import OrchestratorAgent
+from app.leases import JobLeases
+from app.blobs import blob_store
+from app.executor import JobExecutor, QueueFullError, ExecutorClosedError
+from app.utils.http import http_clients, get_client_for_url
+from app.utils.images import InvalidImageError, check_image
 from app.observability import (
     setup_structlog,
     setup_tracing,
@@ -21,6 +38,12 @@ from app.observability import (
     session_id_var
 )
 
+try:
+    import orjson  # noqa: F401 - backs ORJSONResponse
+    ORJSON_AVAILABLE = True
+except ImportError:
+    ORJSON_AVAILABLE = False
+
 # Load environment variables
 load_dotenv()
 
@@ -32,23 +55,77 @@ meter = setup_metrics("sixseven-backend")
 # Get structured logger
 logger = get_logger(__name__)
 
+
+def create_store() -> JobStore:
+    """Create the job store selected by JOB_STORE (memory, sharded or sqlite)."""
+    backend = os.getenv("JOB_STORE", "memory").lower()
+    if backend == "sqlite":
+        path = os.getenv("JOB_STORE_PATH", "sixseven.db")
+        logger.info("job_store_selected", backend=backend, path=path)
+        return SqliteJobStore(
+            path,
+            flush_interval=float(os.getenv("JOB_STORE_FLUSH_INTERVAL", "0.05")),
+            count_refresh=float(os.getenv("JOB_STORE_COUNT_REFRESH_SECONDS", "300"))
+        )
+    if backend == "sharded":
+        shards = int(os.getenv("JOB_STORE_SHARDS", "16"))
+        logger.info("job_store_selected", backend=backend, shards=shards)
+        return ShardedJobStore(shards)
+    if backend != "memory":
+        logger.warning("unknown_job_store", backend=backend)
+    return InMemoryJobStore()
+
+
 # Initialize store and orchestrator
-store = InMemoryJobStore()
-orchestrator = OrchestratorAgent(store, job_observer)
+store = create_store()
+executor = JobExecutor.from_env(store.is_cancelled)
+leases = JobLeases.from_env(store)
+orchestrator = OrchestratorAgent(store, job_observer, executor, leases=leases)
+retention_sweeper = RetentionSweeper(store, RetentionPolicy.from_env())
+job_stream = JobEventStream(max_queue=int(os.getenv("SSE_MAX_QUEUE", "100")))
+job_observer.add_listener(job_stream)
+
+# Largest image accepted by /v1/command/upload
+MAX_IMAGE_BYTES = int(os.getenv("MAX_IMAGE_BYTES", str(10 * 1024 * 1024)))
+
+# Jobs go out as JobRecord.to_dict() data, shaped like Job
+RECORD_ADAPTER = TypeAdapter(Any)
+JOB_SUMMARY_LIST_ADAPTER = TypeAdapter(List[JobSummary])
+
+SSE_HEADERS = {"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
 
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     logger.info("starting_backend", service="sixseven", version="1.0.0")
+    http_clients.open("api.yutori.com", "api.freepik.com")
+    retention_sweeper.start()
+    executor.start()
+    orchestrator.resume_jobs()
+    # Keep our jobs' leases fresh and take over jobs of processes that died
+    leases.start(orchestrator.resume_jobs)
     yield
     logger.info("shutting_down_backend")
+    # Let in-flight jobs finish; whatever is left keeps its provider
+    # task checkpoint and is resumed by the next process
+    drained = await executor.drain(float(os.getenv("SHUTDOWN_DRAIN_SECONDS", "20")))
+    logger.info("executor_drained", complete=drained)
+    await poll_scheduler.stop()
+    await executor.stop()
+    # Nothing runs here any more; hand unfinished jobs to the next process now
+    await leases.stop()
+    await retention_sweeper.stop()
+    store.close()
+    blob_store.close()
+    await http_clients.aclose()
 
 
 app = FastAPI(
     title="sixseven (67) API",
     description="Agentic backend for voice-controlled research and creative tasks",
     version="1.0.0",
-    lifespan=lifespan
+    lifespan=lifespan,
+    default_response_class=ORJSONResponse if ORJSON_AVAILABLE else JSONResponse
 )
 
 # Add observability middleware
@@ -61,6 +138,7 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor"],
 )
 
 
@@ -78,10 +156,105 @@ async def metrics():
 
 
 @app.post("/v1/command", response_model=CommandResponse)
-async def handle_command(request: CommandRequest):
+async def handle_command(
+    request: CommandRequest,
+    idempotency_key: Optional[str] = Header(None, alias="Idempotency-Key")
+):
     """
     Main command endpoint - receives voice commands and orchestrates workflows.
     """
+    return model_response(await run_command(request, idempotency_key=idempotency_key))
+
+
+@app.post("/v1/command/upload", response_model=CommandResponse)
+async def handle_command_upload(
+    request: Request,
+    command_text: Optional[str] = Query(None),
+    session_id: Optional[str] = Query(None),
+    idempotency_key: Optional[str] = Header(None, alias="Idempotency-Key")
+):
+    """
+    Command endpoint for binary image uploads.
+    
+    Accepts multipart/form-data (command_text, session_id, optional JSON
+    defaults, image file) or a raw image/* body with command_text and
+    session_id as query parameters. The image stays as bytes until the
+    Freepik call.
+    """
+    content_type = request.headers.get("content-type", "")
+    content_length = request.headers.get("content-length")
+    if content_length and content_length.isdigit() and int(content_length) > MAX_IMAGE_BYTES + 64 * 1024:
+        raise HTTPException(status_code=413, detail="Image too large")
+    
+    defaults = None
+    image = None
+    if content_type.startswith("multipart/form-data"):
+        form = await request.form(max_files=1, max_fields=10)
+        try:
+            command_text = form.get("command_text") or command_text
+            session_id = form.get("session_id") or session_id
+            raw_defaults = form.get("defaults")
+            if raw_defaults:
+                try:
+                    defaults = json.loads(raw_defaults)
+                except ValueError:
+                    raise HTTPException(status_code=400, detail="defaults must be a JSON object")
+            upload = form.get("image")
+            if isinstance(upload, UploadFile):
+                if upload.size is not None and upload.size > MAX_IMAGE_BYTES:
+                    raise HTTPException(status_code=413, detail="Image too large")
+                image = await upload.read()
+        finally:
+            await form.close()
+    elif content_type.startswith("image/"):
+        image = await read_body(request, MAX_IMAGE_BYTES)
+    else:
+        raise HTTPException(status_code=415, detail="Use multipart/form-data or an image/* body")
+    
+    if not command_text:
+        raise HTTPException(status_code=422, detail="command_text is required")
+    
+    if image:
+        # Reject undecodable images before a job is created for them
+        try:
+            await check_image(image)
+        except InvalidImageError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+    
+    command = CommandRequest(command_text=command_text, session_id=session_id)
+    if isinstance(defaults, dict):
+        command.defaults.update(defaults)
+    return model_response(await run_command(command, image or None, idempotency_key))
+
+
+def model_response(content: Any, adapter: Optional[TypeAdapter] = None) -> Response:
+    """Serialize Pydantic content (or record data) straight to JSON bytes.
+    
+    Skips FastAPI's response_model round trip (dump to dicts, re-validate,
+    encode); response_model is still declared on routes for the OpenAPI schema.
+    """
+    if isinstance(content, BaseModel):
+        body = content.model_dump_json()
+    else:
+        body = adapter.dump_json(content)
+    return Response(content=body, media_type="application/json")
+
+
+async def read_body(request: Request, max_bytes: int) -> bytes:
+    """Read a request body chunk by chunk, rejecting it once it exceeds max_bytes."""
+    body = bytearray()
+    async for chunk in request.stream():
+        body.extend(chunk)
+        if len(body) > max_bytes:
+            raise HTTPException(status_code=413, detail="Image too large")
+    return bytes(body)
+
+
+async def run_command(request: CommandRequest, image: Optional[bytes] = None,
+                      idempotency_key: Optional[str] = None) -> CommandResponse:
+    """Run a command through the orchestrator with tracing and error mapping."""
+    has_image = image is not None or request.image_base64 is not None
+    
     # Set session context
     if request.session_id:
         session_id_var.set(request.session_id)
@@ -89,16 +262,17 @@ async def handle_command(request: CommandRequest):
     logger.info(
         "command_received",
         command=request.command_text[:100],
-        has_image=request.image_base64 is not None,
+        has_image=has_image,
+        image_bytes=len(image) if image is not None else None,
         session_id=request.session_id
     )
     
     try:
         with tracer.start_as_current_span("handle_command") as span:
             span.set_attribute("command.text", request.command_text[:100])
-            span.set_attribute("command.has_image", str(request.image_base64 is not None))
+            span.set_attribute("command.has_image", str(has_image))
             
-            response = await orchestrator.handle_command(request)
+            response = await orchestrator.handle_command(request, image, idempotency_key)
             
             span.set_attribute("response.intent", response.intent)
             span.set_attribute("response.job_id", response.job_id or "none")
@@ -111,6 +285,12 @@ async def handle_command(request: CommandRequest):
             )
             
             return response
+    except QueueFullError as e:
+        logger.warning("command_rejected_queue_full", job_type=e.job_type, queue_depth=e.depth)
+        raise HTTPException(status_code=429, detail=str(e), headers={"Retry-After": "5"})
+    except ExecutorClosedError as e:
+        logger.warning("command_rejected_draining")
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": "5"})
     except Exception as e:
         logger.error(
             "command_error",
@@ -122,8 +302,12 @@ async def handle_command(request: CommandRequest):
 
 
 @app.get("/v1/jobs/{job_id}", response_model=Job)
-async def get_job(job_id: str):
-    """Get job by ID."""
+async def get_job(job_id: str, events_since: Optional[int] = Query(None, ge=0)):
+    """Get job by ID.
+
+    events_since=N returns only the events with seq > N, so a poller can
+    pass the last seq it saw instead of re-reading the whole history.
+    """
     logger.info("get_job", job_id=job_id)
     
     job = store.get_job(job_id)
@@ -132,34 +316,97 @@ async def get_job(job_id: str):
         logger.warning("job_not_found", job_id=job_id)
         raise HTTPException(status_code=404, detail="Job not found")
     
-    return job
+    events = job.events_since(events_since) if events_since is not None else None
+    return model_response(job.to_dict(events), RECORD_ADAPTER)
 
 
-@app.get("/v1/jobs", response_model=List[Job])
+@app.get("/v1/jobs/{job_id}/events")
+async def stream_job_events(job_id: str, request: Request):
+    """Stream status changes and new events for a job (Server-Sent Events)."""
+    job = store.get_job(job_id)
+    
+    if not job:
+        logger.warning("job_not_found", job_id=job_id)
+        raise HTTPException(status_code=404, detail="Job not found")
+    
+    logger.info("job_stream_opened", job_id=job_id)
+    
+    return StreamingResponse(
+        sse_stream(job_stream, lambda: job_stream.subscribe_job(job), request.is_disconnected),
+        media_type="text/event-stream",
+        headers=SSE_HEADERS
+    )
+
+
+@app.get("/v1/sessions/{session_id}/events")
+async def stream_session_events(session_id: str, request: Request):
+    """Stream status changes and new events for every job in a session."""
+    logger.info("session_stream_opened", session_id=session_id)
+    
+    jobs = store.list_jobs(session_id=session_id, limit=20)
+    
+    return StreamingResponse(
+        sse_stream(job_stream, lambda: job_stream.subscribe_session(session_id, jobs),
+                   request.is_disconnected),
+        media_type="text/event-stream",
+        headers=SSE_HEADERS
+    )
+
+
+@app.get("/v1/jobs", response_model=Union[List[Job], List[JobSummary]])
 async def list_jobs(
     session_id: Optional[str] = Query(None),
     type: Optional[str] = Query(None),
     status: Optional[str] = Query(None),
-    limit: int = Query(20, ge=1, le=100)
+    limit: int = Query(20, ge=1, le=100),
+    view: Literal["full", "summary"] = Query("full"),
+    cursor: Optional[str] = Query(None),
+    updated_since: Optional[datetime] = Query(None)
 ):
-    """List jobs with optional filters."""
+    """List jobs with optional filters, newest first.
+    
+    view=summary returns JobSummary objects (no input, events or provider
+    payload); fetch /v1/jobs/{job_id} for the full job. A full page sets
+    X-Next-Cursor; pass it back as cursor to get the next one.
+    """
     logger.info(
         "list_jobs",
         session_id=session_id,
         type=type,
         status=status,
-        limit=limit
+        limit=limit,
+        view=view,
+        cursor=cursor,
+        updated_since=updated_since.isoformat() if updated_since else None
     )
     
-    jobs = store.list_jobs(
+    try:
+        before = decode_cursor(cursor) if cursor else None
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    if updated_since is not None and updated_since.tzinfo is not None:
+        # Job timestamps are naive UTC
+        updated_since = updated_since.astimezone(timezone.utc).replace(tzinfo=None)
+    
+    query = dict(
         session_id=session_id,
         type=type,
         status=status,
-        limit=limit
+        limit=limit,
+        before=before,
+        updated_since=updated_since
     )
+    if view == "summary":
+        items = store.list_job_summaries(**query)
+        response = model_response(items, JOB_SUMMARY_LIST_ADAPTER)
+    else:
+        items = store.list_jobs(**query)
+        response = model_response([job.to_dict() for job in items], RECORD_ADAPTER)
     
-    logger.info("jobs_listed", count=len(jobs))
-    return jobs
+    if len(items) == limit:
+        response.headers["X-Next-Cursor"] = encode_cursor(items[-1].created_at, items[-1].job_id)
+    logger.info("jobs_listed", count=len(items), view=view)
+    return response
 
 
 @app.post("/v1/jobs/{job_id}/cancel")
@@ -167,24 +414,19 @@ async def cancel_job(job_id: str):
     """Cancel a specific job."""
     logger.info("cancel_job_request", job_id=job_id)
     
-    job = store.get_job(job_id)
+    job, cancelled = store.modify_job(job_id, lambda j: j.cancel("Job cancelled via API"))
     
     if not job:
         logger.warning("cancel_job_not_found", job_id=job_id)
         raise HTTPException(status_code=404, detail="Job not found")
     
-    if job.status in ["succeeded", "failed", "cancelled"]:
+    if not cancelled:
         logger.info("cancel_job_already_terminal", job_id=job_id, status=job.status)
         return {
             "success": False,
             "message": f"Job already {job.status}"
         }
     
-    job.cancelled = True
-    job.status = "cancelled"
-    job.add_event("info", "Job cancelled via API")
-    store.update_job(job)
-    
     job_observer.job_completed(job)
     
     logger.info("job_cancelled", job_id=job_id)
@@ -196,50 +438,77 @@ async def cancel_job(job_id: str):
     }
 
 
+@app.post("/v1/webhooks/{provider}")
+async def provider_webhook(provider: str, request: Request, token: Optional[str] = Query(None)):
+    """Task completion callback from Yutori or Freepik."""
+    if provider not in PROVIDERS:
+        raise HTTPException(status_code=404, detail="Unknown provider")
+    
+    secret = os.getenv("WEBHOOK_SECRET", "")
+    if secret and not hmac.compare_digest(token or "", secret):
+        logger.warning("webhook_unauthorized", provider=provider)
+        raise HTTPException(status_code=401, detail="Invalid webhook token")
+    
+    try:
+        payload = await request.json()
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid JSON body")
+    
+    task_id = extract_task_id(payload) if isinstance(payload, dict) else None
+    if not task_id:
+        logger.warning("webhook_missing_task_id", provider=provider)
+        raise HTTPException(status_code=400, detail="Missing task_id")
+    
+    # The scheduler re-fetches the task itself, so the body is only used
+    # to find which task finished
+    matched = poll_scheduler.wake(provider, str(task_id))
+    logger.info("webhook_received", provider=provider, task_id=task_id, matched=matched)
+    
+    return {"ok": True, "matched": matched}
+
+
 @app.get("/v1/debug/test-freepik")
 async def test_freepik():
     """Test Freepik API key."""
-    import httpx
-    import os
-    
     api_key = os.getenv("FREEPIK_API_KEY", "")
     
     if not api_key:
         return {"error": "FREEPIK_API_KEY not set in environment"}
     
     # Test with minimal request
+    url = "https://api.freepik.com/v1/ai/text-to-image/seedream-v4-5-edit"
     try:
-        async with httpx.AsyncClient(timeout=30.0) as client:
-            response = await client.post(
-                "https://api.freepik.com/v1/ai/text-to-image/seedream-v4-5-edit",
-                headers={
-                    "x-freepik-api-key": api_key,
-                    "Content-Type": "application/json"
-                },
-                json={
-                    "prompt": "test image",
-                    "reference_images": ["iVBORw0KGgoAAAANSUhEUgAAAAEAAAABCAYAAAAfFcSJAAAADUlEQVR42mNk+M9QDwADhgGAWjR9awAAAABJRU5ErkJggg=="],
-                    "aspect_ratio": "square_1_1"
-                }
-            )
-            
-            result = {
-                "status_code": response.status_code,
-                "api_key_prefix": api_key[:15] + "...",
-                "api_key_length": len(api_key),
-                "headers_sent": {
-                    "x-freepik-api-key": api_key[:15] + "...",
-                    "Content-Type": "application/json"
-                }
+        client = get_client_for_url(url)
+        response = await client.post(
+            url,
+            headers={
+                "x-freepik-api-key": api_key,
+                "Content-Type": "application/json"
+            },
+            json={
+                "prompt": "test image",
+                "reference_images": ["iVBORw0KGgoAAAANSUhEUgAAAAEAAAABCAYAAAAfFcSJAAAADUlEQVR42mNk+M9QDwADhgGAWjR9awAAAABJRU5ErkJggg=="],
+                "aspect_ratio": "square_1_1"
             }
-            
-            if response.status_code == 200:
-                result["response"] = response.json()
-            else:
-                result["error_text"] = response.text[:1000]
-                result["response_headers"] = dict(response.headers)
-            
-            return result
+        )
+        
+        result = {
+            "status_code": response.status_code,
+            "api_key_prefix": api_key[:15] + "...",
+            "api_key_length": len(api_key),
+            "headers_sent": {
+                "x-freepik-api-key": api_key[:15] + "...",
+                "Content-Type": "application/json"
+            }
+        }
+        
+        if response.status_code == 200:
+            result["response"] = response.json()
+        else:
+            result["error_text"] = response.text[:1000]
+            result["response_headers"] = dict(response.headers)
+        
+        return result
     except Exception as e:
         return {
             "error": str(e),
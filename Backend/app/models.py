@@ -3,12 +3,28 @@ from typing import Optional, List, Dict, Any, Literal
 from datetime import datetime
 from uuid import uuid4
 
+# Number of events kept per job
+MAX_JOB_EVENTS = 50
+
+# Longest research answer carried in a job summary
+SUMMARY_ANSWER_CHARS = 280
+
 
 class JobEvent(BaseModel):
     ts: datetime
     level: Literal["info", "warning", "error"]
     message: str
     data: Optional[Dict[str, Any]] = None
+    # Position in the job's event log: 1, 2, 3... never reused
+    seq: int = 0
+
+
+class JobHeartbeat(BaseModel):
+    """Latest provider poll, overwritten in place rather than logged as an event."""
+    ts: datetime
+    provider_status: str
+    elapsed_seconds: int
+    polls: int = 1
 
 
 class JobInput(BaseModel):
@@ -16,9 +32,12 @@ class JobInput(BaseModel):
     query_or_prompt: str
     params: Dict[str, Any] = Field(default_factory=dict)
     image_present: bool = False
+    # Content hash of the input image in the blob store (creative jobs)
+    image_ref: Optional[str] = None
 
 
 class Job(BaseModel):
+    """API schema for a job; the store and agents work on app.records.JobRecord."""
     job_id: str = Field(default_factory=lambda: str(uuid4()))
     session_id: Optional[str] = None
     type: Literal["research", "creative"]
@@ -29,16 +48,33 @@ class Job(BaseModel):
     progress: Optional[int] = None
     result: Optional[Dict[str, Any]] = None
     error: Optional[Dict[str, Any]] = None
+    # The last MAX_JOB_EVENTS events, oldest first
     events: List[JobEvent] = Field(default_factory=list)
+    # Polling progress; only provider status changes are added to events
+    heartbeat: Optional[JobHeartbeat] = None
     cancelled: bool = False
+    # Provider task (Yutori/Freepik) the job is waiting on, for resume after restart
+    provider_task_id: Optional[str] = None
+    # Bumped by every store write; update_job rejects writes from stale copies
+    version: int = 0
+    # Process running the job and until when; another process may take over after that
+    owner: Optional[str] = None
+    lease_expires_at: Optional[datetime] = None
 
-    def add_event(self, level: str, message: str, data: Optional[Dict[str, Any]] = None):
-        event = JobEvent(ts=datetime.utcnow(), level=level, message=message, data=data)
-        self.events.append(event)
-        # Cap events at 50
-        if len(self.events) > 50:
-            self.events = self.events[-50:]
-        self.updated_at = datetime.utcnow()
+
+class JobSummary(BaseModel):
+    """What job lists render; full details come from GET /v1/jobs/{job_id}."""
+    job_id: str
+    session_id: Optional[str] = None
+    type: Literal["research", "creative"]
+    status: Literal["queued", "running", "succeeded", "failed", "cancelled"]
+    created_at: datetime
+    updated_at: datetime
+    progress: Optional[int] = None
+    # Research: the (truncated) answer; creative: the first generated image
+    answer: Optional[str] = None
+    thumbnail_url: Optional[str] = None
+    error_message: Optional[str] = None
 
 
 class Session(BaseModel):
@@ -75,3 +111,4 @@ class JobListQuery(BaseModel):
     type: Optional[Literal["research", "creative"]] = None
     status: Optional[Literal["queued", "running", "succeeded", "failed", "cancelled"]] = None
     limit: int = 20
+    view: Literal["full", "summary"] = "full"
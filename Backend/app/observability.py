@@ -61,6 +61,88 @@ EXTERNAL_API_LATENCY = Histogram(
     ['provider']
 )
 
+STORE_EVICTIONS = Counter(
+    'sixseven_store_evictions_total',
+    'Jobs and sessions evicted from the job store',
+    ['kind', 'reason']
+)
+
+STORE_JOBS = Gauge(
+    'sixseven_store_jobs',
+    'Jobs held by the job store after the last retention sweep'
+)
+
+JOB_QUEUE_DEPTH = Gauge(
+    'sixseven_job_queue_depth',
+    'Jobs waiting for a worker',
+    ['job_type']
+)
+
+JOB_QUEUE_WAIT = Histogram(
+    'sixseven_job_queue_wait_seconds',
+    'Time jobs spend queued before a worker picks them up',
+    ['job_type']
+)
+
+SSE_SUBSCRIBERS = Gauge(
+    'sixseven_sse_subscribers',
+    'Connected job event stream subscribers',
+    ['kind']
+)
+
+SSE_DROPPED = Counter(
+    'sixseven_sse_dropped_total',
+    'Job event stream subscribers dropped for falling behind',
+    ['kind']
+)
+
+BLOB_STORE_BYTES = Gauge(
+    'sixseven_blob_store_bytes',
+    'Bytes held by the image blob store',
+    ['tier']
+)
+
+BLOB_STORE_EVENTS = Counter(
+    'sixseven_blob_store_events_total',
+    'Image blob store activity',
+    ['event']
+)
+
+IMAGE_PREPROCESS_SECONDS = Histogram(
+    'sixseven_image_preprocess_seconds',
+    'Time spent decoding and downscaling creative input images',
+    ['outcome']
+)
+
+IMAGE_BYTES_SAVED = Counter(
+    'sixseven_image_bytes_saved_total',
+    'Bytes removed from creative input images before upload to Freepik'
+)
+
+RESEARCH_CACHE_REQUESTS = Counter(
+    'sixseven_research_cache_requests_total',
+    'Research requests by cache outcome (hit, miss, coalesced)',
+    ['outcome']
+)
+
+HTTP_CIRCUIT_STATE = Gauge(
+    'sixseven_http_circuit_state',
+    'Provider circuit breaker state (0=closed, 1=half_open, 2=open)',
+    ['provider']
+)
+
+HTTP_CIRCUIT_REJECTED = Counter(
+    'sixseven_http_circuit_rejected_total',
+    'Provider requests failed fast by an open circuit breaker',
+    ['provider']
+)
+
+HTTP_INFLIGHT = Gauge(
+    'sixseven_http_inflight_requests',
+    'Provider requests currently in flight',
+    ['provider']
+)
+
 
 def setup_structlog():
     """Configure structured logging with context."""
@@ -164,6 +246,18 @@ class JobObserver:
     def __init__(self):
         self.logger = get_logger("job_observer")
         self.tracer = trace.get_tracer("job_observer")
+        self.listeners = []
+    
+    def add_listener(self, listener):
+        """Register a listener whose on_job_update(job) runs on every lifecycle hook."""
+        self.listeners.append(listener)
+    
+    def _notify(self, job):
+        for listener in self.listeners:
+            try:
+                listener.on_job_update(job)
+            except Exception as e:
+                self.logger.error("job_listener_error", job_id=job.job_id, error=str(e), exc_info=True)
     
     def job_created(self, job):
         """Called when a job is created."""
@@ -184,6 +278,8 @@ class JobObserver:
             session_id=job.session_id,
             command=job.input.command_text[:100]
         )
+        
+        self._notify(job)
     
     def job_started(self, job):
         """Called when a job starts execution."""
@@ -194,6 +290,23 @@ class JobObserver:
             job_id=job.job_id,
             job_type=job.type
         )
+        
+        self._notify(job)
+    
+    def job_resumed(self, job):
+        """Called when an unfinished job is picked up again after a restart."""
+        job_id_var.set(job.job_id)
+        
+        ACTIVE_JOBS.labels(job_type=job.type).inc()
+        
+        self.logger.info(
+            "job_resumed",
+            job_id=job.job_id,
+            job_type=job.type,
+            provider_task_id=job.provider_task_id
+        )
+        
+        self._notify(job)
     
     def job_progress(self, job, progress: int, message: str):
         """Called when job progress updates."""
@@ -204,6 +317,8 @@ class JobObserver:
             progress=progress,
             message=message
         )
+        
+        self._notify(job)
     
     def job_completed(self, job):
         """Called when a job completes (success or failure)."""
@@ -235,6 +350,18 @@ class JobObserver:
             has_error=job.error is not None,
             event_count=len(job.events)
         )
+        
+        self._notify(job)
+    
+    def research_cache(self, outcome: str, job=None):
+        """Called when a research request hits the cache, misses, or joins a running task."""
+        RESEARCH_CACHE_REQUESTS.labels(outcome=outcome).inc()
+        
+        self.logger.info(
+            "research_cache",
+            outcome=outcome,
+            job_id=job.job_id if job else None
+        )
     
     def external_api_call(self, provider: str, operation: str, duration: float, success: bool):
         """Track external API calls."""
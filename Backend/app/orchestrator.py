@@ -1,14 +1,19 @@
-import asyncio
 import re
 from typing import Dict, Any, Optional
 from uuid import uuid4
-from app.models import Job, JobInput, Session, CommandRequest, CommandResponse
-from app.store import JobStore
+from app.models import CommandRequest, CommandResponse
+from app.records import InputRecord, JobRecord, JobStatus, JobType, SessionRecord
+from app.store import JobNotFoundError, JobStore
 from app.agents.dialogue import DialogueAgent
 from app.agents.research import ResearchAgent
 from app.agents.creative import CreativeAgent
 from app.agents.status import StatusAgent
 from app.agents.cancel import CancellationAgent
+from app.utils.images import InvalidImageError, check_image, decode_base64_image
+from app.blobs import BlobStore, blob_store
+from app.idempotency import IdempotencyCache
+from app.leases import JobLeases
+from app.executor import JobExecutor, QueueFullError, ExecutorClosedError
 from app.observability import get_logger
 
 logger = get_logger(__name__)
@@ -17,17 +22,30 @@ logger = get_logger(__name__)
 class OrchestratorAgent:
     """Orchestrator coordinates all agents and manages job lifecycle."""
     
-    def __init__(self, store: JobStore, observer=None):
+    def __init__(self, store: JobStore, observer=None, executor: Optional[JobExecutor] = None,
+                 blobs: Optional[BlobStore] = None, idempotency: Optional[IdempotencyCache] = None,
+                 leases: Optional[JobLeases] = None):
         self.store = store
         self.observer = observer
+        self.executor = executor or JobExecutor.from_env(store.is_cancelled)
+        self.blobs = blobs or blob_store
+        self.idempotency = idempotency or IdempotencyCache.from_env()
+        self.leases = leases or JobLeases.from_env(store)
         self.dialogue_agent = DialogueAgent()
         self.research_agent = ResearchAgent(store, observer)
-        self.creative_agent = CreativeAgent(store, observer)
+        self.creative_agent = CreativeAgent(store, observer, self.blobs)
         self.status_agent = StatusAgent(store, self.dialogue_agent)
         self.cancel_agent = CancellationAgent(store)
     
-    async def handle_command(self, request: CommandRequest) -> CommandResponse:
-        """Main entry point - routes commands to appropriate workflows."""
+    async def handle_command(self, request: CommandRequest, image: Optional[bytes] = None,
+                             idempotency_key: Optional[str] = None) -> CommandResponse:
+        """Main entry point - routes commands to appropriate workflows.
+        
+        image carries raw bytes from a binary upload; JSON requests use
+        request.image_base64 instead. Duplicate submissions (same
+        Idempotency-Key, or same session + command + image shortly after)
+        get the original response instead of starting another job.
+        """
         
         # Generate or use session_id
         session_id = request.session_id or str(uuid4())
@@ -42,10 +60,31 @@ class OrchestratorAgent:
             has_query=bool(parsed_data.get("query") or parsed_data.get("prompt"))
         )
         
+        run = lambda: self._route(session_id, intent, parsed_data, request, image)
+        replayable = None
+        if idempotency_key:
+            key, ttl = f"key:{request.session_id or ''}:{idempotency_key}", None
+        elif request.session_id and intent in ("research", "creative"):
+            key = self.idempotency.fingerprint(session_id, request.command_text, image, request.image_base64)
+            ttl = self.idempotency.fingerprint_ttl
+            # Saying the same command again after "stop" starts a new job
+            replayable = lambda response: not (response.job_id and self.store.is_cancelled(response.job_id))
+        else:
+            return await run()
+        
+        response, replayed = await self.idempotency.run(key, run, ttl, replayable)
+        if replayed:
+            logger.info("command_replayed", session_id=session_id, job_id=response.job_id,
+                        explicit_key=bool(idempotency_key))
+        return response
+    
+    async def _route(self, session_id: str, intent: str, parsed_data: Dict[str, Any],
+                     request: CommandRequest, image: Optional[bytes]) -> CommandResponse:
+        """Record the command on the session and run its workflow."""
         # Update session
         session = self.store.get_session(session_id)
         if not session:
-            session = Session(session_id=session_id)
+            session = SessionRecord(session_id=session_id)
         session.last_command_text = request.command_text
         session.last_intent = intent
         self.store.update_session(session)
@@ -54,7 +93,7 @@ class OrchestratorAgent:
         if intent == "research":
             return await self._handle_research(session, parsed_data, request)
         elif intent == "creative":
-            return await self._handle_creative(session, parsed_data, request)
+            return await self._handle_creative(session, parsed_data, request, image)
         elif intent == "status":
             return self._handle_status(session)
         elif intent == "stop":
@@ -92,7 +131,7 @@ class OrchestratorAgent:
         
         return "unknown", {}
     
-    async def _handle_research(self, session: Session, parsed_data: Dict[str, Any],
+    async def _handle_research(self, session: SessionRecord, parsed_data: Dict[str, Any],
                                request: CommandRequest) -> CommandResponse:
         """Handle research workflow."""
         query = parsed_data.get("query", "")
@@ -104,17 +143,22 @@ class OrchestratorAgent:
                 session_id=session.session_id
             )
         
+        # Reject before creating anything if the research queue is full
+        self.executor.ensure_capacity("research")
+        
         # Create job
-        job = Job(
+        job = JobRecord(
             session_id=session.session_id,
-            type="research",
-            status="queued",
-            input=JobInput(
+            type=JobType.RESEARCH,
+            status=JobStatus.QUEUED,
+            input=InputRecord(
                 command_text=request.command_text,
                 query_or_prompt=query,
                 params=request.defaults
             )
         )
+        # Owned by this process until it finishes, so no other process resumes it
+        self.leases.stamp(job)
         self.store.create_job(job)
         
         # Notify observer
@@ -125,8 +169,9 @@ class OrchestratorAgent:
         session.active_job_id = job.job_id
         self.store.update_session(session)
         
-        # Start async execution
-        asyncio.create_task(self._execute_research(job, request.defaults.get("timezone", "America/Los_Angeles")))
+        # Queue for a research worker
+        timezone = request.defaults.get("timezone", "America/Los_Angeles")
+        self.executor.submit(job, lambda: self._execute_research(job, timezone))
         
         return CommandResponse(
             intent="research",
@@ -136,8 +181,8 @@ class OrchestratorAgent:
             status="queued"
         )
     
-    async def _handle_creative(self, session: Session, parsed_data: Dict[str, Any],
-                               request: CommandRequest) -> CommandResponse:
+    async def _handle_creative(self, session: SessionRecord, parsed_data: Dict[str, Any],
+                               request: CommandRequest, image: Optional[bytes] = None) -> CommandResponse:
         """Handle creative workflow."""
         prompt = parsed_data.get("prompt", "")
         
@@ -148,25 +193,45 @@ class OrchestratorAgent:
                 session_id=session.session_id
             )
         
-        if not request.image_base64:
+        if image is None and not request.image_base64:
             return CommandResponse(
                 intent="creative",
                 message="Please provide an image for creative tasks.",
                 session_id=session.session_id
             )
         
+        # Work with raw bytes from here on; Freepik encoding happens at the call
+        if image is None:
+            try:
+                image = decode_base64_image(request.image_base64)
+                await check_image(image)
+            except InvalidImageError as e:
+                return CommandResponse(
+                    intent="creative",
+                    message=f"Invalid image: {str(e)}",
+                    session_id=session.session_id
+                )
+        
+        # Reject before creating anything if the creative queue is full
+        self.executor.ensure_capacity("creative")
+        
+        # Jobs carry a content-addressed ref; the bytes live in the blob store
+        image_ref = self.blobs.put(image)
+        
         # Create job
-        job = Job(
+        job = JobRecord(
             session_id=session.session_id,
-            type="creative",
-            status="queued",
-            input=JobInput(
+            type=JobType.CREATIVE,
+            status=JobStatus.QUEUED,
+            input=InputRecord(
                 command_text=request.command_text,
                 query_or_prompt=prompt,
                 params=request.defaults,
-                image_present=True
+                image_present=True,
+                image_ref=image_ref
             )
         )
+        self.leases.stamp(job)
         self.store.create_job(job)
         
         # Notify observer
@@ -177,13 +242,15 @@ class OrchestratorAgent:
         session.active_job_id = job.job_id
         self.store.update_session(session)
         
-        # Start async execution
-        asyncio.create_task(self._execute_creative(
-            job, 
-            request.image_base64,
-            request.defaults.get("freepik_imagination", "vivid"),
-            request.defaults.get("freepik_aspect_ratio", "original")
-        ))
+        # Queue for a creative worker
+        imagination = request.defaults.get("freepik_imagination", "vivid")
+        aspect_ratio = request.defaults.get("freepik_aspect_ratio", "original")
+        self.executor.submit(job, lambda: self._execute_creative(
+            job,
+            image_ref,
+            imagination,
+            aspect_ratio
+        ), discard=lambda: self.blobs.release(image_ref))
         
         return CommandResponse(
             intent="creative",
@@ -193,7 +260,67 @@ class OrchestratorAgent:
             status="queued"
         )
     
-    def _handle_status(self, session: Session) -> CommandResponse:
+    def resume_jobs(self, limit: int = 1000) -> int:
+        """Take over queued or running jobs whose owner's lease ran out.
+        
+        Runs at startup and then periodically (see JobLeases.start), so
+        jobs of a process that died are picked up by one that is alive;
+        jobs another live process owns are left alone. Jobs with a
+        checkpointed provider task re-attach to it; jobs that never
+        reached the provider start over, as long as creative ones still
+        have their image in the blob store. Anything else is failed.
+        """
+        resumed = 0
+        for status in (JobStatus.RUNNING, JobStatus.QUEUED):
+            for job in self.store.list_jobs(status=status, limit=limit):
+                if not self.leases.claim(job):
+                    continue
+                discard = None
+                if job.provider_task_id:
+                    agent = self.research_agent if job.type == JobType.RESEARCH else self.creative_agent
+                    run = lambda job=job, agent=agent: self._resume(job, agent)
+                elif job.type == JobType.RESEARCH:
+                    timezone = job.input.params.get("timezone", "America/Los_Angeles")
+                    run = lambda job=job, timezone=timezone: self._execute_research(job, timezone)
+                elif job.input.image_ref and self.blobs.pin(job.input.image_ref):
+                    image_ref = job.input.image_ref
+                    params = job.input.params
+                    run = lambda job=job, image_ref=image_ref, params=params: self._execute_creative(
+                        job,
+                        image_ref,
+                        params.get("freepik_imagination", "vivid"),
+                        params.get("freepik_aspect_ratio", "original")
+                    )
+                    discard = lambda image_ref=image_ref: self.blobs.release(image_ref)
+                else:
+                    self._fail_interrupted(job)
+                    continue
+                
+                try:
+                    self.executor.submit(job, run, discard)
+                except (QueueFullError, ExecutorClosedError):
+                    # No room here; give the job back for a later pass or another process
+                    if discard is not None:
+                        discard()
+                    self.leases.release(job.job_id)
+                    continue
+                
+                if self.observer:
+                    self.observer.job_resumed(job)
+                resumed += 1
+        
+        if resumed:
+            logger.info("jobs_resumed", count=resumed)
+        return resumed
+    
+    def _fail_interrupted(self, job: JobRecord):
+        job.status = JobStatus.FAILED
+        job.error = {"message": "Job interrupted by server restart"}
+        job.add_event("error", "Job interrupted by server restart")
+        self.store.save_job(job)
+        logger.warning("job_interrupted", job_id=job.job_id, job_type=job.type)
+    
+    def _handle_status(self, session: SessionRecord) -> CommandResponse:
         """Handle status query."""
         status_data = self.status_agent.get_status(session.session_id)
         
@@ -204,11 +331,16 @@ class OrchestratorAgent:
             active_job=status_data["active_job"]
         )
     
-    def _handle_stop(self, session: Session) -> CommandResponse:
+    def _handle_stop(self, session: SessionRecord) -> CommandResponse:
         """Handle stop/cancel command."""
         cancelled_job_id = self.cancel_agent.cancel_job(session.session_id)
         
         if cancelled_job_id:
+            # Same as POST /v1/jobs/{id}/cancel: a job cancelled while queued
+            # never runs, so nothing else reports it finished
+            job = self.store.get_job(cancelled_job_id)
+            if job is not None and self.observer:
+                self.observer.job_completed(job)
             message = "Task cancelled."
         else:
             message = "No active task to cancel."
@@ -220,7 +352,16 @@ class OrchestratorAgent:
             cancelled_job_id=cancelled_job_id
         )
     
-    async def _execute_research(self, job: Job, timezone: str):
+    def _job_evicted(self, job: JobRecord):
+        """The agent's job was cancelled and evicted before it finished."""
+        logger.warning("job_evicted_while_running", job_id=job.job_id, job_type=job.type)
+        # Only finished jobs are evicted, and only a cancel finishes one under its agent
+        job.cancelled = True
+        job.status = JobStatus.CANCELLED
+        if self.observer:
+            self.observer.job_completed(job)
+    
+    async def _execute_research(self, job: JobRecord, timezone: str):
         """Execute research job asynchronously."""
         try:
             if self.observer:
@@ -228,27 +369,49 @@ class OrchestratorAgent:
             await self.research_agent.execute(job, timezone)
             if self.observer:
                 self.observer.job_completed(job)
+        except JobNotFoundError:
+            self._job_evicted(job)
         except Exception as e:
             logger.error("research_execution_error", error=str(e), job_id=job.job_id, exc_info=True)
-            job.status = "failed"
+            job.status = JobStatus.FAILED
             job.error = {"message": str(e)}
-            self.store.update_job(job)
+            self.store.save_job(job)
             if self.observer:
                 self.observer.job_completed(job)
     
-    async def _execute_creative(self, job: Job, image_base64: str, 
+    async def _execute_creative(self, job: JobRecord, image_ref: str,
                                 imagination: str, aspect_ratio: str):
         """Execute creative job asynchronously."""
         try:
             if self.observer:
                 self.observer.job_started(job)
-            await self.creative_agent.execute(job, image_base64, imagination, aspect_ratio)
+            await self.creative_agent.execute(job, image_ref, imagination, aspect_ratio)
             if self.observer:
                 self.observer.job_completed(job)
+        except JobNotFoundError:
+            self._job_evicted(job)
         except Exception as e:
             logger.error("creative_execution_error", error=str(e), job_id=job.job_id, exc_info=True)
-            job.status = "failed"
+            job.status = JobStatus.FAILED
+            job.error = {"message": str(e)}
+            self.store.save_job(job)
+            if self.observer:
+                self.observer.job_completed(job)
+        finally:
+            self.blobs.release(image_ref)
+    
+    async def _resume(self, job: JobRecord, agent):
+        """Re-attach a job to its provider task after a restart."""
+        try:
+            await agent.resume(job)
+            if self.observer:
+                self.observer.job_completed(job)
+        except JobNotFoundError:
+            self._job_evicted(job)
+        except Exception as e:
+            logger.error("resume_execution_error", error=str(e), job_id=job.job_id, exc_info=True)
+            job.status = JobStatus.FAILED
             job.error = {"message": str(e)}
-            self.store.update_job(job)
+            self.store.save_job(job)
             if self.observer:
                 self.observer.job_completed(job)
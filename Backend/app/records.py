@@ -0,0 +1,329 @@
+"""
+Internal job and session records - slotted, enum-typed, converted to API data at the HTTP boundary
+"""
+from collections import deque
+from datetime import datetime
+from enum import Enum
+from typing import Any, Deque, Dict, Iterable, List, Optional
+from uuid import uuid4
+from app.models import (Job, JobEvent, JobHeartbeat, JobInput, JobSummary, Session,
+                        MAX_JOB_EVENTS, SUMMARY_ANSWER_CHARS)
+
+# to_dict() methods return the matching API model's fields as plain data
+# (datetimes unconverted) for pydantic-core to serialize; building a Pydantic
+# model per event just to dump it costs more than the dump itself.
+
+
+class _StrEnum(str, Enum):
+    """Compares, hashes and serializes like its value, so "running" still matches."""
+
+    def __str__(self) -> str:
+        return self.value
+
+
+class JobType(_StrEnum):
+    RESEARCH = "research"
+    CREATIVE = "creative"
+
+
+class JobStatus(_StrEnum):
+    QUEUED = "queued"
+    RUNNING = "running"
+    SUCCEEDED = "succeeded"
+    FAILED = "failed"
+    CANCELLED = "cancelled"
+
+
+TERMINAL_STATUSES = (JobStatus.SUCCEEDED, JobStatus.FAILED, JobStatus.CANCELLED)
+
+
+class EventRecord:
+    """One job event; never modified once added to a job."""
+    __slots__ = ("ts", "level", "message", "data", "seq")
+
+    def __init__(self, ts: datetime, level: str, message: str,
+                 data: Optional[Dict[str, Any]] = None, seq: int = 0):
+        self.ts = ts
+        self.level = level
+        self.message = message
+        self.data = data
+        # Position in the job's event log: 1, 2, 3... never reused
+        self.seq = seq
+
+    @classmethod
+    def from_model(cls, event: JobEvent) -> "EventRecord":
+        return cls(event.ts, event.level, event.message, event.data, event.seq)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {"ts": self.ts, "level": self.level, "message": self.message,
+                "data": self.data, "seq": self.seq}
+
+
+def event_log(events: Iterable[EventRecord] = ()) -> Deque[EventRecord]:
+    """Ring buffer keeping the newest MAX_JOB_EVENTS events."""
+    return deque(events, maxlen=MAX_JOB_EVENTS)
+
+
+class HeartbeatRecord:
+    """Latest provider poll, overwritten in place rather than logged as an event."""
+    __slots__ = ("ts", "provider_status", "elapsed_seconds", "polls")
+
+    def __init__(self, ts: datetime, provider_status: str, elapsed_seconds: int, polls: int = 1):
+        self.ts = ts
+        self.provider_status = provider_status
+        self.elapsed_seconds = elapsed_seconds
+        self.polls = polls
+
+    def copy(self) -> "HeartbeatRecord":
+        return HeartbeatRecord(self.ts, self.provider_status, self.elapsed_seconds, self.polls)
+
+    @classmethod
+    def from_model(cls, heartbeat: JobHeartbeat) -> "HeartbeatRecord":
+        return cls(heartbeat.ts, heartbeat.provider_status, heartbeat.elapsed_seconds, heartbeat.polls)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {"ts": self.ts, "provider_status": self.provider_status,
+                "elapsed_seconds": self.elapsed_seconds, "polls": self.polls}
+
+
+class InputRecord:
+    """What the job was asked to do; shared between snapshots, never modified."""
+    __slots__ = ("command_text", "query_or_prompt", "params", "image_present", "image_ref")
+
+    def __init__(self, command_text: str, query_or_prompt: str,
+                 params: Optional[Dict[str, Any]] = None, image_present: bool = False,
+                 image_ref: Optional[str] = None):
+        self.command_text = command_text
+        self.query_or_prompt = query_or_prompt
+        self.params = params if params is not None else {}
+        self.image_present = image_present
+        # Content hash of the input image in the blob store (creative jobs)
+        self.image_ref = image_ref
+
+    @classmethod
+    def from_model(cls, input: JobInput) -> "InputRecord":
+        return cls(input.command_text, input.query_or_prompt, input.params,
+                   input.image_present, input.image_ref)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {"command_text": self.command_text, "query_or_prompt": self.query_or_prompt,
+                "params": self.params, "image_present": self.image_present,
+                "image_ref": self.image_ref}
+
+
+class JobRecord:
+    """A job as the store and agents hold it.
+
+    Unlike the Job API model there is no validation and no per-instance
+    dict: type and status are shared enum members and events sit in a
+    bounded ring. Responses are built from to_dict().
+    """
+    __slots__ = ("job_id", "session_id", "type", "status", "created_at", "updated_at",
+                 "input", "progress", "result", "error", "events", "heartbeat",
+                 "cancelled", "provider_task_id", "version", "owner", "lease_expires_at")
+
+    def __init__(self, type: JobType, input: InputRecord,
+                 session_id: Optional[str] = None,
+                 status: JobStatus = JobStatus.QUEUED,
+                 job_id: Optional[str] = None,
+                 created_at: Optional[datetime] = None,
+                 updated_at: Optional[datetime] = None,
+                 progress: Optional[int] = None,
+                 result: Optional[Dict[str, Any]] = None,
+                 error: Optional[Dict[str, Any]] = None,
+                 events: Iterable[EventRecord] = (),
+                 heartbeat: Optional[HeartbeatRecord] = None,
+                 cancelled: bool = False,
+                 provider_task_id: Optional[str] = None,
+                 version: int = 0,
+                 owner: Optional[str] = None,
+                 lease_expires_at: Optional[datetime] = None):
+        now = datetime.utcnow()
+        self.job_id = job_id or str(uuid4())
+        self.session_id = session_id
+        self.type = JobType(type)
+        self.status = JobStatus(status)
+        self.created_at = created_at or now
+        self.updated_at = updated_at or now
+        self.input = input
+        self.progress = progress
+        self.result = result
+        self.error = error
+        self.events = event_log(events)
+        # Polling progress; only provider status changes are added to events
+        self.heartbeat = heartbeat
+        self.cancelled = cancelled
+        # Provider task (Yutori/Freepik) the job is waiting on, for resume after restart
+        self.provider_task_id = provider_task_id
+        # Bumped by every store write; update_job rejects writes from stale copies
+        self.version = version
+        # Process running the job and until when (see app.leases)
+        self.owner = owner
+        self.lease_expires_at = lease_expires_at
+
+    @property
+    def last_seq(self) -> int:
+        return self.events[-1].seq if self.events else 0
+
+    def add_event(self, level: str, message: str, data: Optional[Dict[str, Any]] = None):
+        now = datetime.utcnow()
+        # The ring buffer drops the oldest event once MAX_JOB_EVENTS are kept
+        self.events.append(EventRecord(now, level, message, data, self.last_seq + 1))
+        self.updated_at = now
+
+    def beat(self, provider_status: str, elapsed_seconds: int) -> bool:
+        """Record a provider poll; True if the provider status changed.
+
+        A status change is also added as an event; repeated polls only
+        update the heartbeat.
+        """
+        now = datetime.utcnow()
+        heartbeat = self.heartbeat
+        if heartbeat is None:
+            self.heartbeat = HeartbeatRecord(now, provider_status, elapsed_seconds)
+        else:
+            heartbeat.ts = now
+            heartbeat.elapsed_seconds = elapsed_seconds
+            heartbeat.polls += 1
+            if heartbeat.provider_status == provider_status:
+                self.updated_at = now
+                return False
+            heartbeat.provider_status = provider_status
+        self.add_event("info", f"Provider status: {provider_status}", {
+            "status": provider_status,
+            "elapsed_seconds": elapsed_seconds
+        })
+        return True
+
+    def events_since(self, seq: int) -> List[EventRecord]:
+        """Events after seq (all retained events for 0)."""
+        if seq >= self.last_seq:
+            return []
+        return [event for event in self.events if event.seq > seq]
+
+    def cancel(self, message: str) -> bool:
+        """Mark the job cancelled; False if it already finished."""
+        if self.status in TERMINAL_STATUSES:
+            return False
+        self.cancelled = True
+        self.status = JobStatus.CANCELLED
+        self.add_event("info", message)
+        return True
+
+    def snapshot(self) -> "JobRecord":
+        """Cheap copy for the store and its readers.
+
+        Events are shared (they are never modified once added) but the ring
+        buffer and the heartbeat are not, so appending to or beating one copy
+        does not show up in the other. Nested dicts are shared too: replace
+        them, don't edit them in place.
+        """
+        copy = JobRecord.__new__(JobRecord)
+        for name in JobRecord.__slots__:
+            setattr(copy, name, getattr(self, name))
+        copy.events = event_log(self.events)
+        if self.heartbeat is not None:
+            copy.heartbeat = self.heartbeat.copy()
+        return copy
+
+    @classmethod
+    def from_model(cls, job: Job) -> "JobRecord":
+        return cls(
+            type=job.type,
+            input=InputRecord.from_model(job.input),
+            session_id=job.session_id,
+            status=job.status,
+            job_id=job.job_id,
+            created_at=job.created_at,
+            updated_at=job.updated_at,
+            progress=job.progress,
+            result=job.result,
+            error=job.error,
+            events=[EventRecord.from_model(event) for event in job.events],
+            heartbeat=HeartbeatRecord.from_model(job.heartbeat) if job.heartbeat else None,
+            cancelled=job.cancelled,
+            provider_task_id=job.provider_task_id,
+            version=job.version,
+            owner=job.owner,
+            lease_expires_at=job.lease_expires_at
+        )
+
+    def to_dict(self, events: Optional[Iterable[EventRecord]] = None) -> Dict[str, Any]:
+        """Job fields, with all retained events unless given a subset."""
+        return {
+            "job_id": self.job_id,
+            "session_id": self.session_id,
+            "type": self.type.value,
+            "status": self.status.value,
+            "created_at": self.created_at,
+            "updated_at": self.updated_at,
+            "input": self.input.to_dict(),
+            "progress": self.progress,
+            "result": self.result,
+            "error": self.error,
+            "events": [event.to_dict() for event in (self.events if events is None else events)],
+            "heartbeat": self.heartbeat.to_dict() if self.heartbeat is not None else None,
+            "cancelled": self.cancelled,
+            "provider_task_id": self.provider_task_id,
+            "version": self.version,
+            "owner": self.owner,
+            "lease_expires_at": self.lease_expires_at
+        }
+
+    def summary(self) -> JobSummary:
+        """List-view projection: no input, events or provider payload."""
+        answer = None
+        thumbnail_url = None
+        if self.result:
+            if self.type == JobType.CREATIVE:
+                urls = self.result.get("generated_urls") or []
+                thumbnail_url = urls[0] if urls else None
+            else:
+                structured = self.result.get("structured_result")
+                answer = structured.get("answer") if isinstance(structured, dict) else None
+                # Provider payloads are not validated; only text is summarized
+                if not answer or not isinstance(answer, str):
+                    answer = self.result.get("markdown_result")
+                if not isinstance(answer, str):
+                    answer = None
+                if answer and len(answer) > SUMMARY_ANSWER_CHARS:
+                    answer = answer[:SUMMARY_ANSWER_CHARS - 1].rstrip() + "…"
+        return JobSummary(
+            job_id=self.job_id,
+            session_id=self.session_id,
+            type=self.type.value,
+            status=self.status.value,
+            created_at=self.created_at,
+            updated_at=self.updated_at,
+            progress=self.progress,
+            answer=answer,
+            thumbnail_url=thumbnail_url,
+            error_message=self.error.get("message") if self.error else None
+        )
+
+
+class SessionRecord:
+    __slots__ = ("session_id", "active_job_id", "last_command_text", "last_intent", "last_updated_at")
+
+    def __init__(self, session_id: str, active_job_id: Optional[str] = None,
+                 last_command_text: Optional[str] = None, last_intent: Optional[str] = None,
+                 last_updated_at: Optional[datetime] = None):
+        self.session_id = session_id
+        self.active_job_id = active_job_id
+        self.last_command_text = last_command_text
+        self.last_intent = last_intent
+        self.last_updated_at = last_updated_at or datetime.utcnow()
+
+    def copy(self) -> "SessionRecord":
+        return SessionRecord(self.session_id, self.active_job_id, self.last_command_text,
+                             self.last_intent, self.last_updated_at)
+
+    @classmethod
+    def from_model(cls, session: Session) -> "SessionRecord":
+        return cls(session.session_id, session.active_job_id, session.last_command_text,
+                   session.last_intent, session.last_updated_at)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {"session_id": self.session_id, "active_job_id": self.active_job_id,
+                "last_command_text": self.last_command_text, "last_intent": self.last_intent,
+                "last_updated_at": self.last_updated_at}
@@ -0,0 +1,119 @@
+"""
+Research result cache with single-flight task creation
+"""
+import asyncio
+import os
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+
+CacheKey = Tuple[str, str]
+
+
+class _Flight:
+    """A Yutori task shared by every job asking the same question."""
+    __slots__ = ("created", "task_id", "waiters")
+
+    def __init__(self, created: asyncio.Future, task_id: Optional[str] = None):
+        self.created = created
+        self.task_id = task_id
+        self.waiters = 1
+
+
+class ResearchCache:
+    """Caches research results by normalized query + timezone.
+
+    Finished results are kept for ttl seconds (LRU-bounded by max_entries).
+    While a query is running, identical requests join its Yutori task
+    instead of creating another one; the poll scheduler already shares
+    polls per task, so all of them finish from one upstream result.
+    """
+
+    def __init__(self, ttl: float = 600.0, max_entries: int = 500):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._results: "OrderedDict[CacheKey, Tuple[float, Dict[str, Any]]]" = OrderedDict()
+        self._inflight: Dict[CacheKey, _Flight] = {}
+
+    @classmethod
+    def from_env(cls) -> "ResearchCache":
+        return cls(
+            ttl=float(os.getenv("RESEARCH_CACHE_TTL_SECONDS", "600")),
+            max_entries=int(os.getenv("RESEARCH_CACHE_MAX_ENTRIES", "500"))
+        )
+
+    @staticmethod
+    def key(query: str, timezone: str) -> CacheKey:
+        """Case, whitespace and trailing punctuation don't change the question."""
+        return " ".join(query.lower().split()).rstrip("?.!"), timezone
+
+    def get(self, key: CacheKey) -> Optional[Dict[str, Any]]:
+        entry = self._results.get(key)
+        if entry is None:
+            return None
+        expires_at, result = entry
+        if expires_at <= time.monotonic():
+            del self._results[key]
+            return None
+        self._results.move_to_end(key)
+        return result
+
+    def put(self, key: CacheKey, result: Dict[str, Any]):
+        if self.ttl <= 0:
+            return
+        self._results[key] = (time.monotonic() + self.ttl, result)
+        self._results.move_to_end(key)
+        while len(self._results) > self.max_entries:
+            self._results.popitem(last=False)
+
+    async def join(self, key: CacheKey,
+                   create: Callable[[], Awaitable[Dict[str, Any]]]) -> Tuple[Dict[str, Any], bool]:
+        """Create the task for a query, or join the one already running.
+
+        Returns (task_data, coalesced). Unless task_data is an error, the
+        caller must call leave() once it stops waiting on the task.
+        """
+        flight = self._inflight.get(key)
+        if flight is not None:
+            flight.waiters += 1
+            task_data = await asyncio.shield(flight.created)
+            return task_data, True
+
+        flight = _Flight(asyncio.get_running_loop().create_future())
+        self._inflight[key] = flight
+        try:
+            task_data = await create()
+        except BaseException as e:
+            self._inflight.pop(key, None)
+            flight.created.set_result({"error": True, "message": str(e) or type(e).__name__})
+            raise
+
+        if task_data.get("error"):
+            self._inflight.pop(key, None)
+        else:
+            flight.task_id = task_data.get("id") or task_data.get("task_id")
+        flight.created.set_result(task_data)
+        return task_data, False
+
+    def attach(self, key: CacheKey, task_id: str):
+        """Register a resumed task so new identical queries can join it."""
+        flight = self._inflight.get(key)
+        if flight is None:
+            created = asyncio.get_running_loop().create_future()
+            created.set_result({"id": task_id})
+            self._inflight[key] = _Flight(created, task_id)
+        elif flight.task_id == task_id:
+            flight.waiters += 1
+
+    def leave(self, key: CacheKey, task_id: Optional[str]):
+        """A job stopped waiting on a task (finished, failed or cancelled)."""
+        flight = self._inflight.get(key)
+        if flight is None or flight.task_id != task_id:
+            return
+        flight.waiters -= 1
+        if flight.waiters <= 0:
+            del self._inflight[key]
+
+
+# Global cache instance
+research_cache = ResearchCache.from_env()
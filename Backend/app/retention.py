@@ -0,0 +1,105 @@
+"""
+Retention policy and background sweeper for the job store
+"""
+import asyncio
+import os
+from typing import Optional
+from app.store import JobStore
+from app.observability import get_logger, STORE_EVICTIONS, STORE_JOBS
+
+logger = get_logger(__name__)
+
+
+def _optional_float(name: str, default: str) -> Optional[float]:
+    value = os.getenv(name, default)
+    return float(value) if value else None
+
+
+class RetentionPolicy:
+    """Limits on how much job and session state the store keeps."""
+
+    def __init__(self, max_jobs: Optional[int] = 10000,
+                 terminal_max_age: Optional[float] = 24 * 3600,
+                 session_idle_ttl: Optional[float] = 6 * 3600,
+                 sweep_interval: float = 30.0,
+                 batch_size: int = 200):
+        self.max_jobs = max_jobs
+        self.terminal_max_age = terminal_max_age
+        self.session_idle_ttl = session_idle_ttl
+        self.sweep_interval = sweep_interval
+        self.batch_size = batch_size
+
+    @classmethod
+    def from_env(cls) -> "RetentionPolicy":
+        """Build a policy from JOB_RETENTION_* environment variables.
+
+        An empty value disables that limit.
+        """
+        max_jobs = os.getenv("JOB_RETENTION_MAX_JOBS", "10000")
+        return cls(
+            max_jobs=int(max_jobs) if max_jobs else None,
+            terminal_max_age=_optional_float("JOB_RETENTION_MAX_AGE_SECONDS", "86400"),
+            session_idle_ttl=_optional_float("SESSION_IDLE_TTL_SECONDS", "21600"),
+            sweep_interval=float(os.getenv("JOB_RETENTION_SWEEP_INTERVAL", "30")),
+            batch_size=int(os.getenv("JOB_RETENTION_BATCH_SIZE", "200"))
+        )
+
+
+class RetentionSweeper:
+    """Periodically evicts expired jobs and sessions in small batches."""
+
+    def __init__(self, store: JobStore, policy: RetentionPolicy):
+        self.store = store
+        self.policy = policy
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.policy.sweep_interval)
+            try:
+                await self.sweep()
+            except Exception as e:
+                logger.error("retention_sweep_error", error=str(e), exc_info=True)
+
+    async def sweep(self) -> int:
+        """Run one sweep; yields to the event loop between batches."""
+        total = 0
+        while True:
+            counts = self.store.evict_expired(
+                max_jobs=self.policy.max_jobs,
+                terminal_max_age=self.policy.terminal_max_age,
+                session_idle_ttl=self.policy.session_idle_ttl,
+                batch_size=self.policy.batch_size
+            )
+            evicted = 0
+            for (kind, reason), count in counts.items():
+                STORE_EVICTIONS.labels(kind=kind, reason=reason).inc(count)
+                evicted += count
+            total += evicted
+            if evicted < self.policy.batch_size:
+                break
+            await asyncio.sleep(0)
+
+        if total:
+            logger.info("retention_sweep", evicted=total)
+
+        jobs = self.store.job_count()
+        if jobs is not None:
+            STORE_JOBS.set(jobs)
+            if self.policy.max_jobs is not None and jobs > self.policy.max_jobs:
+                # Only finished jobs are evicted; the rest are still queued or running
+                logger.warning("retention_over_capacity", jobs=jobs, max_jobs=self.policy.max_jobs)
+        return total
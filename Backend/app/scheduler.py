@@ -0,0 +1,299 @@
+"""
+Central poll scheduler for outstanding provider tasks
+"""
+import asyncio
+import heapq
+import itertools
+import os
+import random
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+from app.observability import get_logger
+
+logger = get_logger(__name__)
+
+PollResult = Dict[str, Any]
+TaskKey = Tuple[str, str]
+
+
+class PollPolicy:
+    """Adaptive poll interval: starts fast, backs off exponentially with jitter."""
+
+    def __init__(self, initial: float, max_interval: float,
+                 multiplier: float = 1.5, jitter: float = 0.2):
+        self.initial = initial
+        self.max_interval = max_interval
+        self.multiplier = multiplier
+        self.jitter = jitter
+
+    def next_interval(self, interval: float) -> float:
+        return min(interval * self.multiplier, self.max_interval)
+
+    def delay(self, interval: float, hint: Optional[float] = None) -> float:
+        """Delay before the next poll; provider hints win over backoff."""
+        if hint is not None:
+            return min(max(hint, 0.0), self.max_interval)
+        spread = interval * self.jitter
+        return max(0.0, interval + random.uniform(-spread, spread))
+
+
+def hint_seconds(result: PollResult) -> Optional[float]:
+    """Retry-After / ETA hint carried in a poll result, in seconds."""
+    data = result.get("data") if isinstance(result.get("data"), dict) else {}
+    for value in (result.get("retry_after"), result.get("eta_seconds"), data.get("eta_seconds")):
+        try:
+            if value is not None:
+                return float(value)
+        except (TypeError, ValueError):
+            continue
+    return None
+
+
+class _Waiter:
+    __slots__ = ("handle", "is_cancelled", "future")
+
+    def __init__(self, handle, is_cancelled, future):
+        self.handle = handle
+        self.is_cancelled = is_cancelled
+        self.future = future
+
+
+class _PolledTask:
+    __slots__ = ("key", "fetch", "policy", "interval", "due", "in_flight", "woken", "waiters")
+
+    def __init__(self, key: TaskKey, fetch, policy: PollPolicy):
+        self.key = key
+        self.fetch = fetch
+        self.policy = policy
+        self.interval = policy.initial
+        self.due = 0.0
+        self.in_flight = False
+        self.woken = False
+        self.waiters: List[_Waiter] = []
+
+
+class PollScheduler:
+    """Owns every outstanding provider task and decides when to poll it.
+
+    Tasks sit in a heap ordered by next-due time and a single loop
+    dispatches polls, capped at max_qps across all providers. Several
+    jobs waiting on the same (provider, task_id) share one poll.
+    Webhooks call wake() to poll a task immediately.
+    """
+
+    def __init__(self, max_qps: float = 10.0, cancel_check_interval: float = 1.0,
+                 max_early: int = 1000):
+        self.max_qps = max_qps
+        self.cancel_check_interval = cancel_check_interval
+        self.max_early = max_early
+        self._tasks: Dict[TaskKey, _PolledTask] = {}
+        self._heap: List[Tuple[float, int, TaskKey]] = []
+        self._seq = itertools.count()
+        self._wakeup: Optional[asyncio.Event] = None
+        self._runner: Optional[asyncio.Task] = None
+        self._in_flight: set = set()
+        # Webhooks that arrived before their task was registered
+        self._early: "OrderedDict[TaskKey, float]" = OrderedDict()
+        self._tokens = max_qps
+        self._tokens_at = time.monotonic()
+
+    @property
+    def outstanding(self) -> int:
+        return len(self._tasks)
+
+    async def poll(self, provider: str, task_id: str,
+                   fetch: Callable[[], Awaitable[PollResult]],
+                   handle: Callable[[PollResult], Optional[PollResult]],
+                   is_cancelled: Callable[[], bool],
+                   policy: PollPolicy) -> PollResult:
+        """Poll a provider task until handle() returns a final result.
+
+        handle is called with every poll response and returns None to
+        keep polling. Resolves to {"error": True, "message": "Task cancelled"}
+        once is_cancelled() turns true.
+        """
+        self._ensure_running()
+        key = (provider, task_id)
+        entry = self._tasks.get(key)
+        if entry is None:
+            entry = _PolledTask(key, fetch, policy)
+            self._tasks[key] = entry
+            delay = 0.0 if self._early.pop(key, None) is not None else policy.delay(entry.interval)
+            self._schedule(entry, delay)
+
+        future = asyncio.get_running_loop().create_future()
+        entry.waiters.append(_Waiter(handle, is_cancelled, future))
+        return await future
+
+    def wake(self, provider: str, task_id: str) -> bool:
+        """Poll a task now (e.g. from a webhook); True if it is registered."""
+        key = (provider, task_id)
+        entry = self._tasks.get(key)
+        if entry is None:
+            self._early[key] = time.monotonic()
+            self._early.move_to_end(key)
+            while len(self._early) > self.max_early:
+                self._early.popitem(last=False)
+            return False
+        if entry.in_flight:
+            entry.woken = True
+        else:
+            self._schedule(entry, 0.0)
+        return True
+
+    async def stop(self):
+        """Stop polling; callers still waiting are cancelled."""
+        if self._runner is not None:
+            self._runner.cancel()
+            try:
+                await self._runner
+            except asyncio.CancelledError:
+                pass
+            self._runner = None
+        for task in list(self._in_flight):
+            task.cancel()
+        for entry in self._tasks.values():
+            for waiter in entry.waiters:
+                if not waiter.future.done():
+                    waiter.future.cancel()
+        self._tasks.clear()
+        self._heap.clear()
+
+    # Internals
+
+    def _ensure_running(self):
+        if self._runner is None or self._runner.done():
+            self._wakeup = asyncio.Event()
+            self._runner = asyncio.create_task(self._run())
+
+    def _schedule(self, entry: _PolledTask, delay: float):
+        entry.due = time.monotonic() + delay
+        heapq.heappush(self._heap, (entry.due, next(self._seq), entry.key))
+        if self._wakeup is not None:
+            self._wakeup.set()
+
+    async def _acquire_token(self):
+        while True:
+            now = time.monotonic()
+            self._tokens = min(self.max_qps, self._tokens + (now - self._tokens_at) * self.max_qps)
+            self._tokens_at = now
+            if self._tokens >= 1.0:
+                self._tokens -= 1.0
+                return
+            await asyncio.sleep((1.0 - self._tokens) / self.max_qps)
+
+    def _sweep_cancelled(self):
+        for key, entry in list(self._tasks.items()):
+            self._resolve_cancelled(entry)
+            if not entry.waiters and not entry.in_flight:
+                del self._tasks[key]
+
+    def _resolve_cancelled(self, entry: _PolledTask):
+        remaining = []
+        for waiter in entry.waiters:
+            if waiter.future.done():
+                continue
+            try:
+                cancelled = waiter.is_cancelled()
+            except Exception as e:
+                # e.g. the store is briefly locked; ask again on the next sweep
+                logger.warning("poll_cancel_check_error", provider=entry.key[0],
+                               task_id=entry.key[1], error=str(e))
+                cancelled = False
+            if cancelled:
+                waiter.future.set_result({"error": True, "message": "Task cancelled"})
+                continue
+            remaining.append(waiter)
+        entry.waiters = remaining
+
+    async def _run(self):
+        last_sweep = time.monotonic()
+        while True:
+            try:
+                last_sweep = await self._step(last_sweep)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                # The loop serves every outstanding task; never let one failure end it
+                logger.error("poll_scheduler_error", error=str(e), exc_info=True)
+                await asyncio.sleep(min(1.0, self.cancel_check_interval))
+
+    async def _step(self, last_sweep: float) -> float:
+        """Sweep cancels if due, then wait for or dispatch the next poll."""
+        now = time.monotonic()
+        if now - last_sweep >= self.cancel_check_interval:
+            last_sweep = now
+            self._sweep_cancelled()
+
+        if not self._heap or self._heap[0][0] > now:
+            timeout = self.cancel_check_interval
+            if self._heap:
+                timeout = min(timeout, self._heap[0][0] - now)
+            self._wakeup.clear()
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=timeout)
+            except asyncio.TimeoutError:
+                pass
+            return last_sweep
+
+        due, _, key = heapq.heappop(self._heap)
+        entry = self._tasks.get(key)
+        # Skip stale heap items left behind by wake()/reschedule
+        if entry is None or entry.due != due or entry.in_flight:
+            return last_sweep
+        try:
+            self._resolve_cancelled(entry)
+            if not entry.waiters:
+                del self._tasks[key]
+                return last_sweep
+            await self._acquire_token()
+        except BaseException:
+            # Popped but not dispatched: put it back so it is not orphaned
+            self._schedule(entry, 0.0)
+            raise
+        entry.in_flight = True
+        task = asyncio.create_task(self._poll_once(entry))
+        self._in_flight.add(task)
+        task.add_done_callback(self._in_flight.discard)
+        return last_sweep
+
+    async def _poll_once(self, entry: _PolledTask):
+        try:
+            result = await entry.fetch()
+        except Exception as e:
+            logger.error("poll_fetch_error", provider=entry.key[0], task_id=entry.key[1], error=str(e))
+            result = {"error": True, "message": str(e)}
+        finally:
+            entry.in_flight = False
+
+        remaining = []
+        for waiter in entry.waiters:
+            if waiter.future.done():
+                continue
+            try:
+                final = waiter.handle(result)
+            except Exception as e:
+                waiter.future.set_exception(e)
+                continue
+            if final is not None:
+                waiter.future.set_result(final)
+            else:
+                remaining.append(waiter)
+        entry.waiters = remaining
+
+        if not entry.waiters:
+            self._tasks.pop(entry.key, None)
+            return
+
+        if entry.woken:
+            entry.woken = False
+            self._schedule(entry, 0.0)
+            return
+        delay = entry.policy.delay(entry.interval, hint_seconds(result))
+        entry.interval = entry.policy.next_interval(entry.interval)
+        self._schedule(entry, delay)
+
+
+# Global scheduler instance
+poll_scheduler = PollScheduler(max_qps=float(os.getenv("POLL_MAX_QPS", "10")))
@@ -0,0 +1,123 @@
+"""
+Lock-striped JobStore - jobs and sessions hashed across independent shards
+"""
+import heapq
+import math
+from datetime import datetime
+from itertools import islice
+from typing import Callable, Dict, List, Optional, Tuple
+from app.models import JobSummary
+from app.records import JobRecord, SessionRecord
+from app.store import InMemoryJobStore, JobKey, JobStore, TERMINAL_STATUSES
+
+
+def _newest_first(item) -> JobKey:
+    return (item.created_at, item.job_id)
+
+
+class _Shard(InMemoryJobStore):
+    """One stripe; looks up session jobs that may live in another stripe."""
+
+    def __init__(self, find_job: Callable[[str], Optional[JobRecord]]):
+        super().__init__()
+        self._find_job = find_job
+
+    def _job_active(self, job_id: str) -> bool:
+        # Lock-free read of the owning shard, so shard locks never nest
+        job = self._find_job(job_id)
+        return job is not None and job.status not in TERMINAL_STATUSES
+
+    def page(self, session_id: Optional[str], type: Optional[str], status: Optional[str],
+             limit: int, before: Optional[JobKey], updated_since: Optional[datetime]) -> List[JobRecord]:
+        """Stored copies (not snapshots) for a merge; callers must not modify them."""
+        with self.lock:
+            return self._select(session_id, type, status, limit, before, updated_since)
+
+
+class ShardedJobStore(JobStore):
+    """In-memory store split into N independently locked shards.
+
+    Jobs are placed by job_id and sessions by session_id, so point reads
+    and writes only take one shard's lock. Lists ask every shard for its
+    own newest-first top-N from its indexes and merge the results; only
+    the merged page is copied or projected.
+
+    Under the GIL this is no faster than InMemoryJobStore (the critical
+    sections are too short to overlap) and lists cost more; it is meant
+    for free-threaded interpreters.
+    """
+
+    def __init__(self, shards: int = 16):
+        self.shards = [_Shard(self._peek_job) for _ in range(max(1, shards))]
+
+    def _shard(self, key: str) -> _Shard:
+        return self.shards[hash(key) % len(self.shards)]
+
+    def _peek_job(self, job_id: str) -> Optional[JobRecord]:
+        return self._shard(job_id).jobs.get(job_id)
+
+    def create_job(self, job: JobRecord) -> JobRecord:
+        return self._shard(job.job_id).create_job(job)
+
+    def get_job(self, job_id: str) -> Optional[JobRecord]:
+        return self._shard(job_id).get_job(job_id)
+
+    def update_job(self, job: JobRecord) -> JobRecord:
+        return self._shard(job.job_id).update_job(job)
+
+    def is_cancelled(self, job_id: str) -> bool:
+        return self._shard(job_id).is_cancelled(job_id)
+
+    def _merged(self, session_id: Optional[str], type: Optional[str], status: Optional[str],
+                limit: int, before: Optional[JobKey], updated_since: Optional[datetime]) -> List[JobRecord]:
+        pages = [shard.page(session_id, type, status, limit, before, updated_since)
+                 for shard in self.shards]
+        return list(islice(heapq.merge(*pages, key=_newest_first, reverse=True), limit))
+
+    def list_jobs(self, session_id: Optional[str] = None,
+                  type: Optional[str] = None,
+                  status: Optional[str] = None,
+                  limit: int = 20,
+                  before: Optional[JobKey] = None,
+                  updated_since: Optional[datetime] = None) -> List[JobRecord]:
+        return [job.snapshot() for job in
+                self._merged(session_id, type, status, limit, before, updated_since)]
+
+    def list_job_summaries(self, session_id: Optional[str] = None,
+                           type: Optional[str] = None,
+                           status: Optional[str] = None,
+                           limit: int = 20,
+                           before: Optional[JobKey] = None,
+                           updated_since: Optional[datetime] = None) -> List[JobSummary]:
+        return [job.summary() for job in
+                self._merged(session_id, type, status, limit, before, updated_since)]
+
+    def get_session(self, session_id: str) -> Optional[SessionRecord]:
+        return self._shard(session_id).get_session(session_id)
+
+    def update_session(self, session: SessionRecord) -> SessionRecord:
+        return self._shard(session.session_id).update_session(session)
+
+    def job_count(self) -> int:
+        return sum(shard.job_count() for shard in self.shards)
+
+    def evict_expired(self, max_jobs: Optional[int] = None,
+                      terminal_max_age: Optional[float] = None,
+                      session_idle_ttl: Optional[float] = None,
+                      batch_size: int = 100) -> Dict[Tuple[str, str], int]:
+        """Evict shard by shard, sharing one batch budget.
+
+        max_jobs is split evenly; hashing keeps shards close to the same size.
+        """
+        shard_max_jobs = math.ceil(max_jobs / len(self.shards)) if max_jobs is not None else None
+        counts: Dict[Tuple[str, str], int] = {}
+        budget = batch_size
+        for shard in self.shards:
+            if budget <= 0:
+                break
+            shard_counts = shard.evict_expired(shard_max_jobs, terminal_max_age,
+                                               session_idle_ttl, budget)
+            for key, count in shard_counts.items():
+                counts[key] = counts.get(key, 0) + count
+                budget -= count
+        return counts
@@ -0,0 +1,454 @@
+"""
+SQLite-backed JobStore - WAL mode, indexed job columns, append-only events
+"""
+import json
+import sqlite3
+import threading
+import time
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Tuple
+from pydantic_core import to_json
+from app.models import Job, JobSummary, Session, MAX_JOB_EVENTS
+from app.records import EventRecord, JobRecord, SessionRecord, event_log
+from app.store import JobConflictError, JobKey, JobNotFoundError, JobStore, TERMINAL_STATUSES
+from app.observability import get_logger
+
+logger = get_logger(__name__)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    job_id TEXT PRIMARY KEY,
+    session_id TEXT,
+    type TEXT NOT NULL,
+    status TEXT NOT NULL,
+    created_at TEXT NOT NULL,
+    updated_at TEXT NOT NULL,
+    data TEXT NOT NULL,
+    summary TEXT,
+    version INTEGER NOT NULL DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS idx_jobs_created ON jobs (created_at, job_id);
+CREATE INDEX IF NOT EXISTS idx_jobs_session ON jobs (session_id, created_at, job_id);
+CREATE INDEX IF NOT EXISTS idx_jobs_type ON jobs (type, created_at, job_id);
+CREATE INDEX IF NOT EXISTS idx_jobs_status ON jobs (status, created_at, job_id);
+CREATE INDEX IF NOT EXISTS idx_jobs_updated ON jobs (updated_at);
+
+CREATE TABLE IF NOT EXISTS job_events (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    job_id TEXT NOT NULL,
+    ts TEXT NOT NULL,
+    level TEXT NOT NULL,
+    message TEXT NOT NULL,
+    data TEXT,
+    seq INTEGER
+);
+CREATE INDEX IF NOT EXISTS idx_job_events_job ON job_events (job_id, id);
+
+CREATE TABLE IF NOT EXISTS sessions (
+    session_id TEXT PRIMARY KEY,
+    last_updated_at TEXT NOT NULL,
+    data TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_sessions_updated ON sessions (last_updated_at);
+"""
+
+_TERMINAL_SQL = "(" + ", ".join(f"'{s}'" for s in TERMINAL_STATUSES) + ")"
+
+
+def _ts(value: datetime) -> str:
+    # Fixed-width ISO timestamps so string order matches time order
+    return value.isoformat(timespec="microseconds")
+
+
+def _job_data(job: JobRecord) -> str:
+    """The jobs.data column: Job fields without events (those live in job_events)."""
+    data = job.to_dict(events=())
+    del data["events"]
+    return to_json(data).decode()
+
+
+def _filters(session_id: Optional[str], type: Optional[str], status: Optional[str],
+             before: Optional[JobKey], updated_since: Optional[datetime]) -> Tuple[str, list]:
+    clauses = []
+    params: list = []
+    if session_id:
+        clauses.append("session_id = ?")
+        params.append(session_id)
+    if type:
+        clauses.append("type = ?")
+        params.append(type)
+    if status:
+        clauses.append("status = ?")
+        params.append(status)
+    if before is not None:
+        clauses.append("(created_at, job_id) < (?, ?)")
+        params.extend((_ts(before[0]), before[1]))
+    if updated_since is not None:
+        clauses.append("updated_at >= ?")
+        params.append(_ts(updated_since))
+    return (f"WHERE {' AND '.join(clauses)}" if clauses else ""), params
+
+
+class SqliteJobStore(JobStore):
+    """Persistent job store on SQLite.
+
+    Writes go into an open transaction that a background thread commits
+    every flush_interval seconds (or once max_batch writes are pending),
+    so the several update_job calls per poll tick share one fsync.
+    Reads, cancel checks and the update_job version check all go to the
+    database, so several processes can share one file.
+    """
+
+    def __init__(self, path: str = "sixseven.db", flush_interval: float = 0.05,
+                 max_batch: int = 200, count_refresh: float = 300.0):
+        self.path = path
+        self.flush_interval = flush_interval
+        self.max_batch = max_batch
+        self.count_refresh = count_refresh
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.executescript(SCHEMA)
+        self._migrate()
+        self.conn.commit()
+
+        # (version, last persisted event seq) per unfinished job, to find newly
+        # appended events; only trusted while the row is still at that version
+        self._event_seqs: Dict[str, Tuple[int, int]] = {}
+        # Row count of jobs for max_jobs eviction: counted every count_refresh
+        # seconds (a full index scan) and kept current by this process in between
+        self._job_total: Optional[int] = None
+        self._counted_at = 0.0
+        self._pending = 0
+        self._closed = threading.Event()
+        self._flusher = threading.Thread(target=self._flush_loop, name="sqlite-job-store-flush", daemon=True)
+        self._flusher.start()
+
+    def _migrate(self):
+        columns = {row[1] for row in self.conn.execute("PRAGMA table_info(jobs)")}
+        if "summary" not in columns:
+            # Rows written before summaries existed are summarized from data on read
+            self.conn.execute("ALTER TABLE jobs ADD COLUMN summary TEXT")
+        if "version" not in columns:
+            self.conn.execute("ALTER TABLE jobs ADD COLUMN version INTEGER NOT NULL DEFAULT 0")
+            self.conn.execute("UPDATE jobs SET version = COALESCE(json_extract(data, '$.version'), 0)")
+        columns = {row[1] for row in self.conn.execute("PRAGMA table_info(job_events)")}
+        if "seq" not in columns:
+            # Older events read back with their row id as seq (still increasing)
+            self.conn.execute("ALTER TABLE job_events ADD COLUMN seq INTEGER")
+
+    # Group commit
+
+    def _flush_loop(self):
+        while not self._closed.wait(self.flush_interval):
+            self.flush()
+
+    def flush(self):
+        """Commit pending writes."""
+        with self.lock:
+            if self._pending:
+                try:
+                    self.conn.commit()
+                except sqlite3.Error as e:
+                    logger.error("sqlite_commit_error", error=str(e))
+                self._pending = 0
+
+    def _wrote(self):
+        self._pending += 1
+        if self._pending >= self.max_batch:
+            self.conn.commit()
+            self._pending = 0
+
+    def _end_unused_transaction(self):
+        """End a transaction that only ran statements which changed nothing.
+
+        sqlite3 opens a transaction before any UPDATE/DELETE, even one that
+        matches no row, and it holds the database write lock; with nothing
+        pending the flusher would never commit it, locking other processes out.
+        """
+        if not self._pending and self.conn.in_transaction:
+            self.conn.commit()
+
+    def close(self):
+        self._closed.set()
+        self._flusher.join(timeout=1.0)
+        self.flush()
+        with self.lock:
+            self.conn.close()
+
+    # Row mapping
+
+    def _job_from_row(self, data: str, events: List[EventRecord]) -> JobRecord:
+        job = JobRecord.from_model(Job.model_validate_json(data))
+        job.events = event_log(events)
+        if job.status not in TERMINAL_STATUSES:
+            self._event_seqs[job.job_id] = (job.version, job.last_seq)
+        return job
+
+    def _load_events(self, job_ids: List[str]) -> Dict[str, List[EventRecord]]:
+        events: Dict[str, List[EventRecord]] = {job_id: [] for job_id in job_ids}
+        if not job_ids:
+            return events
+        placeholders = ", ".join("?" for _ in job_ids)
+        rows = self.conn.execute(
+            f"""
+            SELECT job_id, ts, level, message, data, COALESCE(seq, id) FROM (
+                SELECT job_id, ts, level, message, data, seq, id,
+                       ROW_NUMBER() OVER (PARTITION BY job_id ORDER BY id DESC) AS rn
+                FROM job_events WHERE job_id IN ({placeholders})
+            ) WHERE rn <= ? ORDER BY id
+            """,
+            (*job_ids, MAX_JOB_EVENTS)
+        ).fetchall()
+        for job_id, ts, level, message, data, seq in rows:
+            events[job_id].append(EventRecord(
+                datetime.fromisoformat(ts), level, message,
+                json.loads(data) if data else None, seq
+            ))
+        return events
+
+    def _persisted_seq(self, job_id: str, version: int) -> int:
+        cached = self._event_seqs.get(job_id)
+        if cached is not None and cached[0] == version:
+            return cached[1]
+        row = self.conn.execute(
+            "SELECT MAX(COALESCE(seq, id)) FROM job_events WHERE job_id = ?", (job_id,)
+        ).fetchone()
+        return row[0] or 0
+
+    def _job_values(self, job: JobRecord) -> tuple:
+        return (job.session_id, job.status, _ts(job.updated_at), _job_data(job),
+                job.summary().model_dump_json(), job.version)
+
+    def _insert_job(self, job: JobRecord):
+        self.conn.execute(
+            """
+            INSERT INTO jobs (job_id, type, created_at, session_id, status, updated_at, data, summary, version)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+            ON CONFLICT (job_id) DO UPDATE SET
+                session_id = excluded.session_id,
+                status = excluded.status,
+                updated_at = excluded.updated_at,
+                data = excluded.data,
+                summary = excluded.summary,
+                version = excluded.version
+            """,
+            (job.job_id, job.type, _ts(job.created_at), *self._job_values(job))
+        )
+
+    def _replace_job(self, job: JobRecord, expected_version: int) -> bool:
+        """Compare-and-set: write job only if the row is still at expected_version."""
+        cursor = self.conn.execute(
+            """
+            UPDATE jobs SET session_id = ?, status = ?, updated_at = ?, data = ?, summary = ?, version = ?
+            WHERE job_id = ? AND version = ?
+            """,
+            (*self._job_values(job), job.job_id, expected_version)
+        )
+        return cursor.rowcount == 1
+
+    def _append_events(self, job: JobRecord, persisted_seq: int):
+        """Append only the events added since the last write."""
+        new_events = job.events_since(persisted_seq)
+        if new_events:
+            self.conn.executemany(
+                "INSERT INTO job_events (job_id, ts, level, message, data, seq) VALUES (?, ?, ?, ?, ?, ?)",
+                [
+                    (job.job_id, _ts(e.ts), e.level, e.message,
+                     json.dumps(e.data, default=str) if e.data is not None else None, e.seq)
+                    for e in new_events
+                ]
+            )
+        if job.status in TERMINAL_STATUSES:
+            self._event_seqs.pop(job.job_id, None)
+        else:
+            self._event_seqs[job.job_id] = (job.version, max(persisted_seq, job.last_seq))
+        self._wrote()
+
+    def _load_job(self, job_id: str) -> Optional[JobRecord]:
+        row = self.conn.execute("SELECT data FROM jobs WHERE job_id = ?", (job_id,)).fetchone()
+        if not row:
+            return None
+        return self._job_from_row(row[0], self._load_events([job_id])[job_id])
+
+    # JobStore interface
+
+    def create_job(self, job: JobRecord) -> JobRecord:
+        with self.lock:
+            persisted_seq = self._persisted_seq(job.job_id, job.version)
+            self._insert_job(job)
+            self._append_events(job, persisted_seq)
+            if self._job_total is not None:
+                self._job_total += 1
+            return job
+
+    def get_job(self, job_id: str) -> Optional[JobRecord]:
+        with self.lock:
+            return self._load_job(job_id)
+
+    def update_job(self, job: JobRecord) -> JobRecord:
+        with self.lock:
+            expected_version, updated_at = job.version, job.updated_at
+            persisted_seq = self._persisted_seq(job.job_id, expected_version)
+            job.updated_at = datetime.utcnow()
+            job.version += 1
+            # Checked in the UPDATE itself: another process may have written the row
+            if self._replace_job(job, expected_version):
+                self._append_events(job, persisted_seq)
+                return job
+            self._end_unused_transaction()
+            current = self._load_job(job.job_id)
+            job.version, job.updated_at = expected_version, updated_at
+            if current is None:
+                raise JobNotFoundError(job.job_id)
+            raise JobConflictError(current)
+
+    def is_cancelled(self, job_id: str) -> bool:
+        # Always read the row: the cancel may come from another process
+        with self.lock:
+            row = self.conn.execute(
+                "SELECT json_extract(data, '$.cancelled') FROM jobs WHERE job_id = ?", (job_id,)
+            ).fetchone()
+        return bool(row and row[0])
+
+    def list_jobs(self, session_id: Optional[str] = None,
+                  type: Optional[str] = None,
+                  status: Optional[str] = None,
+                  limit: int = 20,
+                  before: Optional[JobKey] = None,
+                  updated_since: Optional[datetime] = None) -> List[JobRecord]:
+        where, params = _filters(session_id, type, status, before, updated_since)
+        with self.lock:
+            rows = self.conn.execute(
+                f"SELECT job_id, data FROM jobs {where} ORDER BY created_at DESC, job_id DESC LIMIT ?",
+                (*params, limit)
+            ).fetchall()
+            events = self._load_events([job_id for job_id, _ in rows])
+            return [self._job_from_row(data, events[job_id]) for job_id, data in rows]
+
+    def list_job_summaries(self, session_id: Optional[str] = None,
+                           type: Optional[str] = None,
+                           status: Optional[str] = None,
+                           limit: int = 20,
+                           before: Optional[JobKey] = None,
+                           updated_since: Optional[datetime] = None) -> List[JobSummary]:
+        """Served from the summary column; job data and events are not read."""
+        where, params = _filters(session_id, type, status, before, updated_since)
+        with self.lock:
+            rows = self.conn.execute(
+                f"""
+                SELECT summary IS NULL, COALESCE(summary, data) FROM jobs {where}
+                ORDER BY created_at DESC, job_id DESC LIMIT ?
+                """,
+                (*params, limit)
+            ).fetchall()
+            summaries = []
+            for legacy, data in rows:
+                if legacy:
+                    summaries.append(JobRecord.from_model(Job.model_validate_json(data)).summary())
+                else:
+                    summaries.append(JobSummary.model_validate_json(data))
+            return summaries
+
+    def get_session(self, session_id: str) -> Optional[SessionRecord]:
+        with self.lock:
+            row = self.conn.execute("SELECT data FROM sessions WHERE session_id = ?", (session_id,)).fetchone()
+            return SessionRecord.from_model(Session.model_validate_json(row[0])) if row else None
+
+    def update_session(self, session: SessionRecord) -> SessionRecord:
+        with self.lock:
+            session.last_updated_at = datetime.utcnow()
+            self.conn.execute(
+                """
+                INSERT INTO sessions (session_id, last_updated_at, data) VALUES (?, ?, ?)
+                ON CONFLICT (session_id) DO UPDATE SET
+                    last_updated_at = excluded.last_updated_at,
+                    data = excluded.data
+                """,
+                (session.session_id, _ts(session.last_updated_at), to_json(session.to_dict()).decode())
+            )
+            self._wrote()
+            return session
+
+    def evict_expired(self, max_jobs: Optional[int] = None,
+                      terminal_max_age: Optional[float] = None,
+                      session_idle_ttl: Optional[float] = None,
+                      batch_size: int = 100) -> Dict[Tuple[str, str], int]:
+        """Evict at most batch_size expired jobs/sessions, oldest first."""
+        counts: Dict[Tuple[str, str], int] = {}
+        budget = batch_size
+        now = datetime.utcnow()
+
+        with self.lock:
+            if max_jobs is not None and budget > 0:
+                excess = min(self._count_jobs() - max_jobs, budget)
+                if excess > 0:
+                    evicted = self._delete_jobs(
+                        f"status IN {_TERMINAL_SQL} ORDER BY updated_at LIMIT ?", (excess,)
+                    )
+                    if evicted:
+                        counts[("job", "max_jobs")] = evicted
+                        budget -= evicted
+
+            if terminal_max_age is not None and budget > 0:
+                cutoff = _ts(now - timedelta(seconds=terminal_max_age))
+                evicted = self._delete_jobs(
+                    f"status IN {_TERMINAL_SQL} AND updated_at <= ? ORDER BY updated_at LIMIT ?",
+                    (cutoff, budget)
+                )
+                if evicted:
+                    counts[("job", "max_age")] = evicted
+                    budget -= evicted
+
+            if session_idle_ttl is not None and budget > 0:
+                cutoff = _ts(now - timedelta(seconds=session_idle_ttl))
+                cursor = self.conn.execute(
+                    f"""
+                    DELETE FROM sessions WHERE session_id IN (
+                        SELECT s.session_id FROM sessions s
+                        WHERE s.last_updated_at <= ?
+                          AND NOT EXISTS (
+                              SELECT 1 FROM jobs j
+                              WHERE j.job_id = json_extract(s.data, '$.active_job_id')
+                                AND j.status NOT IN {_TERMINAL_SQL}
+                          )
+                        ORDER BY s.last_updated_at LIMIT ?
+                    )
+                    """,
+                    (cutoff, budget)
+                )
+                if cursor.rowcount:
+                    counts[("session", "idle")] = cursor.rowcount
+
+            if counts:
+                self._wrote()
+            else:
+                self._end_unused_transaction()
+
+        return counts
+
+    def job_count(self) -> int:
+        with self.lock:
+            return self._count_jobs()
+
+    def _count_jobs(self) -> int:
+        now = time.monotonic()
+        if self._job_total is None or now - self._counted_at >= self.count_refresh:
+            # Picks up jobs other processes added or removed since the last count
+            self._job_total = self.conn.execute("SELECT COUNT(*) FROM jobs").fetchone()[0]
+            self._counted_at = now
+        return self._job_total
+
+    def _delete_jobs(self, condition: str, params: tuple) -> int:
+        job_ids = [row[0] for row in self.conn.execute(
+            f"SELECT job_id FROM jobs WHERE {condition}", params
+        ).fetchall()]
+        if not job_ids:
+            return 0
+        placeholders = ", ".join("?" for _ in job_ids)
+        self.conn.execute(f"DELETE FROM job_events WHERE job_id IN ({placeholders})", job_ids)
+        self.conn.execute(f"DELETE FROM jobs WHERE job_id IN ({placeholders})", job_ids)
+        if self._job_total is not None:
+            self._job_total = max(0, self._job_total - len(job_ids))
+        return len(job_ids)
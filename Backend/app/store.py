@@ -1,77 +1,446 @@
-from typing import Dict, List, Optional
-from app.models import Job, Session
-from datetime import datetime
+from typing import Callable, Dict, List, Optional, Tuple
+from app.models import JobSummary
+from app.records import (EventRecord, JobRecord, JobStatus, SessionRecord, TERMINAL_STATUSES,
+                         event_log)
+from datetime import datetime, timedelta
+from bisect import bisect_left, insort
+from collections import OrderedDict
+import base64
+import binascii
 import threading
 
+# Index key: jobs are ordered by creation time, job_id breaks ties
+JobKey = Tuple[datetime, str]
+
+class JobConflictError(Exception):
+    """Raised by update_job when the job was written since the caller's copy was read."""
+
+    def __init__(self, current: JobRecord):
+        self.current = current
+        super().__init__(f"Job {current.job_id} changed concurrently (now version {current.version})")
+
+
+class JobNotFoundError(Exception):
+    """Raised by update_job when the job is no longer stored (e.g. evicted after a cancel)."""
+
+    def __init__(self, job_id: str):
+        self.job_id = job_id
+        super().__init__(f"Job {job_id} no longer exists")
+
+
+def encode_cursor(created_at: datetime, job_id: str) -> str:
+    """Opaque cursor for the page after this job (newest-first order)."""
+    raw = f"{created_at.isoformat(timespec='microseconds')}|{job_id}"
+    return base64.urlsafe_b64encode(raw.encode()).decode("ascii").rstrip("=")
+
+
+def decode_cursor(cursor: str) -> JobKey:
+    """Raises ValueError for a cursor this server did not issue."""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode()
+        created_at, job_id = raw.split("|", 1)
+        return datetime.fromisoformat(created_at), job_id
+    except (binascii.Error, UnicodeDecodeError, ValueError):
+        raise ValueError("Invalid cursor")
+
+
+def _merge_concurrent(job: JobRecord, current: JobRecord):
+    """Fold a concurrent write (a cancel or a lease renewal) into an owner's copy.
+
+    Events the owner added since it read the job are renumbered to follow
+    the stored ones, so seq stays unique and increasing.
+    """
+    stored = {(event.seq, event.ts) for event in current.events}
+    common = max((event.seq for event in job.events if (event.seq, event.ts) in stored), default=0)
+    events = event_log(current.events)
+    seq = current.last_seq
+    for event in job.events:
+        if event.seq > common:
+            seq += 1
+            events.append(EventRecord(event.ts, event.level, event.message, event.data, seq))
+    job.events = events
+    if current.cancelled:
+        # A cancel is never undone by the agent that was running the job
+        job.cancelled = True
+        job.status = JobStatus.CANCELLED
+    # Leases are renewed and taken over by app.leases, never by the agent
+    job.owner = current.owner
+    job.lease_expires_at = current.lease_expires_at
+    job.version = current.version
+
 
 class JobStore:
-    def create_job(self, job: Job) -> Job:
+    """Jobs are handed out as snapshots (see JobRecord.snapshot) that the store
+    never touches again, so readers can use them without holding a lock;
+    sessions are copied the same way. Writes are versioned: update_job only
+    accepts a copy of the latest version and raises JobConflictError
+    otherwise, or JobNotFoundError once the job is gone.
+    """
+
+    def create_job(self, job: JobRecord) -> JobRecord:
         raise NotImplementedError
 
-    def get_job(self, job_id: str) -> Optional[Job]:
+    def get_job(self, job_id: str) -> Optional[JobRecord]:
         raise NotImplementedError
 
-    def update_job(self, job: Job) -> Job:
+    def update_job(self, job: JobRecord) -> JobRecord:
+        """Compare-and-set on job.version; bumps the version on success.
+
+        Never re-creates a job that was removed: a finished job evicted
+        while an agent still held a copy stays gone.
+        """
         raise NotImplementedError
 
-    def list_jobs(self, session_id: Optional[str] = None, 
+    def is_cancelled(self, job_id: str) -> bool:
+        """Whether the stored job was cancelled, for agents polling on a copy."""
+        job = self.get_job(job_id)
+        return job is not None and job.cancelled
+
+    def save_job(self, job: JobRecord) -> JobRecord:
+        """Write a job the caller is running (an agent's working copy).
+
+        The only other writers of a running job are cancellation and lease
+        renewal, so on a conflict the stored events, cancel flag and lease
+        are merged into job and the write is retried. Check job.cancelled
+        afterwards. Raises JobNotFoundError if the job was evicted in the
+        meantime.
+        """
+        while True:
+            try:
+                return self.update_job(job)
+            except JobConflictError as e:
+                _merge_concurrent(job, e.current)
+
+    def modify_job(self, job_id: str, change: Callable[[JobRecord], bool]) -> Tuple[Optional[JobRecord], bool]:
+        """Read-modify-write, retried until no other write gets in between.
+
+        change(job) edits a fresh snapshot and returns False to leave the
+        job alone. Returns (job, written); job is None if it does not exist.
+        """
+        while True:
+            job = self.get_job(job_id)
+            if job is None:
+                return None, False
+            if not change(job):
+                return job, False
+            try:
+                return self.update_job(job), True
+            except JobConflictError:
+                continue
+            except JobNotFoundError:
+                return None, False
+
+    def list_jobs(self, session_id: Optional[str] = None,
                   type: Optional[str] = None,
                   status: Optional[str] = None,
-                  limit: int = 20) -> List[Job]:
+                  limit: int = 20,
+                  before: Optional[JobKey] = None,
+                  updated_since: Optional[datetime] = None) -> List[JobRecord]:
+        """Jobs newest first, by (created_at, job_id).
+
+        before resumes after a decoded cursor; updated_since keeps only
+        jobs updated at or after that time.
+        """
         raise NotImplementedError
 
-    def get_session(self, session_id: str) -> Optional[Session]:
+    def list_job_summaries(self, session_id: Optional[str] = None,
+                           type: Optional[str] = None,
+                           status: Optional[str] = None,
+                           limit: int = 20,
+                           before: Optional[JobKey] = None,
+                           updated_since: Optional[datetime] = None) -> List[JobSummary]:
+        """Same query as list_jobs, projected to JobSummary."""
+        return [job.summary() for job in
+                self.list_jobs(session_id, type, status, limit, before, updated_since)]
+
+    def get_session(self, session_id: str) -> Optional[SessionRecord]:
+        """A copy of the session; write changes back with update_session."""
         raise NotImplementedError
 
-    def update_session(self, session: Session) -> Session:
+    def update_session(self, session: SessionRecord) -> SessionRecord:
         raise NotImplementedError
 
+    def evict_expired(self, max_jobs: Optional[int] = None,
+                      terminal_max_age: Optional[float] = None,
+                      session_idle_ttl: Optional[float] = None,
+                      batch_size: int = 100) -> Dict[Tuple[str, str], int]:
+        """Evict at most batch_size expired jobs/sessions.
+
+        Returns eviction counts keyed by (kind, reason).
+        """
+        return {}
+
+    def job_count(self) -> Optional[int]:
+        """Roughly how many jobs are stored, or None if unknown."""
+        return None
+
+    def close(self):
+        """Release any resources held by the store."""
+        pass
+
+
+def _index_add(index: Dict[str, List[JobKey]], value: str, key: JobKey):
+    insort(index.setdefault(value, []), key)
+
+
+def _index_remove(index: Dict[str, List[JobKey]], value: str, key: JobKey):
+    keys = index.get(value)
+    if not keys:
+        return
+    pos = bisect_left(keys, key)
+    if pos < len(keys) and keys[pos] == key:
+        del keys[pos]
+    if not keys:
+        del index[value]
+
 
 class InMemoryJobStore(JobStore):
+    """In-memory store with secondary indexes for filtered, newest-first queries.
+
+    Every index is a list of (created_at, job_id) keys kept sorted, so
+    a top-N query walks the newest end of the most selective index
+    instead of filtering and sorting the whole table. self.jobs holds the
+    store's own copies, which are replaced on write and never modified.
+    """
+
     def __init__(self):
-        self.jobs: Dict[str, Job] = {}
-        self.sessions: Dict[str, Session] = {}
+        self.jobs: Dict[str, JobRecord] = {}
+        self.sessions: Dict[str, SessionRecord] = {}
         self.lock = threading.Lock()
+        self._ordered: List[JobKey] = []
+        self._by_session: Dict[str, List[JobKey]] = {}
+        self._by_type: Dict[str, List[JobKey]] = {}
+        self._by_status: Dict[str, List[JobKey]] = {}
+        # Status each job is currently indexed under, to detect transitions
+        self._indexed_status: Dict[str, str] = {}
+        # Terminal jobs in the order they finished, and sessions in the
+        # order they were last touched, so eviction only looks at the front
+        self._terminal: "OrderedDict[str, datetime]" = OrderedDict()
+        self._session_order: "OrderedDict[str, datetime]" = OrderedDict()
+        # Jobs in the order they were last written, for updated_since
+        self._recent: "OrderedDict[str, datetime]" = OrderedDict()
+
+    def _index_job(self, job: JobRecord):
+        key = (job.created_at, job.job_id)
+        insort(self._ordered, key)
+        if job.session_id:
+            _index_add(self._by_session, job.session_id, key)
+        _index_add(self._by_type, job.type, key)
+        _index_add(self._by_status, job.status, key)
+        self._indexed_status[job.job_id] = job.status
+        self._track_terminal(job)
+        self._touch(job)
+
+    def _touch(self, job: JobRecord):
+        self._recent[job.job_id] = job.updated_at
+        self._recent.move_to_end(job.job_id)
 
-    def create_job(self, job: Job) -> Job:
+    def _reindex_status(self, job: JobRecord):
+        old_status = self._indexed_status.get(job.job_id)
+        if old_status == job.status:
+            return
+        key = (job.created_at, job.job_id)
+        if old_status is not None:
+            _index_remove(self._by_status, old_status, key)
+        _index_add(self._by_status, job.status, key)
+        self._indexed_status[job.job_id] = job.status
+        self._track_terminal(job)
+
+    def _track_terminal(self, job: JobRecord):
+        if job.status in TERMINAL_STATUSES:
+            if job.job_id not in self._terminal:
+                self._terminal[job.job_id] = job.updated_at
+        else:
+            self._terminal.pop(job.job_id, None)
+
+    def _remove_job(self, job_id: str):
+        job = self.jobs.pop(job_id)
+        key = (job.created_at, job.job_id)
+        pos = bisect_left(self._ordered, key)
+        if pos < len(self._ordered) and self._ordered[pos] == key:
+            del self._ordered[pos]
+        if job.session_id:
+            _index_remove(self._by_session, job.session_id, key)
+        _index_remove(self._by_type, job.type, key)
+        _index_remove(self._by_status, self._indexed_status.pop(job_id), key)
+        self._terminal.pop(job_id, None)
+        self._recent.pop(job_id, None)
+
+    def _store(self, job: JobRecord):
+        stored = job.snapshot()
+        if job.job_id in self.jobs:
+            self._reindex_status(stored)
+            self._touch(stored)
+        else:
+            self._index_job(stored)
+        self.jobs[job.job_id] = stored
+
+    def create_job(self, job: JobRecord) -> JobRecord:
         with self.lock:
-            self.jobs[job.job_id] = job
+            self._store(job)
             return job
 
-    def get_job(self, job_id: str) -> Optional[Job]:
-        with self.lock:
-            return self.jobs.get(job_id)
+    def get_job(self, job_id: str) -> Optional[JobRecord]:
+        # Stored copies are replaced, never modified, so no lock is needed
+        job = self.jobs.get(job_id)
+        return job.snapshot() if job is not None else None
 
-    def update_job(self, job: Job) -> Job:
+    def update_job(self, job: JobRecord) -> JobRecord:
         with self.lock:
+            current = self.jobs.get(job.job_id)
+            if current is None:
+                raise JobNotFoundError(job.job_id)
+            if current.version != job.version:
+                raise JobConflictError(current.snapshot())
             job.updated_at = datetime.utcnow()
-            self.jobs[job.job_id] = job
+            job.version += 1
+            self._store(job)
             return job
 
+    def is_cancelled(self, job_id: str) -> bool:
+        job = self.jobs.get(job_id)
+        return job is not None and job.cancelled
+
     def list_jobs(self, session_id: Optional[str] = None,
                   type: Optional[str] = None,
                   status: Optional[str] = None,
-                  limit: int = 20) -> List[Job]:
+                  limit: int = 20,
+                  before: Optional[JobKey] = None,
+                  updated_since: Optional[datetime] = None) -> List[JobRecord]:
+        with self.lock:
+            jobs = self._select(session_id, type, status, limit, before, updated_since)
+        return [job.snapshot() for job in jobs]
+
+    def list_job_summaries(self, session_id: Optional[str] = None,
+                           type: Optional[str] = None,
+                           status: Optional[str] = None,
+                           limit: int = 20,
+                           before: Optional[JobKey] = None,
+                           updated_since: Optional[datetime] = None) -> List[JobSummary]:
         with self.lock:
-            jobs = list(self.jobs.values())
-            
-            if session_id:
-                jobs = [j for j in jobs if j.session_id == session_id]
-            if type:
-                jobs = [j for j in jobs if j.type == type]
-            if status:
-                jobs = [j for j in jobs if j.status == status]
-            
-            # Sort by created_at descending (newest first)
-            jobs.sort(key=lambda j: j.created_at, reverse=True)
-            return jobs[:limit]
-
-    def get_session(self, session_id: str) -> Optional[Session]:
+            jobs = self._select(session_id, type, status, limit, before, updated_since)
+        # Stored copies are never modified, so project outside the lock
+        return [job.summary() for job in jobs]
+
+    def _select(self, session_id: Optional[str], type: Optional[str],
+                status: Optional[str], limit: int, before: Optional[JobKey],
+                updated_since: Optional[datetime]) -> List[JobRecord]:
+        # Walk the most selective index, newest first
+        candidates = [self._ordered]
+        if session_id:
+            candidates.append(self._by_session.get(session_id, []))
+        if type:
+            candidates.append(self._by_type.get(type, []))
+        if status:
+            candidates.append(self._by_status.get(status, []))
+        keys = min(candidates, key=len)
+        if updated_since is not None:
+            # Prefer the recently-written tail when it is the smaller set
+            recent = self._updated_keys(updated_since, len(keys))
+            if recent is not None:
+                keys = recent
+        end = bisect_left(keys, before) if before is not None else len(keys)
+
+        jobs = []
+        for i in range(end - 1, -1, -1):
+            job_id = keys[i][1]
+            job = self.jobs[job_id]
+            if session_id and job.session_id != session_id:
+                continue
+            if type and job.type != type:
+                continue
+            if status and self._indexed_status[job_id] != status:
+                continue
+            if updated_since is not None and self._recent[job_id] < updated_since:
+                continue
+            jobs.append(job)
+            if len(jobs) >= limit:
+                break
+        return jobs
+
+    def _updated_keys(self, since: datetime, cap: int) -> Optional[List[JobKey]]:
+        """Sorted keys of jobs written at or after since, or None past cap."""
+        keys = []
+        for job_id in reversed(self._recent):
+            if self._recent[job_id] < since:
+                break
+            if len(keys) >= cap:
+                return None
+            keys.append((self.jobs[job_id].created_at, job_id))
+        keys.sort()
+        return keys
+
+    def get_session(self, session_id: str) -> Optional[SessionRecord]:
         with self.lock:
-            return self.sessions.get(session_id)
+            session = self.sessions.get(session_id)
+            return session.copy() if session is not None else None
 
-    def update_session(self, session: Session) -> Session:
+    def update_session(self, session: SessionRecord) -> SessionRecord:
         with self.lock:
             session.last_updated_at = datetime.utcnow()
-            self.sessions[session.session_id] = session
+            self.sessions[session.session_id] = session.copy()
+            self._session_order[session.session_id] = session.last_updated_at
+            self._session_order.move_to_end(session.session_id)
             return session
+
+    def job_count(self) -> int:
+        return len(self.jobs)
+
+    def _job_active(self, job_id: str) -> bool:
+        """Whether a job is known and unfinished (called with the lock held)."""
+        job = self.jobs.get(job_id)
+        return job is not None and job.status not in TERMINAL_STATUSES
+
+    def evict_expired(self, max_jobs: Optional[int] = None,
+                      terminal_max_age: Optional[float] = None,
+                      session_idle_ttl: Optional[float] = None,
+                      batch_size: int = 100) -> Dict[Tuple[str, str], int]:
+        """Evict at most batch_size expired jobs/sessions.
+
+        Only terminal jobs are evicted, oldest-finished first. Each call
+        does a bounded amount of work so the lock is never held for a
+        full-table scan; callers loop until fewer than batch_size items
+        come back.
+        """
+        counts: Dict[Tuple[str, str], int] = {}
+        budget = batch_size
+        now = datetime.utcnow()
+
+        with self.lock:
+            # Over capacity: drop the oldest finished jobs
+            if max_jobs is not None:
+                while budget > 0 and len(self.jobs) > max_jobs and self._terminal:
+                    job_id, _ = self._terminal.popitem(last=False)
+                    self._remove_job(job_id)
+                    counts[("job", "max_jobs")] = counts.get(("job", "max_jobs"), 0) + 1
+                    budget -= 1
+
+            # Terminal jobs past their max age
+            if terminal_max_age is not None:
+                cutoff = now - timedelta(seconds=terminal_max_age)
+                while budget > 0 and self._terminal:
+                    job_id, finished_at = next(iter(self._terminal.items()))
+                    if finished_at > cutoff:
+                        break
+                    self._remove_job(job_id)
+                    counts[("job", "max_age")] = counts.get(("job", "max_age"), 0) + 1
+                    budget -= 1
+
+            # Idle sessions; sessions with an unfinished job are kept
+            if session_idle_ttl is not None:
+                cutoff = now - timedelta(seconds=session_idle_ttl)
+                while budget > 0 and self._session_order:
+                    session_id, last_updated_at = next(iter(self._session_order.items()))
+                    if last_updated_at > cutoff:
+                        break
+                    budget -= 1
+                    session = self.sessions[session_id]
+                    if session.active_job_id and self._job_active(session.active_job_id):
+                        self._session_order[session_id] = now
+                        self._session_order.move_to_end(session_id)
+                        continue
+                    del self._session_order[session_id]
+                    del self.sessions[session_id]
+                    counts[("session", "idle")] = counts.get(("session", "idle"), 0) + 1
+
+        return counts
@@ -0,0 +1,209 @@
+"""
+In-process fan-out of job deltas to Server-Sent Events subscribers
+"""
+import asyncio
+import json
+from typing import Any, AsyncIterator, Callable, Dict, List, Set, Tuple
+from pydantic_core import to_jsonable_python
+from app.records import EventRecord, JobRecord
+from app.store import TERMINAL_STATUSES
+from app.observability import get_logger, SSE_SUBSCRIBERS, SSE_DROPPED
+
+logger = get_logger(__name__)
+
+
+class Subscription:
+    """A bounded queue of deltas for one SSE client."""
+
+    def __init__(self, kind: str, key: str, max_queue: int):
+        self.kind = kind
+        self.key = key
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=max_queue)
+        self.closed = False
+
+    def push(self, item: Tuple[str, Dict[str, Any]]) -> bool:
+        """Queue a delta without blocking; False if the client fell behind."""
+        if self.closed:
+            return True
+        try:
+            self.queue.put_nowait(item)
+            return True
+        except asyncio.QueueFull:
+            return False
+
+    def close(self):
+        """Stop the stream, discarding anything still buffered."""
+        if self.closed:
+            return
+        self.closed = True
+        while not self.queue.empty():
+            self.queue.get_nowait()
+        self.queue.put_nowait(None)
+
+
+class JobEventStream:
+    """Publishes job status changes and new JobEvents to subscribers.
+
+    Fed from JobObserver hooks. For each job it remembers the last status,
+    event seq and heartbeat poll it published, so subscribers only receive deltas. Clients
+    whose queue fills up are dropped instead of buffered; they can
+    reconnect and start again from a fresh snapshot.
+    """
+
+    def __init__(self, max_queue: int = 100):
+        self.max_queue = max_queue
+        self._job_subs: Dict[str, Set[Subscription]] = {}
+        self._session_subs: Dict[str, Set[Subscription]] = {}
+        # job_id -> (last published status, event seq, heartbeat poll count)
+        self._cursors: Dict[str, Tuple[str, int, int]] = {}
+
+    def _cursor_events(self, job: JobRecord) -> List[EventRecord]:
+        """Events already published for a job (all of them for a new cursor)."""
+        cursor = self._cursors.get(job.job_id)
+        if cursor is None:
+            self._cursors[job.job_id] = (job.status, job.last_seq, _polls(job))
+            return list(job.events)
+        _, last_seq, _ = cursor
+        return [event for event in job.events if event.seq <= last_seq]
+
+    def _snapshot(self, job: JobRecord, include_events: bool) -> Dict[str, Any]:
+        snapshot = _status_delta(job)
+        if include_events:
+            snapshot["events"] = [to_jsonable_python(e.to_dict()) for e in self._cursor_events(job)]
+            snapshot["heartbeat"] = to_jsonable_python(job.heartbeat.to_dict()) if job.heartbeat else None
+        else:
+            self._cursor_events(job)
+        return snapshot
+
+    def subscribe_job(self, job: JobRecord) -> Tuple[Subscription, Dict[str, Any]]:
+        """Subscribe to one job; returns the subscription and its snapshot.
+
+        A job that already finished gets its "done" event straight away.
+        """
+        subscription = Subscription("job", job.job_id, self.max_queue)
+        self._job_subs.setdefault(job.job_id, set()).add(subscription)
+        SSE_SUBSCRIBERS.labels(kind="job").inc()
+        snapshot = self._snapshot(job, include_events=True)
+        if job.status in TERMINAL_STATUSES:
+            subscription.push(("done", {"job_id": job.job_id, "status": job.status}))
+            subscription.push(None)
+        return subscription, snapshot
+
+    def subscribe_session(self, session_id: str, jobs: List[JobRecord]) -> Tuple[Subscription, Dict[str, Any]]:
+        """Subscribe to every job in a session."""
+        subscription = Subscription("session", session_id, self.max_queue)
+        self._session_subs.setdefault(session_id, set()).add(subscription)
+        SSE_SUBSCRIBERS.labels(kind="session").inc()
+        snapshot = {
+            "session_id": session_id,
+            "jobs": [self._snapshot(job, include_events=False) for job in jobs]
+        }
+        return subscription, snapshot
+
+    def _detach(self, subscription: Subscription):
+        index = self._job_subs if subscription.kind == "job" else self._session_subs
+        subs = index.get(subscription.key)
+        if subs and subscription in subs:
+            subs.discard(subscription)
+            SSE_SUBSCRIBERS.labels(kind=subscription.kind).dec()
+            if not subs:
+                del index[subscription.key]
+
+    def unsubscribe(self, subscription: Subscription):
+        self._detach(subscription)
+        subscription.close()
+
+    def on_job_update(self, job: JobRecord):
+        """Publish whatever changed on a job since the last call."""
+        job_subs = self._job_subs.get(job.job_id, set())
+        session_subs = self._session_subs.get(job.session_id, set()) if job.session_id else set()
+        if not job_subs and not session_subs:
+            self._cursors.pop(job.job_id, None)
+            return
+
+        last_status, last_seq, last_polls = self._cursors.get(job.job_id, (None, 0, 0))
+        deltas: List[Tuple[str, Dict[str, Any]]] = []
+        if job.status != last_status:
+            deltas.append(("status", _status_delta(job)))
+
+        for event in job.events_since(last_seq):
+            payload = to_jsonable_python(event.to_dict())
+            payload["job_id"] = job.job_id
+            deltas.append(("job_event", payload))
+        if _polls(job) != last_polls:
+            payload = to_jsonable_python(job.heartbeat.to_dict())
+            payload["job_id"] = job.job_id
+            deltas.append(("heartbeat", payload))
+
+        terminal = job.status in TERMINAL_STATUSES
+        if terminal:
+            self._cursors.pop(job.job_id, None)
+        else:
+            self._cursors[job.job_id] = (job.status, job.last_seq, _polls(job))
+
+        if not deltas:
+            return
+        for subscription in list(job_subs) + list(session_subs):
+            for delta in deltas:
+                if not subscription.push(delta):
+                    self._drop(subscription)
+                    break
+
+        # A finished job's own streams have nothing more to say
+        if terminal:
+            for subscription in list(self._job_subs.get(job.job_id, ())):
+                done = ("done", {"job_id": job.job_id, "status": job.status})
+                if subscription.push(done) and subscription.push(None):
+                    self._detach(subscription)
+                else:
+                    self._drop(subscription)
+
+    def _drop(self, subscription: Subscription):
+        SSE_DROPPED.labels(kind=subscription.kind).inc()
+        logger.warning("sse_subscriber_dropped", kind=subscription.kind, key=subscription.key)
+        self.unsubscribe(subscription)
+
+
+def _polls(job: JobRecord) -> int:
+    return job.heartbeat.polls if job.heartbeat is not None else 0
+
+
+def _status_delta(job: JobRecord) -> Dict[str, Any]:
+    return {
+        "job_id": job.job_id,
+        "type": job.type,
+        "status": job.status,
+        "progress": job.progress,
+        "updated_at": job.updated_at.isoformat()
+    }
+
+
+def format_sse(event: str, data: Dict[str, Any]) -> str:
+    return f"event: {event}\ndata: {json.dumps(data, default=str)}\n\n"
+
+
+async def sse_stream(stream: JobEventStream,
+                     subscribe: Callable[[], Tuple[Subscription, Dict[str, Any]]],
+                     is_disconnected, keepalive: float = 15.0) -> AsyncIterator[str]:
+    """Render a subscription as an SSE byte stream.
+
+    subscribe() runs when the response starts streaming, so a client that
+    disconnects before then never leaves a subscription behind.
+    """
+    subscription, snapshot = subscribe()
+    try:
+        yield format_sse("snapshot", snapshot)
+        while True:
+            try:
+                item = await asyncio.wait_for(subscription.queue.get(), timeout=keepalive)
+            except asyncio.TimeoutError:
+                if await is_disconnected():
+                    break
+                yield ": keepalive\n\n"
+                continue
+            if item is None:
+                break
+            event, data = item
+            yield format_sse(event, data)
+    finally:
+        stream.unsubscribe(subscription)
@@ -1,68 +1,467 @@
+import asyncio
 import httpx
-from typing import Optional, Dict, Any
+import random
+import time
+from collections import deque
+from typing import Optional, Dict, Any, Callable, Deque, Tuple
+from urllib.parse import urlsplit
 import logging
+import os
+from app.observability import HTTP_CIRCUIT_STATE, HTTP_CIRCUIT_REJECTED, HTTP_INFLIGHT
 
 logger = logging.getLogger(__name__)
 
+try:
+    import h2  # noqa: F401 - enables HTTP/2 support in httpx
+    HTTP2_AVAILABLE = True
+except ImportError:
+    HTTP2_AVAILABLE = False
+
+try:
+    import orjson
+
+    def json_loads(data: bytes) -> Any:
+        return orjson.loads(data)
+
+    def json_dumps(data: Any) -> bytes:
+        return orjson.dumps(data)
+except ImportError:
+    import json
+
+    def json_loads(data: bytes) -> Any:
+        return json.loads(data)
+
+    def json_dumps(data: Any) -> bytes:
+        return json.dumps(data).encode()
+
+# Largest provider response body read into memory
+MAX_RESPONSE_BYTES = int(os.getenv("HTTP_MAX_RESPONSE_BYTES", str(2 * 1024 * 1024)))
+
+# Maps a decoded provider response to the fields a caller keeps
+Projection = Callable[[Any], Dict[str, Any]]
+
+
+class HttpClientRegistry:
+    """Long-lived, pooled httpx clients keyed by provider host.
+
+    Each provider (api.yutori.com, api.freepik.com, ...) gets its own
+    AsyncClient so connections are kept alive across create/poll calls
+    instead of paying a TCP+TLS handshake per request.
+    """
+
+    def __init__(self):
+        self.clients: Dict[str, httpx.AsyncClient] = {}
+        self.max_connections = int(os.getenv("HTTP_MAX_CONNECTIONS", "100"))
+        self.max_keepalive_connections = int(os.getenv("HTTP_MAX_KEEPALIVE_CONNECTIONS", "20"))
+        self.keepalive_expiry = float(os.getenv("HTTP_KEEPALIVE_EXPIRY", "60"))
+        self.http2 = os.getenv("HTTP2_ENABLED", "true").lower() == "true" and HTTP2_AVAILABLE
+
+    def get_client(self, provider: str) -> httpx.AsyncClient:
+        """Get (or lazily create) the pooled client for a provider host."""
+        client = self.clients.get(provider)
+        if client is None or client.is_closed:
+            client = httpx.AsyncClient(
+                http2=self.http2,
+                limits=httpx.Limits(
+                    max_connections=self.max_connections,
+                    max_keepalive_connections=self.max_keepalive_connections,
+                    keepalive_expiry=self.keepalive_expiry
+                ),
+                timeout=30.0
+            )
+            self.clients[provider] = client
+            logger.info(f"Opened HTTP client for {provider} (http2={self.http2})")
+        return client
+
+    def open(self, *providers: str):
+        """Eagerly create clients for known providers at startup."""
+        for provider in providers:
+            self.get_client(provider)
+
+    async def aclose(self):
+        """Close every pooled client."""
+        clients = list(self.clients.items())
+        self.clients.clear()
+        for provider, client in clients:
+            try:
+                await client.aclose()
+            except Exception as e:
+                logger.error(f"Error closing HTTP client for {provider}: {str(e)}")
+
+
+# Global registry instance
+http_clients = HttpClientRegistry()
+
+
+class CircuitBreaker:
+    """Per-provider breaker over a rolling error-rate window.
+
+    closed: requests flow; the breaker opens once at least min_requests
+    were seen in the last window seconds and error_threshold of them
+    failed. open: requests fail fast for open_seconds. half_open: up to
+    half_open_max probe requests go through; a success closes the
+    breaker, a failure opens it again.
+    """
+
+    CLOSED, HALF_OPEN, OPEN = "closed", "half_open", "open"
+
+    def __init__(self, provider: str, window: float = 30.0, error_threshold: float = 0.5,
+                 min_requests: int = 10, open_seconds: float = 30.0, half_open_max: int = 1):
+        self.provider = provider
+        self.window = window
+        self.error_threshold = error_threshold
+        self.min_requests = min_requests
+        self.open_seconds = open_seconds
+        self.half_open_max = half_open_max
+        self.state = self.CLOSED
+        self.opened_at = 0.0
+        self._probes = 0
+        self._outcomes: Deque[Tuple[float, bool]] = deque()
+        self._errors = 0
+        self._set_state(self.CLOSED)
+
+    def allow(self) -> Optional[float]:
+        """None if a request may go out, else seconds until the next probe."""
+        if self.state == self.OPEN:
+            remaining = self.opened_at + self.open_seconds - time.monotonic()
+            if remaining > 0:
+                return remaining
+            self._set_state(self.HALF_OPEN)
+        if self.state == self.HALF_OPEN:
+            if self._probes >= self.half_open_max:
+                return 1.0
+            self._probes += 1
+        return None
+
+    def record(self, success: bool):
+        if self.state == self.HALF_OPEN:
+            self._probes = max(0, self._probes - 1)
+            if success:
+                self._outcomes.clear()
+                self._errors = 0
+                self._set_state(self.CLOSED)
+            else:
+                self._open()
+            return
+        if self.state == self.OPEN:
+            return
+
+        now = time.monotonic()
+        self._outcomes.append((now, success))
+        if not success:
+            self._errors += 1
+        while self._outcomes and self._outcomes[0][0] < now - self.window:
+            if not self._outcomes.popleft()[1]:
+                self._errors -= 1
+        total = len(self._outcomes)
+        if total >= self.min_requests and self._errors / total >= self.error_threshold:
+            self._open()
+
+    def abandon(self):
+        """A permitted request never completed (e.g. it was cancelled)."""
+        if self.state == self.HALF_OPEN:
+            self._probes = max(0, self._probes - 1)
+
+    def _open(self):
+        self.opened_at = time.monotonic()
+        self._probes = 0
+        self._set_state(self.OPEN)
+        logger.warning(f"Circuit opened for {self.provider}")
+
+    def _set_state(self, state: str):
+        self.state = state
+        HTTP_CIRCUIT_STATE.labels(provider=self.provider).set(CIRCUIT_STATE_VALUES[state])
+
+
+# Gauge values for sixseven_http_circuit_state
+CIRCUIT_STATE_VALUES = {CircuitBreaker.CLOSED: 0, CircuitBreaker.HALF_OPEN: 1, CircuitBreaker.OPEN: 2}
+
+
+class CircuitOpenError(Exception):
+    """Raised instead of sending a request while a provider's breaker is open."""
+
+    def __init__(self, provider: str, retry_after: float):
+        self.provider = provider
+        self.retry_after = retry_after
+        super().__init__(f"{provider} is unavailable (circuit open); retry in {retry_after:.0f}s")
+
+
+class ProviderGuard:
+    """Circuit breaker plus a cap on concurrent in-flight requests for one provider."""
+
+    def __init__(self, provider: str):
+        self.provider = provider
+        self.breaker = CircuitBreaker(
+            provider,
+            window=float(os.getenv("CIRCUIT_WINDOW_SECONDS", "30")),
+            error_threshold=float(os.getenv("CIRCUIT_ERROR_THRESHOLD", "0.5")),
+            min_requests=int(os.getenv("CIRCUIT_MIN_REQUESTS", "10")),
+            open_seconds=float(os.getenv("CIRCUIT_OPEN_SECONDS", "30"))
+        )
+        self.semaphore = asyncio.Semaphore(int(os.getenv("HTTP_PROVIDER_MAX_CONCURRENCY", "20")))
+        self.in_flight = 0
+
+
+_guards: Dict[str, ProviderGuard] = {}
+
+
+def get_guard(provider: str) -> ProviderGuard:
+    guard = _guards.get(provider)
+    if guard is None:
+        guard = _guards[provider] = ProviderGuard(provider)
+    return guard
+
+
+def _is_failure(status_code: Optional[int]) -> bool:
+    """Outcomes that say the provider is unhealthy (not that our request was bad)."""
+    return status_code is None or status_code == 429 or status_code >= 500
+
+
+def _retry_after(response: httpx.Response) -> Optional[float]:
+    """Retry-After header in seconds (delta-seconds form only)."""
+    value = response.headers.get("retry-after")
+    try:
+        return float(value) if value is not None else None
+    except ValueError:
+        return None
+
+
+def get_client_for_url(url: str) -> httpx.AsyncClient:
+    """Get the pooled client for the provider serving a URL."""
+    return http_clients.get_client(urlsplit(url).netloc)
+
+
+class ResponseTooLargeError(Exception):
+    """Raised when a provider response body exceeds the size cap."""
+
+    def __init__(self, url: str, max_bytes: int):
+        super().__init__(f"Response from {urlsplit(url).netloc} exceeded {max_bytes} bytes")
+
+
+async def _read_capped(response: httpx.Response, url: str, max_bytes: int) -> bytes:
+    """Stream a response body, giving up as soon as it passes max_bytes."""
+    length = response.headers.get("content-length")
+    if length and length.isdigit() and int(length) > max_bytes:
+        raise ResponseTooLargeError(url, max_bytes)
+    body = bytearray()
+    async for chunk in response.aiter_bytes():
+        body.extend(chunk)
+        if len(body) > max_bytes:
+            raise ResponseTooLargeError(url, max_bytes)
+    return bytes(body)
+
+
+async def _send(method: str, url: str, headers: Dict[str, str],
+                json_data: Optional[Dict[str, Any]], timeout: float,
+                max_bytes: int) -> Tuple[httpx.Response, bytes]:
+    """One request through the provider's breaker and concurrency cap.
+
+    Returns the (closed) response and its body, read with a size cap.
+    Raises CircuitOpenError without touching the network while the
+    provider's breaker is open.
+    """
+    provider = urlsplit(url).netloc
+    guard = get_guard(provider)
+    wait = guard.breaker.allow()
+    if wait is not None:
+        HTTP_CIRCUIT_REJECTED.labels(provider=provider).inc()
+        raise CircuitOpenError(provider, wait)
+
+    success = None
+    try:
+        # Waiting for a slot happens after allow(), so a cancel here must give the probe back too
+        async with guard.semaphore:
+            guard.in_flight += 1
+            HTTP_INFLIGHT.labels(provider=provider).set(guard.in_flight)
+            try:
+                client = http_clients.get_client(provider)
+                content = None
+                if json_data is not None:
+                    content = json_dumps(json_data)
+                    headers = {"Content-Type": "application/json", **headers}
+                request = client.build_request(method, url, headers=headers, content=content, timeout=timeout)
+                response = await client.send(request, stream=True)
+                try:
+                    body = await _read_capped(response, url, max_bytes)
+                finally:
+                    await response.aclose()
+                success = not _is_failure(response.status_code)
+                return response, body
+            except ResponseTooLargeError:
+                # The provider answered; an oversized body is not an outage
+                success = True
+                raise
+            except httpx.TransportError:
+                success = False
+                raise
+            finally:
+                guard.in_flight -= 1
+                HTTP_INFLIGHT.labels(provider=provider).set(guard.in_flight)
+    finally:
+        if success is None:
+            # Cancelled by the caller (or a bug on our side); says nothing about the provider
+            guard.breaker.abandon()
+        else:
+            guard.breaker.record(success)
+
+
+def _circuit_open_result(e: CircuitOpenError) -> Dict[str, Any]:
+    return {
+        "error": True,
+        "circuit_open": True,
+        "message": str(e),
+        "retry_after": e.retry_after
+    }
+
+
+def _decode_success(url: str, status_code: int, body: bytes,
+                    project: Optional[Projection]) -> Dict[str, Any]:
+    """Decode a 2xx body and apply project.
+
+    A body that does not decode or project is returned as an error result,
+    never retried: the provider already acted on the request (a POST may
+    have created a paid task).
+    """
+    try:
+        data = json_loads(body)
+        # Keep only what the caller needs; the raw payload is dropped here
+        return project(data) if project is not None else data
+    except Exception as e:
+        logger.error(f"Invalid response body from {urlsplit(url).netloc}: {str(e)}")
+        return {
+            "error": True,
+            "status_code": status_code,
+            "message": f"Invalid response body: {str(e)}"
+        }
+
+
+class RetryPolicy:
+    """Exponential backoff with full jitter, bounded by an overall deadline.
+
+    Only network errors and statuses in retryable_status are retried;
+    other 4xx responses fail on the first attempt. A Retry-After header
+    replaces the backoff delay. No attempt starts if it could not finish
+    within the deadline.
+    """
+
+    RETRYABLE_STATUS = frozenset({408, 425, 429, 500, 502, 503, 504})
+
+    def __init__(self, max_retries: int = 2, base_delay: float = 0.5, max_delay: float = 8.0,
+                 deadline: Optional[float] = 120.0, retryable_status: frozenset = RETRYABLE_STATUS):
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.deadline = deadline
+        self.retryable_status = retryable_status
+
+    @classmethod
+    def from_env(cls, prefix: str = "HTTP_RETRY", **defaults) -> "RetryPolicy":
+        policy = cls(**defaults)
+        policy.max_retries = int(os.getenv(f"{prefix}_MAX_RETRIES", str(policy.max_retries)))
+        policy.base_delay = float(os.getenv(f"{prefix}_BASE_DELAY", str(policy.base_delay)))
+        policy.max_delay = float(os.getenv(f"{prefix}_MAX_DELAY", str(policy.max_delay)))
+        deadline = os.getenv(f"{prefix}_DEADLINE")
+        if deadline is not None:
+            policy.deadline = float(deadline) if deadline else None
+        return policy
+
+    def is_retryable(self, status_code: Optional[int]) -> bool:
+        """None means the request never got a response (timeout, connection error)."""
+        return status_code is None or status_code in self.retryable_status
+
+    def backoff(self, attempt: int, retry_after: Optional[float] = None) -> float:
+        """Delay before retry number attempt + 1 (full jitter unless the server said when)."""
+        if retry_after is not None:
+            return max(0.0, retry_after)
+        return random.uniform(0, min(self.max_delay, self.base_delay * (2 ** attempt)))
+
+
+# Shared policies: task creation retries a couple of times; status polls
+# retry once since the poll scheduler polls again anyway
+default_retry_policy = RetryPolicy.from_env("HTTP_RETRY")
+poll_retry_policy = RetryPolicy.from_env("HTTP_POLL_RETRY", max_retries=1, deadline=20.0)
+
+
+async def _request_with_retry(
+    method: str,
+    url: str,
+    headers: Dict[str, str],
+    json_data: Optional[Dict[str, Any]],
+    timeout: float,
+    retry: RetryPolicy,
+    project: Optional[Projection]
+) -> Dict[str, Any]:
+    started = time.monotonic()
+    attempt = 0
+    while True:
+        attempt_timeout = timeout
+        if retry.deadline is not None:
+            attempt_timeout = min(timeout, max(0.1, started + retry.deadline - time.monotonic()))
+        status_code = None
+        retry_after = None
+        try:
+            response, body = await _send(method, url, headers, json_data, attempt_timeout, MAX_RESPONSE_BYTES)
+        except CircuitOpenError as e:
+            logger.warning(str(e))
+            return _circuit_open_result(e)
+        except ResponseTooLargeError as e:
+            logger.error(str(e))
+            return {"error": True, "message": str(e)}
+        except httpx.TransportError as e:
+            # Timeouts and connection errors only; anything else is a bug, not retried
+            logger.error(f"Request error on attempt {attempt + 1}: {str(e)}")
+            result = {
+                "error": True,
+                "message": str(e)
+            }
+        else:
+            if response.is_success:
+                return _decode_success(url, response.status_code, body, project)
+            status_code = response.status_code
+            retry_after = _retry_after(response)
+            text = body[:500].decode("utf-8", errors="replace")
+            logger.error(f"HTTP error on attempt {attempt + 1}: {status_code} - {text}")
+            result = {
+                "error": True,
+                "status_code": status_code,
+                "message": text,
+                "retry_after": retry_after
+            }
+
+        if attempt >= retry.max_retries or not retry.is_retryable(status_code):
+            return result
+        delay = retry.backoff(attempt, retry_after)
+        if retry.deadline is not None and time.monotonic() + delay >= started + retry.deadline:
+            # Not enough budget left; let the caller decide (e.g. poll later)
+            return result
+        await asyncio.sleep(delay)
+        attempt += 1
+
 
 async def http_post_with_retry(
     url: str,
     headers: Dict[str, str],
     json_data: Optional[Dict[str, Any]] = None,
     timeout: float = 30.0,
-    max_retries: int = 2
+    retry: Optional[RetryPolicy] = None,
+    project: Optional[Projection] = None
 ) -> Dict[str, Any]:
-    """POST with timeout and retries."""
-    for attempt in range(max_retries + 1):
-        try:
-            async with httpx.AsyncClient(timeout=timeout) as client:
-                response = await client.post(url, headers=headers, json=json_data)
-                response.raise_for_status()
-                return response.json()
-        except httpx.HTTPStatusError as e:
-            logger.error(f"HTTP error on attempt {attempt + 1}: {e.response.status_code} - {e.response.text[:500]}")
-            if attempt == max_retries:
-                return {
-                    "error": True,
-                    "status_code": e.response.status_code,
-                    "message": e.response.text[:500]
-                }
-        except Exception as e:
-            logger.error(f"Request error on attempt {attempt + 1}: {str(e)}")
-            if attempt == max_retries:
-                return {
-                    "error": True,
-                    "message": str(e)
-                }
-    return {"error": True, "message": "Max retries exceeded"}
+    """POST with timeout and retries per the retry policy.
+
+    project, if given, maps the decoded JSON body to the fields the
+    caller keeps; it is not applied to error results.
+    """
+    return await _request_with_retry("POST", url, headers, json_data, timeout,
+                                     retry or default_retry_policy, project)
 
 
 async def http_get_with_retry(
     url: str,
     headers: Dict[str, str],
     timeout: float = 30.0,
-    max_retries: int = 2
+    retry: Optional[RetryPolicy] = None,
+    project: Optional[Projection] = None
 ) -> Dict[str, Any]:
-    """GET with timeout and retries."""
-    for attempt in range(max_retries + 1):
-        try:
-            async with httpx.AsyncClient(timeout=timeout) as client:
-                response = await client.get(url, headers=headers)
-                response.raise_for_status()
-                return response.json()
-        except httpx.HTTPStatusError as e:
-            logger.error(f"HTTP error on attempt {attempt + 1}: {e.response.status_code} - {e.response.text[:500]}")
-            if attempt == max_retries:
-                return {
-                    "error": True,
-                    "status_code": e.response.status_code,
-                    "message": e.response.text[:500]
-                }
-        except Exception as e:
-            logger.error(f"Request error on attempt {attempt + 1}: {str(e)}")
-            if attempt == max_retries:
-                return {
-                    "error": True,
-                    "message": str(e)
-                }
-    return {"error": True, "message": "Max retries exceeded"}
+    """GET with timeout and retries per the retry policy (see http_post_with_retry)."""
+    return await _request_with_retry("GET", url, headers, None, timeout,
+                                     retry or default_retry_policy, project)
@@ -0,0 +1,172 @@
+import asyncio
+import base64
+import binascii
+import io
+import logging
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional, Tuple
+from app.observability import IMAGE_BYTES_SAVED, IMAGE_PREPROCESS_SECONDS
+
+logger = logging.getLogger(__name__)
+
+try:
+    from PIL import Image, ImageOps
+    PILLOW_AVAILABLE = True
+except ImportError:
+    PILLOW_AVAILABLE = False
+
+# Smallest upload accepted as a real photo (a 512x512 JPEG is typically 50KB+)
+MIN_IMAGE_BYTES = 7500
+
+# Longest output edge Seedream renders; larger reference images add nothing
+MAX_IMAGE_EDGE = int(os.getenv("IMAGE_MAX_EDGE", "2048"))
+JPEG_QUALITY = int(os.getenv("IMAGE_JPEG_QUALITY", "85"))
+# JPEGs larger than this are re-encoded even when no downscale is needed
+TARGET_IMAGE_BYTES = int(os.getenv("IMAGE_TARGET_BYTES", str(1024 * 1024)))
+
+# EXIF tag holding the camera orientation (1-8)
+ORIENTATION_TAG = 0x0112
+
+# IJG luminance quantization table at quality 50, to estimate a JPEG's quality
+_BASE_LUMA_TABLE = (
+    16, 11, 10, 16, 24, 40, 51, 61, 12, 12, 14, 19, 26, 58, 60, 55,
+    14, 13, 16, 24, 40, 57, 69, 56, 14, 17, 22, 29, 51, 87, 80, 62,
+    18, 22, 37, 56, 68, 109, 103, 77, 24, 35, 55, 64, 81, 104, 113, 92,
+    49, 64, 78, 87, 103, 121, 120, 101, 72, 92, 95, 98, 112, 100, 103, 99
+)
+
+# Decoding and resizing release the GIL, so a small pool keeps them off the event loop
+_image_pool = ThreadPoolExecutor(
+    max_workers=int(os.getenv("IMAGE_WORKERS", "2")),
+    thread_name_prefix="image"
+)
+
+
+class InvalidImageError(ValueError):
+    """Raised when an uploaded image cannot be used."""
+
+
+def decode_base64_image(value: str) -> bytes:
+    """Decode a base64 image string, with or without a data URI prefix."""
+    if value.startswith("data:"):
+        # Remove "data:image/jpeg;base64," or similar prefix
+        value = value.split(",", 1)[1] if "," in value else value
+    try:
+        # Line-wrapped base64 is fine; any other non-alphabet character is not
+        return base64.b64decode("".join(value.split()), validate=True)
+    except (binascii.Error, ValueError) as e:
+        raise InvalidImageError(f"Image is not valid base64: {str(e)}")
+
+
+def encode_base64_image(image: bytes) -> str:
+    """Base64-encode image bytes for providers that only accept JSON."""
+    return base64.b64encode(image).decode("ascii")
+
+
+def target_size(aspect_ratio: str, max_edge: int = MAX_IMAGE_EDGE) -> Tuple[int, int]:
+    """Largest output frame for an aspect ratio like "16:9" ("original" is square)."""
+    try:
+        w, h = (float(part) for part in aspect_ratio.split(":"))
+    except ValueError:
+        return max_edge, max_edge
+    if w >= h:
+        return max_edge, max(1, round(max_edge * h / w))
+    return max(1, round(max_edge * w / h)), max_edge
+
+
+def jpeg_quality(img: "Image.Image") -> Optional[int]:
+    """Estimated IJG quality (1-100) of an opened JPEG, from its luminance table."""
+    tables = getattr(img, "quantization", None)
+    if not tables or 0 not in tables:
+        return None
+    scale = sum(tables[0]) * 100 / sum(_BASE_LUMA_TABLE)
+    quality = (200 - scale) / 2 if scale <= 100 else 5000 / scale
+    return max(1, min(100, round(quality)))
+
+
+def _decode_error(e: Exception) -> InvalidImageError:
+    return InvalidImageError(f"Image could not be decoded: {str(e)}")
+
+
+def validate_image(image: bytes):
+    """Raise InvalidImageError unless the image fully decodes.
+
+    JPEGs are decoded at reduced scale, so this is much cheaper than
+    normalize_image.
+    """
+    try:
+        with Image.open(io.BytesIO(image)) as img:
+            img.draft("RGB", (max(1, img.width // 8), max(1, img.height // 8)))
+            img.load()
+    except (OSError, SyntaxError, ValueError, Image.DecompressionBombError) as e:
+        raise _decode_error(e)
+
+
+def normalize_image(image: bytes, aspect_ratio: str = "original") -> Tuple[bytes, Optional[Tuple[int, int]]]:
+    """Decode, downscale to the output frame and re-encode as JPEG.
+
+    Returns the bytes to send and the new size, or the original bytes and
+    None when they are already a JPEG inside the frame, at or below
+    JPEG_QUALITY and TARGET_IMAGE_BYTES. Raises InvalidImageError if the
+    image cannot be decoded.
+    """
+    frame_w, frame_h = target_size(aspect_ratio)
+    try:
+        with Image.open(io.BytesIO(image)) as img:
+            src_format = img.format
+            # Size as displayed: EXIF orientations 5-8 swap width and height
+            orientation = img.getexif().get(ORIENTATION_TAG, 1)
+            width, height = img.size if orientation < 5 else img.size[::-1]
+            # Cover the output frame; the original ratio is kept
+            scale = min(1.0, max(frame_w / width, frame_h / height))
+            size = (max(1, round(width * scale)), max(1, round(height * scale)))
+            if (scale == 1.0 and src_format == "JPEG" and len(image) <= TARGET_IMAGE_BYTES
+                    and (jpeg_quality(img) or 0) <= JPEG_QUALITY):
+                img.load()
+                return image, None
+            # Let the JPEG decoder skip detail we are about to throw away (draft wants stored size)
+            img.draft("RGB", size if orientation < 5 else size[::-1])
+            img = ImageOps.exif_transpose(img)
+            if img.mode != "RGB":
+                img = img.convert("RGB")
+            if img.size != size and scale < 1.0:
+                img = img.resize(size, Image.Resampling.LANCZOS, reducing_gap=3.0)
+            out = io.BytesIO()
+            img.save(out, format="JPEG", quality=JPEG_QUALITY, optimize=True)
+    except (OSError, SyntaxError, ValueError, Image.DecompressionBombError) as e:
+        raise _decode_error(e)
+
+    encoded = out.getvalue()
+    if scale == 1.0 and len(encoded) >= len(image):
+        # Re-encoding at full size did not help; send it as is
+        return image, None
+    return encoded, img.size
+
+
+async def check_image(image: bytes):
+    """validate_image on the image thread pool; a no-op without Pillow."""
+    if not PILLOW_AVAILABLE:
+        return
+    await asyncio.get_running_loop().run_in_executor(_image_pool, validate_image, image)
+
+
+async def prepare_image(image: bytes, aspect_ratio: str = "original") -> bytes:
+    """Normalize an image on the image thread pool; a no-op without Pillow."""
+    if not PILLOW_AVAILABLE:
+        return image
+    start = time.perf_counter()
+    loop = asyncio.get_running_loop()
+    try:
+        result, size = await loop.run_in_executor(_image_pool, normalize_image, image, aspect_ratio)
+    except InvalidImageError:
+        IMAGE_PREPROCESS_SECONDS.labels(outcome="invalid").observe(time.perf_counter() - start)
+        raise
+    IMAGE_PREPROCESS_SECONDS.labels(outcome="unchanged" if size is None else "resized").observe(
+        time.perf_counter() - start
+    )
+    if size is not None:
+        IMAGE_BYTES_SAVED.inc(max(0, len(image) - len(result)))
+        logger.info(f"Normalized image to {size[0]}x{size[1]}: {len(image)} -> {len(result)} bytes")
+    return result
@@ -0,0 +1,38 @@
+"""
+Provider webhook support - callback URLs and poll fallback when enabled
+"""
+import os
+from typing import Any, Dict, Optional
+from app.scheduler import PollPolicy
+
+PROVIDERS = ("yutori", "freepik")
+
+
+def webhook_url(provider: str) -> Optional[str]:
+    """Public callback URL to hand to a provider, or None if webhooks are off."""
+    base_url = os.getenv("WEBHOOK_BASE_URL", "").rstrip("/")
+    if not base_url:
+        return None
+    url = f"{base_url}/v1/webhooks/{provider}"
+    secret = os.getenv("WEBHOOK_SECRET", "")
+    if secret:
+        url += f"?token={secret}"
+    return url
+
+
+def webhooks_enabled() -> bool:
+    return bool(os.getenv("WEBHOOK_BASE_URL"))
+
+
+def poll_policy(initial: float, max_interval: float) -> PollPolicy:
+    """Adaptive poll policy, or a slow fixed fallback when webhooks are on."""
+    if webhooks_enabled():
+        fallback = float(os.getenv("WEBHOOK_FALLBACK_POLL_INTERVAL", "30"))
+        return PollPolicy(fallback, fallback, multiplier=1.0)
+    return PollPolicy(initial, max_interval)
+
+
+def extract_task_id(payload: Dict[str, Any]) -> Optional[str]:
+    """Find the provider task id in a webhook body."""
+    data = payload.get("data") if isinstance(payload.get("data"), dict) else {}
+    return payload.get("task_id") or payload.get("id") or data.get("task_id") or data.get("id")
@@ -0,0 +1,96 @@
+#!/usr/bin/env python3
+"""Benchmark memory per retained job: Pydantic Job models vs slotted JobRecords.
+
+Builds the same jobs both ways (a research job with its input, result,
+heartbeat and an event history) and reports traced bytes per job, plus
+the cost of the snapshot the store takes on every write.
+
+Usage: python bench_job_memory.py [--jobs 10000] [--events 10]
+"""
+
+import argparse
+import gc
+import time
+import tracemalloc
+from datetime import datetime
+from typing import Callable, List
+
+from app.models import Job, JobEvent, JobHeartbeat, JobInput
+from app.records import HeartbeatRecord, InputRecord, JobRecord, JobStatus, JobType
+
+
+def result(i: int) -> dict:
+    return {
+        "task_id": f"task-{i}",
+        "structured_result": {"answer": f"Answer {i}", "bullets": [], "citations": []}
+    }
+
+
+def build_model(i: int, events: int) -> Job:
+    now = datetime.utcnow()
+    return Job(
+        session_id=f"session-{i % 200}",
+        type="research",
+        status="succeeded",
+        input=JobInput(command_text=f"research topic {i}", query_or_prompt=f"topic {i}"),
+        result=result(i),
+        events=[JobEvent(ts=now, level="info", message=f"Step {n}", seq=n + 1) for n in range(events)],
+        heartbeat=JobHeartbeat(ts=now, provider_status="succeeded", elapsed_seconds=30, polls=12)
+    )
+
+
+def build_record(i: int, events: int) -> JobRecord:
+    job = JobRecord(
+        session_id=f"session-{i % 200}",
+        type=JobType.RESEARCH,
+        status=JobStatus.SUCCEEDED,
+        input=InputRecord(command_text=f"research topic {i}", query_or_prompt=f"topic {i}"),
+        result=result(i)
+    )
+    for n in range(events):
+        job.add_event("info", f"Step {n}")
+    job.heartbeat = HeartbeatRecord(datetime.utcnow(), "succeeded", 30, 12)
+    return job
+
+
+def bytes_per_job(build: Callable[[int, int], object], jobs: int, events: int) -> float:
+    gc.collect()
+    tracemalloc.start()
+    start, _ = tracemalloc.get_traced_memory()
+    kept: List[object] = [build(i, events) for i in range(jobs)]
+    end, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del kept
+    return (end - start) / jobs
+
+
+def snapshot_us(job, copy: Callable, rounds: int = 20000) -> float:
+    start = time.perf_counter()
+    for _ in range(rounds):
+        copy(job)
+    return (time.perf_counter() - start) / rounds * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--jobs", type=int, default=10000)
+    parser.add_argument("--events", type=int, default=10)
+    args = parser.parse_args()
+
+    model_bytes = bytes_per_job(build_model, args.jobs, args.events)
+    record_bytes = bytes_per_job(build_record, args.jobs, args.events)
+    # What the store did per write before: a model copy with its own events container
+    model_copy = snapshot_us(build_model(0, args.events),
+                             lambda job: job.model_copy(update={"events": list(job.events)}))
+    record_copy = snapshot_us(build_record(0, args.events), JobRecord.snapshot)
+
+    print(f"{args.jobs} jobs x {args.events} events")
+    print(f"  {'':<18} {'bytes/job':>10} {'snapshot us':>12}")
+    print(f"  {'Pydantic Job':<18} {model_bytes:>10.0f} {model_copy:>12.2f}")
+    print(f"  {'JobRecord':<18} {record_bytes:>10.0f} {record_copy:>12.2f}")
+    print(f"  saving: {1 - record_bytes / model_bytes:.0%} memory, "
+          f"{model_copy / record_copy:.2f}x snapshot speed")
+
+
+if __name__ == "__main__":
+    main()
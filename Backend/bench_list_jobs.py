@@ -0,0 +1,91 @@
+#!/usr/bin/env python3
+"""Benchmark GET /v1/jobs serialization: response_model round trip vs one-pass dump.
+
+Runs the endpoints in-process (no network) against the same store of
+jobs, each carrying a full event history, and prints requests/second
+and response size, including the view=summary projection.
+
+Usage: python bench_list_jobs.py [--jobs 100] [--events 50] [--requests 300]
+"""
+
+import argparse
+import asyncio
+import time
+from typing import List, Tuple
+
+import httpx
+from fastapi import FastAPI
+
+from app.main import app, store
+from app.models import Job
+from app.records import InputRecord, JobRecord, JobStatus, JobType
+
+
+def fill_store(jobs: int, events: int):
+    """Create jobs that look like finished research tasks."""
+    for i in range(jobs):
+        job = JobRecord(
+            session_id="bench",
+            type=JobType.RESEARCH,
+            input=InputRecord(command_text=f"research topic {i}", query_or_prompt=f"topic {i}")
+        )
+        for n in range(events):
+            job.add_event("info", "Polling update", {"status": "running", "poll": n})
+        job.status = JobStatus.SUCCEEDED
+        job.progress = 100
+        job.result = {
+            "summary": "Lorem ipsum dolor sit amet. " * 20,
+            "bullets": [f"Finding {n}" for n in range(5)],
+            "citations": [{"title": f"Source {n}", "url": f"https://example.com/{n}"} for n in range(5)]
+        }
+        store.create_job(job)
+
+
+def baseline_app() -> FastAPI:
+    """The previous list endpoint: return job data and let FastAPI validate/encode it."""
+    baseline = FastAPI()
+
+    @baseline.get("/v1/jobs", response_model=List[Job])
+    async def list_jobs(limit: int = 100):
+        return [job.to_dict() for job in store.list_jobs(session_id="bench", limit=limit)]
+
+    return baseline
+
+
+async def measure(target: FastAPI, path: str, requests: int) -> Tuple[float, int]:
+    """Returns (requests/second, response bytes)."""
+    transport = httpx.ASGITransport(app=target)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        # Warm up route and serializer caches
+        for _ in range(5):
+            response = await client.get(path)
+            response.raise_for_status()
+        start = time.perf_counter()
+        for _ in range(requests):
+            (await client.get(path)).raise_for_status()
+        return requests / (time.perf_counter() - start), len(response.content)
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--jobs", type=int, default=100)
+    parser.add_argument("--events", type=int, default=50)
+    parser.add_argument("--requests", type=int, default=300)
+    args = parser.parse_args()
+
+    fill_store(args.jobs, args.events)
+    path = f"/v1/jobs?session_id=bench&limit={min(args.jobs, 100)}"
+
+    before, before_size = await measure(baseline_app(), path, args.requests)
+    after, after_size = await measure(app, path, args.requests)
+    summary, summary_size = await measure(app, path + "&view=summary", args.requests)
+
+    print(f"{args.jobs} jobs x {args.events} events, {args.requests} requests")
+    print(f"  before (response_model): {before:8.1f} req/s {before_size:>9} bytes")
+    print(f"  after  (one-pass dump):  {after:8.1f} req/s {after_size:>9} bytes")
+    print(f"  view=summary:            {summary:8.1f} req/s {summary_size:>9} bytes")
+    print(f"  speedup: {after / before:.2f}x full, {summary / before:.2f}x summary")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,117 @@
+#!/usr/bin/env python3
+"""Benchmark job store lock contention: single-lock vs lock-striped store.
+
+Worker threads run the poll-loop mix (get_job + versioned update_job, update_session)
+while one more thread keeps listing job summaries, as a dashboard would.
+Reports worker throughput, p99 poll-loop latency and the dashboard's list
+rate per thread count; --no-lister leaves the dashboard out.
+
+On GIL CPython the sharded store does not come out ahead: the critical
+sections are short pure-Python code the GIL already serializes, and a
+sharded list takes every shard's lock and merges one page per shard.
+
+Usage: python bench_store_contention.py [--jobs 2000] [--ops 20000] [--shards 16] [--no-lister]
+"""
+
+import argparse
+import random
+import threading
+import time
+from functools import partial
+from typing import List, Tuple
+
+from app.records import InputRecord, JobRecord, JobType, SessionRecord
+from app.sharded_store import ShardedJobStore
+from app.store import InMemoryJobStore, JobStore
+
+
+def fill_store(store: JobStore, jobs: int) -> List[str]:
+    job_ids = []
+    for i in range(jobs):
+        job = JobRecord(
+            session_id=f"session-{i % 200}",
+            type=JobType.RESEARCH if i % 2 else JobType.CREATIVE,
+            input=InputRecord(command_text=f"command {i}", query_or_prompt=f"topic {i}")
+        )
+        store.create_job(job)
+        store.update_session(SessionRecord(session_id=job.session_id, active_job_id=job.job_id))
+        job_ids.append(job.job_id)
+    return job_ids
+
+
+def set_progress(job: JobRecord, progress: int) -> bool:
+    job.progress = progress
+    return True
+
+
+def worker(store: JobStore, job_ids: List[str], ops: int, seed: int,
+           start: threading.Barrier, latencies: List[float]):
+    rng = random.Random(seed)
+    start.wait()
+    for n in range(ops):
+        job_id = rng.choice(job_ids)
+        t0 = time.perf_counter()
+        job, _ = store.modify_job(job_id, partial(set_progress, progress=n % 100))
+        store.update_session(SessionRecord(session_id=job.session_id, active_job_id=job_id))
+        latencies.append(time.perf_counter() - t0)
+
+
+def lister(store: JobStore, stop: threading.Event, lists: List[int]):
+    while not stop.is_set():
+        store.list_job_summaries(limit=100)
+        lists[0] += 1
+
+
+def run(store: JobStore, job_ids: List[str], threads: int, ops: int,
+        listing: bool = True) -> Tuple[float, float, float]:
+    """Returns (operations/second, p99 latency in microseconds, lists/second)."""
+    per_thread = ops // threads
+    start = threading.Barrier(threads + 1)
+    latencies: List[List[float]] = [[] for _ in range(threads)]
+    pool = [
+        threading.Thread(target=worker, args=(store, job_ids, per_thread, i, start, latencies[i]))
+        for i in range(threads)
+    ]
+    stop = threading.Event()
+    lists = [0]
+    dashboard = threading.Thread(target=lister, args=(store, stop, lists))
+    for t in pool:
+        t.start()
+    if listing:
+        dashboard.start()
+    start.wait()
+    t0 = time.perf_counter()
+    for t in pool:
+        t.join()
+    elapsed = time.perf_counter() - t0
+    stop.set()
+    if listing:
+        dashboard.join()
+    merged = sorted(x for xs in latencies for x in xs)
+    return per_thread * threads / elapsed, merged[int(len(merged) * 0.99)] * 1e6, lists[0] / elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--jobs", type=int, default=2000)
+    parser.add_argument("--ops", type=int, default=20000)
+    parser.add_argument("--shards", type=int, default=16)
+    parser.add_argument("--no-lister", action="store_true", help="run without the dashboard thread")
+    args = parser.parse_args()
+
+    stores = {
+        "single lock": InMemoryJobStore(),
+        f"{args.shards} shards": ShardedJobStore(args.shards),
+    }
+    job_ids = {name: fill_store(store, args.jobs) for name, store in stores.items()}
+
+    print(f"{args.jobs} jobs, {args.ops} operations per run")
+    print(f"  {'threads':>7}  {'store':<12} {'ops/s':>10} {'p99 us':>9} {'lists/s':>8}")
+    for threads in (1, 2, 4, 8, 16):
+        for name, store in stores.items():
+            rate, p99, list_rate = run(store, job_ids[name], threads, args.ops, not args.no_lister)
+            print(f"  {threads:>7}  {name:<12} {rate:>10.0f} {p99:>9.1f} {list_rate:>8.0f}")
+
+
+if __name__ == "__main__":
+    main()
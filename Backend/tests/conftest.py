@@ -0,0 +1,37 @@
+"""Shared fixtures: the JobStore backends and a job factory."""
+import pytest
+from app.records import InputRecord, JobRecord, JobStatus, JobType
+from app.sharded_store import ShardedJobStore
+from app.sqlite_store import SqliteJobStore
+from app.store import InMemoryJobStore
+
+
+@pytest.fixture(params=["memory", "sharded", "sqlite"])
+def store(request, tmp_path):
+    """Every store backend; narrow with parametrize(..., indirect=True)."""
+    if request.param == "memory":
+        job_store = InMemoryJobStore()
+    elif request.param == "sharded":
+        job_store = ShardedJobStore(4)
+    else:
+        job_store = SqliteJobStore(str(tmp_path / "jobs.db"))
+    yield job_store
+    job_store.close()
+
+
+@pytest.fixture
+def make_job():
+    def make(session_id="s1", type=JobType.RESEARCH, status=JobStatus.QUEUED, query="topic"):
+        return JobRecord(
+            type=type,
+            input=InputRecord(command_text=f"research {query}", query_or_prompt=query),
+            session_id=session_id,
+            status=status
+        )
+    return make
+
+
+def finish(store, job, status=JobStatus.SUCCEEDED):
+    """Move a stored job to a terminal status through a versioned write."""
+    job.status = status
+    return store.update_job(job)
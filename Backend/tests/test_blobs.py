@@ -0,0 +1,80 @@
+import os
+
+from app.blobs import BlobStore
+
+
+def blob(n, size=100):
+    return bytes([n]) * size
+
+
+def test_identical_uploads_share_one_entry():
+    blobs = BlobStore()
+    first, second = blobs.put(blob(1)), blobs.put(blob(1))
+    assert first == second and len(first) == 64
+    assert blobs.memory_bytes == 100
+    assert blobs.put(blob(2)) != first
+
+
+def test_lru_eviction_without_spill_skips_pinned_blobs():
+    blobs = BlobStore(memory_budget=350)
+    pinned = blobs.put(blob(1))
+    older = blobs.put(blob(2))
+    blobs.release(older)
+    newer = blobs.put(blob(3))
+    blobs.release(newer)
+    blobs.get(older)
+
+    blobs.put(blob(4))
+    # Oldest unpinned goes first: blob 3, since reading blob 2 made it recent
+    assert not blobs.contains(newer)
+    assert blobs.contains(pinned) and blobs.contains(older)
+    assert blobs.memory_bytes == 300
+
+
+
+def test_pinned_blob_outlives_the_budget_until_its_last_release():
+    blobs = BlobStore(memory_budget=50)
+    ref = blobs.put(blob(1))
+    assert blobs.put(blob(1)) == ref
+    blobs.release(ref)
+    assert blobs.get(ref) == blob(1)
+    blobs.release(ref)
+    assert not blobs.contains(ref)
+    assert blobs.memory_bytes == 0
+
+
+def test_over_budget_blobs_spill_to_disk_and_come_back(tmp_path):
+    blobs = BlobStore(memory_budget=150, spill_dir=str(tmp_path))
+    first = blobs.put(blob(1))
+    second = blobs.put(blob(2))
+    assert (blobs.memory_bytes, blobs.disk_bytes) == (100, 100)
+    assert os.listdir(tmp_path) == [first]
+
+    assert blobs.get(first) == blob(1)
+    # Promoting first pushed second out to disk in its place
+    assert sorted(os.listdir(tmp_path)) == [second]
+    assert blobs.get(second) == blob(2)
+
+
+def test_disk_tier_is_trimmed_but_keeps_pinned_blobs(tmp_path):
+    blobs = BlobStore(memory_budget=0, spill_dir=str(tmp_path), disk_budget=150)
+    pinned = blobs.put(blob(1))
+    released = blobs.put(blob(2))
+    blobs.release(released)
+    assert not blobs.contains(released)
+    assert blobs.contains(pinned) and blobs.get(pinned) == blob(1)
+    assert os.listdir(tmp_path) == [pinned]
+
+
+def test_pinned_blobs_survive_a_restart(tmp_path):
+    blobs = BlobStore(spill_dir=str(tmp_path))
+    pinned = blobs.put(blob(1))
+    finished = blobs.put(blob(2))
+    blobs.release(finished)
+    blobs.close()
+
+    restarted = BlobStore(spill_dir=str(tmp_path))
+    assert restarted.disk_bytes == 100
+    assert restarted.pin(pinned)
+    assert restarted.get(pinned) == blob(1)
+    assert not restarted.pin(finished)
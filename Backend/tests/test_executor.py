@@ -0,0 +1,99 @@
+import asyncio
+
+import pytest
+from app.executor import ExecutorClosedError, JobExecutor, QueueFullError
+from app.models import CommandRequest
+from app.orchestrator import OrchestratorAgent
+from app.records import JobStatus
+from app.store import InMemoryJobStore
+
+
+class RecordingObserver:
+    def __init__(self):
+        self.completed = []
+
+    def job_created(self, job):
+        pass
+
+    def job_started(self, job):
+        pass
+
+    def job_completed(self, job):
+        self.completed.append((job.job_id, job.status))
+
+
+def test_sessions_take_turns(make_job):
+    order = []
+
+    async def main():
+        executor = JobExecutor({"research": 1})
+        for session_id in ["busy", "busy", "busy", "quiet", "other"]:
+            job = make_job(session_id=session_id)
+            executor.submit(job, lambda s=session_id: asyncio.sleep(0, order.append(s)))
+        assert await executor.drain(timeout=1)
+        await executor.stop()
+
+    asyncio.run(main())
+    assert order == ["busy", "quiet", "other", "busy", "busy"]
+
+
+def test_full_queue_rejects_and_draining_closes(make_job):
+    async def main():
+        executor = JobExecutor({"research": 0}, max_queue=2)
+        for _ in range(2):
+            executor.submit(make_job(), lambda: asyncio.sleep(0))
+        with pytest.raises(QueueFullError) as full:
+            executor.submit(make_job(), lambda: asyncio.sleep(0))
+        assert (full.value.job_type, full.value.depth) == ("research", 2)
+        assert executor.queue_depth("research") == 2
+
+        assert not await executor.drain(timeout=0.01)
+        with pytest.raises(ExecutorClosedError):
+            executor.ensure_capacity("research")
+        await executor.stop()
+
+    asyncio.run(main())
+
+
+def test_job_cancelled_while_queued_is_discarded(make_job):
+    store = InMemoryJobStore()
+    queued = store.create_job(make_job())
+    ran, discarded = [], []
+
+    async def main():
+        executor = JobExecutor({"research": 1}, is_cancelled=store.is_cancelled)
+        release = asyncio.Event()
+        executor.submit(store.create_job(make_job()), release.wait)
+        executor.submit(queued, lambda: asyncio.sleep(0, ran.append(queued.job_id)),
+                        lambda: discarded.append(queued.job_id))
+        await asyncio.sleep(0)
+
+        # The executor holds its own copy; only the store knows about the cancel
+        store.modify_job(queued.job_id, lambda j: j.cancel("Cancelled by user"))
+        release.set()
+        assert await executor.drain(timeout=1)
+        await executor.stop()
+
+    asyncio.run(main())
+    assert ran == []
+    assert discarded == [queued.job_id]
+
+
+def test_stop_reports_a_queued_job_finished():
+    store = InMemoryJobStore()
+    observer = RecordingObserver()
+
+    async def main():
+        # No workers, so the research job stays queued
+        executor = JobExecutor({"research": 0, "creative": 0}, is_cancelled=store.is_cancelled)
+        orchestrator = OrchestratorAgent(store, observer, executor)
+        started = await orchestrator.handle_command(
+            CommandRequest(command_text="research tide tables", session_id="s1"))
+        stopped = await orchestrator.handle_command(CommandRequest(command_text="stop", session_id="s1"))
+        await executor.stop()
+        return started, stopped
+
+    started, stopped = asyncio.run(main())
+    assert stopped.cancelled_job_id == started.job_id
+    assert observer.completed == [(started.job_id, JobStatus.CANCELLED)]
+    assert store.get_job(started.job_id).status == JobStatus.CANCELLED
@@ -0,0 +1,138 @@
+import asyncio
+import itertools
+import time
+
+import httpx
+import pytest
+from app.utils import http
+from app.utils.http import CircuitBreaker, RetryPolicy, get_guard, http_get_with_retry, http_post_with_retry
+
+NO_WAIT = RetryPolicy(max_retries=2, base_delay=0, deadline=None)
+_hosts = itertools.count()
+
+
+@pytest.fixture
+def provider(monkeypatch):
+    """Serve requests from handler(request) on a new host with a fresh breaker."""
+    def serve(handler):
+        host = f"provider-{next(_hosts)}.test"
+        calls = []
+
+        def record(request):
+            calls.append(request)
+            return handler(request)
+        client = httpx.AsyncClient(transport=httpx.MockTransport(record))
+        monkeypatch.setitem(http.http_clients.clients, host, client)
+        return f"https://{host}/v1/tasks", calls
+
+    return serve
+
+
+def test_server_errors_are_retried_client_errors_are_not(provider):
+    url, calls = provider(lambda request: httpx.Response(503, text="busy"))
+    result = asyncio.run(http_get_with_retry(url, {}, retry=NO_WAIT))
+    assert (result["status_code"], len(calls)) == (503, 3)
+
+    url, calls = provider(lambda request: httpx.Response(400, text="bad prompt"))
+    result = asyncio.run(http_post_with_retry(url, {}, {"prompt": ""}, retry=NO_WAIT))
+    assert (result["status_code"], result["message"], len(calls)) == (400, "bad prompt", 1)
+
+
+def test_transport_errors_are_retried_and_count_against_the_breaker(provider):
+    def refuse(request):
+        raise httpx.ConnectError("refused", request=request)
+
+    url, calls = provider(refuse)
+    result = asyncio.run(http_get_with_retry(url, {}, retry=NO_WAIT))
+    assert result == {"error": True, "message": "refused"}
+    assert len(calls) == 3
+    breaker = get_guard(url.split("/")[2]).breaker
+    assert [ok for _, ok in breaker._outcomes] == [False, False, False]
+
+
+def test_other_exceptions_propagate_without_retry_or_breaker_failure(provider):
+    def broken(request):
+        raise ValueError("bug in our code")
+
+    url, calls = provider(broken)
+    with pytest.raises(ValueError):
+        asyncio.run(http_get_with_retry(url, {}, retry=NO_WAIT))
+    assert len(calls) == 1
+    assert not get_guard(url.split("/")[2]).breaker._outcomes
+
+
+def test_undecodable_success_body_is_not_retried(provider):
+    url, calls = provider(lambda request: httpx.Response(200, text="<html>oops</html>"))
+    result = asyncio.run(http_post_with_retry(url, {}, {"prompt": "cat"}, retry=NO_WAIT))
+    assert result["error"] and result["status_code"] == 200
+    assert len(calls) == 1
+
+
+def test_projection_keeps_only_what_the_caller_needs(provider):
+    url, _ = provider(lambda request: httpx.Response(200, json={"data": {"task_id": "t1", "huge": "x" * 1000}}))
+    result = asyncio.run(http_get_with_retry(url, {}, retry=NO_WAIT,
+                                             project=lambda body: {"task_id": body["data"]["task_id"]}))
+    assert result == {"task_id": "t1"}
+
+    url, calls = provider(lambda request: httpx.Response(200, json={"data": None}))
+    result = asyncio.run(http_get_with_retry(url, {}, retry=NO_WAIT,
+                                             project=lambda body: {"task_id": body["data"]["task_id"]}))
+    assert result["error"] and len(calls) == 1
+
+
+def test_oversized_response_is_cut_off(provider, monkeypatch):
+    monkeypatch.setattr(http, "MAX_RESPONSE_BYTES", 1024)
+    url, calls = provider(lambda request: httpx.Response(200, content=b"[" + b"0," * 1000 + b"0]"))
+    result = asyncio.run(http_get_with_retry(url, {}, retry=NO_WAIT))
+    assert result["error"] and "exceeded 1024 bytes" in result["message"]
+    assert len(calls) == 1
+
+
+def test_breaker_opens_on_error_rate_and_probes_after_cooldown():
+    breaker = CircuitBreaker("breaker.test", min_requests=4, error_threshold=0.5, open_seconds=0.05)
+    for success in (True, False, True):
+        breaker.record(success)
+    assert breaker.allow() is None
+    breaker.record(False)
+    assert breaker.state == CircuitBreaker.OPEN
+    assert breaker.allow() > 0
+
+    time.sleep(0.06)
+    assert breaker.allow() is None
+    assert breaker.state == CircuitBreaker.HALF_OPEN
+    # One probe at a time; an abandoned probe frees its slot
+    assert breaker.allow() == 1.0
+    breaker.abandon()
+    assert breaker.allow() is None
+    breaker.record(True)
+    assert breaker.state == CircuitBreaker.CLOSED
+
+
+def test_open_breaker_fails_fast_without_a_request(provider):
+    url, calls = provider(lambda request: httpx.Response(200, json={}))
+    get_guard(url.split("/")[2]).breaker._open()
+    result = asyncio.run(http_get_with_retry(url, {}, retry=NO_WAIT))
+    assert result["circuit_open"] and result["retry_after"] > 0
+    assert calls == []
+
+
+def test_probe_cancelled_while_waiting_for_a_slot_is_given_back(provider):
+    url, calls = provider(lambda request: httpx.Response(200, json={}))
+    guard = get_guard(url.split("/")[2])
+    guard.breaker._open()
+    guard.breaker.opened_at -= guard.breaker.open_seconds
+
+    async def main():
+        guard.semaphore = asyncio.Semaphore(0)
+        waiting = asyncio.ensure_future(http_get_with_retry(url, {}, retry=NO_WAIT))
+        await asyncio.sleep(0.01)
+        assert guard.breaker.state == CircuitBreaker.HALF_OPEN
+        waiting.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await waiting
+        guard.semaphore = asyncio.Semaphore(1)
+        return await http_get_with_retry(url, {}, retry=NO_WAIT)
+
+    assert asyncio.run(main()) == {}
+    assert len(calls) == 1
+    assert guard.breaker.state == CircuitBreaker.CLOSED
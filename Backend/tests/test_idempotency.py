@@ -0,0 +1,77 @@
+import asyncio
+
+import pytest
+from app.executor import JobExecutor
+from app.idempotency import IdempotencyCache
+from app.models import CommandRequest, CommandResponse
+from app.orchestrator import OrchestratorAgent
+from app.store import InMemoryJobStore
+
+
+def response(job_id):
+    return CommandResponse(intent="research", message="ok", session_id="s1", job_id=job_id)
+
+
+def test_concurrent_duplicates_run_once():
+    cache = IdempotencyCache()
+    runs = []
+
+    async def produce():
+        runs.append(True)
+        await asyncio.sleep(0.01)
+        return response(f"j{len(runs)}")
+
+    async def main():
+        first = await asyncio.gather(cache.run("k", produce), cache.run("k", produce))
+        return first, await cache.run("k", produce)
+
+    (first, second), later = asyncio.run(main())
+    assert (first[0].job_id, first[1]) == ("j1", False)
+    assert (second[0].job_id, second[1]) == ("j1", True)
+    assert (later[0].job_id, later[1]) == ("j1", True)
+    assert len(runs) == 1
+
+
+def test_failures_are_not_remembered():
+    cache = IdempotencyCache()
+
+    async def fail():
+        raise RuntimeError("boom")
+
+    async def main():
+        with pytest.raises(RuntimeError):
+            await cache.run("k", fail)
+        return await cache.run("k", lambda: asyncio.sleep(0, response("j2")))
+
+    replay, replayed = asyncio.run(main())
+    assert (replay.job_id, replayed) == ("j2", False)
+
+
+def test_entries_expire():
+    cache = IdempotencyCache()
+
+    async def main():
+        await cache.run("k", lambda: asyncio.sleep(0, response("j1")), ttl=0)
+        return await cache.run("k", lambda: asyncio.sleep(0, response("j2")))
+
+    assert asyncio.run(main())[0].job_id == "j2"
+
+
+def test_fingerprint_replays_until_the_job_is_stopped():
+    store = InMemoryJobStore()
+
+    async def main():
+        executor = JobExecutor({"research": 0, "creative": 0}, is_cancelled=store.is_cancelled)
+        orchestrator = OrchestratorAgent(store, executor=executor, idempotency=IdempotencyCache())
+        command = CommandRequest(command_text="research tide tables", session_id="s1")
+        first = await orchestrator.handle_command(command)
+        repeated = await orchestrator.handle_command(command)
+        await orchestrator.handle_command(CommandRequest(command_text="stop", session_id="s1"))
+        after_stop = await orchestrator.handle_command(command)
+        await executor.stop()
+        return first, repeated, after_stop
+
+    first, repeated, after_stop = asyncio.run(main())
+    assert repeated.job_id == first.job_id
+    assert after_stop.job_id not in (None, first.job_id)
+    assert store.get_job(after_stop.job_id).status == "queued"
@@ -0,0 +1,75 @@
+import asyncio
+import base64
+import io
+
+import pytest
+from fastapi.testclient import TestClient
+from PIL import Image
+from app.utils.images import (InvalidImageError, decode_base64_image, jpeg_quality,
+                              normalize_image, prepare_image, validate_image)
+
+
+def jpeg(size=(800, 600), quality=85):
+    out = io.BytesIO()
+    Image.effect_noise(size, 40).convert("RGB").save(out, "JPEG", quality=quality)
+    return out.getvalue()
+
+
+def test_quality_is_read_from_the_quantization_table():
+    for quality in (50, 85, 95):
+        with Image.open(io.BytesIO(jpeg(quality=quality))) as img:
+            assert jpeg_quality(img) == quality
+
+
+def test_small_jpeg_at_target_quality_passes_through():
+    image = jpeg(quality=80)
+    assert normalize_image(image) == (image, None)
+
+
+def test_high_quality_jpeg_inside_the_frame_is_reencoded():
+    image = jpeg(quality=95)
+    out, size = normalize_image(image)
+    assert size == (800, 600) and len(out) < len(image)
+
+
+def test_large_image_is_downscaled_to_cover_the_frame():
+    out = asyncio.run(prepare_image(jpeg(size=(4000, 3000)), "16:9"))
+    with Image.open(io.BytesIO(out)) as img:
+        assert img.size == (2048, 1536)
+
+
+def test_truncated_image_is_rejected():
+    image = jpeg()
+    with pytest.raises(InvalidImageError):
+        validate_image(image[:len(image) // 2])
+    with pytest.raises(InvalidImageError):
+        validate_image(b"\xff\xd8" + b"x" * 9000)
+
+
+def test_base64_must_be_valid():
+    image = jpeg()
+    wrapped = base64.encodebytes(image).decode()
+    assert decode_base64_image("data:image/jpeg;base64," + wrapped) == image
+    with pytest.raises(InvalidImageError):
+        decode_base64_image("not base64!")
+
+
+def test_upload_of_undecodable_image_is_a_400():
+    from app.main import app
+
+    with TestClient(app) as client:
+        response = client.post("/v1/command/upload?command_text=imagine%20a%20cat",
+                               content=b"\xff\xd8" + b"x" * 20000,
+                               headers={"Content-Type": "image/jpeg"})
+    assert response.status_code == 400
+
+
+def test_rotated_phone_photo_keeps_its_displayed_shape():
+    # Stored landscape, displayed portrait (EXIF orientation 6)
+    exif = Image.Exif()
+    exif[0x0112] = 6
+    out = io.BytesIO()
+    Image.effect_noise((4000, 3000), 40).convert("RGB").save(out, "JPEG", quality=90, exif=exif)
+    result, size = normalize_image(out.getvalue(), "16:9")
+    with Image.open(io.BytesIO(result)) as img:
+        assert img.size == size == (2048, 2731)
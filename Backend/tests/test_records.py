@@ -0,0 +1,74 @@
+from app.models import Job, MAX_JOB_EVENTS, SUMMARY_ANSWER_CHARS
+from app.records import JobRecord, JobStatus, JobType
+
+
+def test_event_ring_keeps_the_newest_events(make_job):
+    job = make_job()
+    for n in range(MAX_JOB_EVENTS + 5):
+        job.add_event("info", f"step {n}")
+    assert len(job.events) == MAX_JOB_EVENTS
+    assert job.events[0].seq == 6 and job.last_seq == MAX_JOB_EVENTS + 5
+    assert [e.seq for e in job.events_since(job.last_seq - 2)] == [job.last_seq - 1, job.last_seq]
+    assert job.events_since(job.last_seq) == []
+    # A reader that fell behind the ring gets whatever is still retained
+    assert len(job.events_since(1)) == MAX_JOB_EVENTS
+
+
+def test_snapshot_does_not_share_the_ring(make_job):
+    job = make_job()
+    job.add_event("info", "started")
+    copy = job.snapshot()
+    copy.add_event("info", "only on the copy")
+    copy.status = JobStatus.RUNNING
+    assert [e.message for e in job.events] == ["started"]
+    assert job.status == JobStatus.QUEUED
+
+
+def test_repeated_polls_only_update_the_heartbeat(make_job):
+    job = make_job(status=JobStatus.RUNNING)
+    assert job.beat("pending", 2)
+    assert not job.beat("pending", 4)
+    assert not job.beat("pending", 6)
+    assert job.beat("running", 8)
+    assert [e.message for e in job.events] == ["Provider status: pending", "Provider status: running"]
+    heartbeat = job.heartbeat
+    assert (heartbeat.provider_status, heartbeat.elapsed_seconds, heartbeat.polls) == ("running", 8, 4)
+
+
+def test_heartbeat_is_stored_with_the_job(store, make_job):
+    job = store.create_job(make_job(status=JobStatus.RUNNING))
+    job.beat("pending", 2)
+    job.beat("pending", 4)
+    store.save_job(job)
+    stored = store.get_job(job.job_id)
+    assert (stored.heartbeat.polls, stored.heartbeat.elapsed_seconds) == (2, 4)
+    assert stored.heartbeat is not job.heartbeat
+    assert len(stored.events) == 1
+
+
+def test_summary_only_keeps_text_answers(make_job):
+    job = make_job(status=JobStatus.SUCCEEDED)
+    job.result = {"structured_result": {"answer": {"unexpected": "dict"}}, "markdown_result": "# Tides"}
+    assert job.summary().answer == "# Tides"
+    job.result = {"structured_result": {"answer": ["list"]}, "markdown_result": 42}
+    assert job.summary().answer is None
+    job.result = {"structured_result": {"answer": "x" * (SUMMARY_ANSWER_CHARS + 10)}}
+    answer = job.summary().answer
+    assert len(answer) == SUMMARY_ANSWER_CHARS and answer.endswith("…")
+
+
+def test_creative_summary_uses_the_first_image(make_job):
+    job = make_job(type=JobType.CREATIVE, status=JobStatus.SUCCEEDED)
+    job.result = {"generated_urls": ["https://img/1.png", "https://img/2.png"]}
+    summary = job.summary()
+    assert (summary.type, summary.thumbnail_url, summary.answer) == ("creative", "https://img/1.png", None)
+
+
+def test_records_round_trip_through_the_api_model(make_job):
+    job = make_job(status=JobStatus.RUNNING)
+    job.add_event("info", "started", {"step": 1})
+    job.beat("pending", 3)
+    job.provider_task_id = "yt-1"
+    copy = JobRecord.from_model(Job(**job.to_dict()))
+    assert copy.to_dict() == job.to_dict()
+    assert copy.status is JobStatus.RUNNING and copy.type is JobType.RESEARCH
@@ -0,0 +1,84 @@
+import asyncio
+import time
+
+import pytest
+from app.research_cache import ResearchCache
+
+
+def test_identical_queries_share_one_task():
+    cache = ResearchCache()
+    created = []
+
+    async def create():
+        created.append(True)
+        await asyncio.sleep(0.01)
+        return {"id": "yt-1"}
+
+    async def main():
+        key = cache.key("  Tide Tables?", "UTC")
+        assert key == cache.key("tide   tables", "UTC")
+        return await asyncio.gather(cache.join(key, create), cache.join(key, create))
+
+    assert asyncio.run(main()) == [({"id": "yt-1"}, False), ({"id": "yt-1"}, True)]
+    assert len(created) == 1
+
+
+def test_task_is_forgotten_once_every_job_leaves():
+    cache = ResearchCache()
+    key = cache.key("tides", "UTC")
+
+    async def create():
+        return {"id": "yt-1"}
+
+    async def main():
+        await cache.join(key, create)
+        await cache.join(key, create)
+        cache.leave(key, "yt-1")
+        _, coalesced = await cache.join(key, create)
+        assert coalesced
+        cache.leave(key, "yt-1")
+        cache.leave(key, "yt-1")
+        return await cache.join(key, lambda: asyncio.sleep(0, {"id": "yt-2"}))
+
+    assert asyncio.run(main()) == ({"id": "yt-2"}, False)
+
+
+def test_failed_creation_is_shared_but_not_kept():
+    cache = ResearchCache()
+    key = cache.key("tides", "UTC")
+    release = None
+
+    async def fail():
+        await release.wait()
+        raise RuntimeError("Yutori down")
+
+    async def main():
+        nonlocal release
+        release = asyncio.Event()
+        owner = asyncio.ensure_future(cache.join(key, fail))
+        await asyncio.sleep(0)
+        joiner = asyncio.ensure_future(cache.join(key, fail))
+        await asyncio.sleep(0)
+        release.set()
+        with pytest.raises(RuntimeError):
+            await owner
+        assert await joiner == ({"error": True, "message": "Yutori down"}, True)
+        return await cache.join(key, lambda: asyncio.sleep(0, {"id": "yt-2"}))
+
+    assert asyncio.run(main()) == ({"id": "yt-2"}, False)
+
+
+def test_results_expire_and_are_bounded():
+    cache = ResearchCache(ttl=0.05, max_entries=2)
+    for n in range(3):
+        cache.put(("q", str(n)), {"answer": n})
+    assert cache.get(("q", "0")) is None
+    assert cache.get(("q", "2")) == {"answer": 2}
+    time.sleep(0.06)
+    assert cache.get(("q", "2")) is None
+
+
+def test_zero_ttl_disables_result_caching():
+    cache = ResearchCache(ttl=0)
+    cache.put(("q", "0"), {"answer": 0})
+    assert cache.get(("q", "0")) is None
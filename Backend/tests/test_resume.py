@@ -0,0 +1,152 @@
+import asyncio
+from datetime import datetime, timedelta
+
+import pytest
+from app.executor import JobExecutor
+from app.leases import JobLeases
+from app.models import CommandRequest
+from app.orchestrator import OrchestratorAgent
+from app.records import JobStatus, JobType
+from app.sqlite_store import SqliteJobStore
+
+
+class Process:
+    """One server process: its own store connection, queue and leases."""
+
+    def __init__(self, path, name, max_queue=100):
+        self.store = SqliteJobStore(path)
+        # No workers: submitted jobs stay queued where the test can see them
+        self.executor = JobExecutor({"research": 0, "creative": 0}, max_queue=max_queue)
+        self.leases = JobLeases(self.store, ttl=60, owner=name)
+        self.orchestrator = OrchestratorAgent(self.store, executor=self.executor, leases=self.leases)
+
+    def research(self, query):
+        request = CommandRequest(command_text=f"research {query}", session_id=f"{query}-session")
+        job_id = asyncio.run(self.orchestrator.handle_command(request)).job_id
+        # Commit now rather than on the next group commit, so the other process sees it
+        self.store.flush()
+        return job_id
+
+    def queued(self, job_type="research"):
+        return self.executor.queue_depth(job_type)
+
+
+@pytest.fixture
+def processes(tmp_path):
+    path = str(tmp_path / "jobs.db")
+    running = [Process(path, "a"), Process(path, "b")]
+    yield running
+    for process in running:
+        process.store.close()
+
+
+def change(store, job_id, **fields):
+    def apply(job):
+        for name, value in fields.items():
+            setattr(job, name, value)
+        return True
+    store.modify_job(job_id, apply)
+    store.flush()
+
+
+def expire(store, job_id):
+    change(store, job_id, lease_expires_at=datetime.utcnow() - timedelta(seconds=1))
+
+
+def test_jobs_of_a_live_process_are_left_alone(processes):
+    a, b = processes
+    job_id = a.research("tides")
+    assert b.orchestrator.resume_jobs() == 0
+    assert b.queued() == 0
+    assert b.store.get_job(job_id).owner == "a"
+
+
+def test_expired_lease_is_taken_over_once(processes):
+    a, b = processes
+    job_id = a.research("tides")
+    expire(b.store, job_id)
+
+    assert b.orchestrator.resume_jobs() == 1
+    assert b.queued() == 1
+    assert b.store.get_job(job_id).owner == "b"
+    # Resuming again does not queue it twice
+    assert b.orchestrator.resume_jobs() == 0
+    # The old owner finds out on its next renewal and stops renewing
+    assert a.leases.renew() == 0
+    assert b.leases.renew() == 1
+
+
+def test_only_one_process_wins_a_claim(processes):
+    a, b = processes
+    job_id = a.research("tides")
+    expire(a.store, job_id)
+    seen_by_a, seen_by_b = a.store.get_job(job_id), b.store.get_job(job_id)
+    assert b.leases.claim(seen_by_b)
+    assert not a.leases.claim(seen_by_a)
+
+
+def test_agent_writes_keep_the_new_owner(processes):
+    a, b = processes
+    job_id = a.research("tides")
+    working_copy = a.store.get_job(job_id)
+    expire(b.store, job_id)
+    b.orchestrator.resume_jobs()
+
+    working_copy.add_event("info", "late poll")
+    a.store.save_job(working_copy)
+    assert b.store.get_job(job_id).owner == "b"
+
+
+def test_shutdown_hands_jobs_over_immediately(processes):
+    a, b = processes
+    job_id = a.research("tides")
+    asyncio.run(a.leases.stop())
+    a.store.flush()
+    assert b.orchestrator.resume_jobs() == 1
+    assert b.store.get_job(job_id).owner == "b"
+
+
+def test_resume_paths(processes):
+    a, b = processes
+    polling = a.research("polling")
+    change(a.store, polling, provider_task_id="yt-1")
+    # A creative job whose image was lost with the old process
+    creative = a.research("creative")
+    change(a.store, creative, type=JobType.CREATIVE)
+    for job_id in (polling, creative):
+        expire(a.store, job_id)
+
+    assert b.orchestrator.resume_jobs() == 1
+    assert b.queued("research") == 1
+    failed = b.store.get_job(creative)
+    assert failed.status == JobStatus.FAILED
+    assert failed.error == {"message": "Job interrupted by server restart"}
+
+
+def test_job_that_does_not_fit_is_handed_back(tmp_path):
+    path = str(tmp_path / "jobs.db")
+    a, b = Process(path, "a"), Process(path, "b", max_queue=0)
+    try:
+        job_id = a.research("tides")
+        expire(a.store, job_id)
+        assert b.orchestrator.resume_jobs() == 0
+        job = b.store.get_job(job_id)
+        assert job.status == JobStatus.QUEUED
+        assert (job.owner, job.lease_expires_at) == ("b", None)
+    finally:
+        a.store.close()
+        b.store.close()
+
+
+def test_drain_waits_for_running_jobs(make_job):
+    async def main():
+        executor = JobExecutor({"research": 1})
+        release = asyncio.Event()
+        executor.submit(make_job(), release.wait)
+        await asyncio.sleep(0)
+        assert not await executor.drain(timeout=0.01)
+        asyncio.get_running_loop().call_later(0.01, release.set)
+        assert await executor.drain(timeout=1)
+        await executor.stop()
+
+    asyncio.run(main())
@@ -0,0 +1,75 @@
+import asyncio
+import pytest
+from prometheus_client import REGISTRY
+from app.records import JobStatus, SessionRecord
+from app.retention import RetentionPolicy, RetentionSweeper
+from app.sqlite_store import SqliteJobStore
+from conftest import finish
+
+single_stores = pytest.mark.parametrize("store", ["memory", "sqlite"], indirect=True)
+
+
+@single_stores
+def test_max_jobs_evicts_oldest_finished_jobs_only(store, make_job):
+    running = [store.create_job(make_job()) for _ in range(3)]
+    finished = [finish(store, store.create_job(make_job())) for _ in range(3)]
+
+    assert store.evict_expired(max_jobs=4) == {("job", "max_jobs"): 2}
+
+    assert store.get_job(finished[0].job_id) is None
+    assert store.get_job(finished[1].job_id) is None
+    assert store.get_job(finished[2].job_id) is not None
+    assert all(store.get_job(job.job_id) is not None for job in running)
+
+
+@single_stores
+def test_eviction_is_bounded_by_batch_size(store, make_job):
+    for _ in range(5):
+        finish(store, store.create_job(make_job()))
+
+    assert store.evict_expired(max_jobs=0, batch_size=2) == {("job", "max_jobs"): 2}
+    assert store.evict_expired(max_jobs=0, batch_size=2) == {("job", "max_jobs"): 2}
+    assert store.evict_expired(max_jobs=0, batch_size=2) == {("job", "max_jobs"): 1}
+    assert store.evict_expired(max_jobs=0, batch_size=2) == {}
+
+
+def test_max_age_keeps_unfinished_jobs(store, make_job):
+    running = store.create_job(make_job())
+    finished = finish(store, store.create_job(make_job()))
+
+    assert store.evict_expired(terminal_max_age=0) == {("job", "max_age"): 1}
+    assert store.get_job(finished.job_id) is None
+    assert store.get_job(running.job_id) is not None
+
+
+def test_idle_sessions_with_an_active_job_are_kept(store, make_job):
+    active = store.create_job(make_job(session_id="busy"))
+    store.update_session(SessionRecord(session_id="busy", active_job_id=active.job_id))
+    store.update_session(SessionRecord(session_id="idle"))
+
+    assert store.evict_expired(session_idle_ttl=0) == {("session", "idle"): 1}
+    assert store.get_session("busy") is not None
+    assert store.get_session("idle") is None
+
+
+def test_sqlite_job_count_is_kept_without_recounting(tmp_path, make_job):
+    store = SqliteJobStore(str(tmp_path / "jobs.db"), count_refresh=3600)
+    try:
+        assert store.job_count() == 0
+        jobs = [store.create_job(make_job()) for _ in range(3)]
+        finish(store, jobs[0])
+        assert store.job_count() == 3
+        store.evict_expired(max_jobs=0)
+        assert store.job_count() == 2
+    finally:
+        store.close()
+
+
+def test_sweeper_reports_jobs_over_the_cap(store, make_job):
+    for _ in range(3):
+        store.create_job(make_job(status=JobStatus.RUNNING))
+    sweeper = RetentionSweeper(store, RetentionPolicy(max_jobs=2, terminal_max_age=None,
+                                                      session_idle_ttl=None))
+
+    assert asyncio.run(sweeper.sweep()) == 0
+    assert REGISTRY.get_sample_value("sixseven_store_jobs") == 3
@@ -0,0 +1,133 @@
+import asyncio
+import time
+
+from app.scheduler import PollPolicy, PollScheduler
+
+FAST = PollPolicy(initial=0.01, max_interval=0.02, jitter=0)
+SLOW = PollPolicy(initial=30, max_interval=30, jitter=0)
+
+
+def done_after(polls):
+    return lambda result: result if result["n"] >= polls else None
+
+
+def counting_fetch(calls, key="task"):
+    async def fetch():
+        calls[key] = calls.get(key, 0) + 1
+        return {"n": calls[key]}
+    return fetch
+
+
+def test_jobs_waiting_on_one_task_share_its_polls():
+    calls = {}
+
+    async def main():
+        scheduler = PollScheduler(max_qps=100)
+        fetch = counting_fetch(calls)
+        results = await asyncio.gather(
+            scheduler.poll("freepik", "t1", fetch, done_after(3), lambda: False, FAST),
+            scheduler.poll("freepik", "t1", fetch, done_after(3), lambda: False, FAST))
+        assert scheduler.outstanding == 0
+        await scheduler.stop()
+        return results
+
+    assert asyncio.run(main()) == [{"n": 3}, {"n": 3}]
+    assert calls == {"task": 3}
+
+
+def test_polls_are_capped_at_max_qps():
+    calls = {}
+
+    async def main():
+        scheduler = PollScheduler(max_qps=50)
+        started = time.monotonic()
+        await asyncio.gather(*(
+            scheduler.poll("perplexity", str(n), counting_fetch(calls, n), done_after(1), lambda: False, FAST)
+            for n in range(60)))
+        elapsed = time.monotonic() - started
+        await scheduler.stop()
+        return elapsed
+
+    # A full bucket covers the first 50; the other 10 wait for refills at 50/s
+    assert asyncio.run(main()) >= 0.15
+    assert len(calls) == 60
+
+
+def test_wake_polls_immediately_even_before_registration():
+    calls = {}
+
+    async def main():
+        scheduler = PollScheduler(max_qps=100)
+        fetch = counting_fetch(calls)
+
+        assert not scheduler.wake("freepik", "early")
+        early = await asyncio.wait_for(
+            scheduler.poll("freepik", "early", fetch, done_after(1), lambda: False, SLOW), timeout=1)
+
+        waiting = asyncio.ensure_future(
+            scheduler.poll("freepik", "late", fetch, done_after(2), lambda: False, SLOW))
+        await asyncio.sleep(0.01)
+        assert scheduler.wake("freepik", "late")
+        late = await asyncio.wait_for(waiting, timeout=1)
+        await scheduler.stop()
+        return early, late
+
+    assert asyncio.run(main()) == ({"n": 1}, {"n": 2})
+
+
+def test_cancelled_job_stops_waiting():
+    cancelled = []
+
+    async def main():
+        scheduler = PollScheduler(max_qps=100, cancel_check_interval=0.01)
+        waiting = asyncio.ensure_future(scheduler.poll(
+            "freepik", "t1", counting_fetch({}), done_after(99), lambda: bool(cancelled), SLOW))
+        await asyncio.sleep(0.02)
+        cancelled.append(True)
+        result = await asyncio.wait_for(waiting, timeout=1)
+        assert scheduler.outstanding == 0
+        await scheduler.stop()
+        return result
+
+    assert asyncio.run(main()) == {"error": True, "message": "Task cancelled"}
+
+
+def test_failing_cancel_check_does_not_stop_polling():
+    calls = {}
+
+    def locked():
+        raise RuntimeError("database is locked")
+
+    async def main():
+        scheduler = PollScheduler(max_qps=100, cancel_check_interval=0.01)
+        results = await asyncio.wait_for(asyncio.gather(
+            scheduler.poll("freepik", "t1", counting_fetch(calls, "t1"), done_after(3), locked, FAST),
+            scheduler.poll("freepik", "t2", counting_fetch(calls, "t2"), done_after(3), lambda: False, FAST)),
+            timeout=1)
+        assert not scheduler._runner.done()
+        await scheduler.stop()
+        return results
+
+    assert asyncio.run(main()) == [{"n": 3}, {"n": 3}]
+
+
+def test_loop_survives_an_unexpected_error():
+    calls = {}
+
+    async def main():
+        scheduler = PollScheduler(max_qps=100, cancel_check_interval=0.01)
+        acquire = scheduler._acquire_token
+        failures = [RuntimeError("clock went backwards")]
+
+        async def flaky():
+            if failures:
+                raise failures.pop()
+            await acquire()
+
+        scheduler._acquire_token = flaky
+        result = await asyncio.wait_for(scheduler.poll(
+            "freepik", "t1", counting_fetch(calls), done_after(1), lambda: False, FAST), timeout=1)
+        await scheduler.stop()
+        return result
+
+    assert asyncio.run(main()) == {"n": 1}
@@ -0,0 +1,98 @@
+import pytest
+from app.records import JobStatus
+from app.sqlite_store import SqliteJobStore
+from app.store import JobConflictError
+
+
+@pytest.fixture
+def path(tmp_path):
+    return str(tmp_path / "jobs.db")
+
+
+@pytest.fixture
+def two_processes(path):
+    """Two stores on one file, as two worker processes would have."""
+    first, second = SqliteJobStore(path), SqliteJobStore(path)
+    yield first, second
+    first.close()
+    second.close()
+
+
+def test_cancel_from_another_process_is_seen_and_kept(two_processes, make_job):
+    runner, canceller = two_processes
+    job = make_job()
+    job.status = JobStatus.RUNNING
+    job.add_event("info", "started")
+    runner.create_job(job)
+    runner.flush()
+
+    _, cancelled = canceller.modify_job(job.job_id, lambda j: j.cancel("stop"))
+    canceller.flush()
+    assert cancelled
+    assert runner.is_cancelled(job.job_id)
+
+    # The runner's copy is stale: the version check in SQL rejects it...
+    job.add_event("info", "poll")
+    with pytest.raises(JobConflictError) as conflict:
+        runner.update_job(job)
+    assert conflict.value.current.cancelled
+
+    # ...and save_job merges the cancel instead of overwriting it
+    runner.save_job(job)
+    runner.flush()
+    stored = canceller.get_job(job.job_id)
+    assert stored.status == JobStatus.CANCELLED
+    assert [(e.seq, e.message) for e in stored.events] == [(1, "started"), (2, "stop"), (3, "poll")]
+
+
+def test_events_are_appended_once_and_survive_reopen(path, make_job):
+    store = SqliteJobStore(path)
+    job = make_job()
+    store.create_job(job)
+    for n in range(3):
+        job.add_event("info", f"step {n}")
+        store.save_job(job)
+    store.close()
+
+    reopened = SqliteJobStore(path)
+    try:
+        stored = reopened.get_job(job.job_id)
+        assert [e.seq for e in stored.events] == [1, 2, 3]
+        assert stored.version == 3
+        stored.add_event("info", "step 3")
+        reopened.save_job(stored)
+        assert [e.seq for e in reopened.get_job(job.job_id).events] == [1, 2, 3, 4]
+    finally:
+        reopened.close()
+
+
+def test_summaries_are_served_from_the_summary_column(path, make_job):
+    store = SqliteJobStore(path)
+    try:
+        job = store.create_job(make_job())
+        job.status = JobStatus.SUCCEEDED
+        job.result = {"structured_result": {"answer": "42"}}
+        store.update_job(job)
+        [summary] = store.list_job_summaries(session_id="s1")
+        assert (summary.job_id, summary.status, summary.answer) == (job.job_id, "succeeded", "42")
+    finally:
+        store.close()
+
+
+def test_writes_that_change_nothing_release_the_write_lock(two_processes, make_job):
+    first, second = two_processes
+    job = first.create_job(make_job())
+    first.flush()
+    stale = second.get_job(job.job_id)
+    first.update_job(first.get_job(job.job_id))
+    first.flush()
+
+    # A lost compare-and-set and an eviction sweep with nothing to evict
+    with pytest.raises(JobConflictError):
+        second.update_job(stale)
+    second.evict_expired(terminal_max_age=3600, session_idle_ttl=3600)
+    assert not second.conn.in_transaction
+
+    # The other process can still write without waiting for a lock
+    first.conn.execute("PRAGMA busy_timeout = 100")
+    assert first.update_job(first.get_job(job.job_id)).version == 2
@@ -0,0 +1,124 @@
+from datetime import datetime
+
+import pytest
+from app.records import JobStatus, JobType, SessionRecord
+from app.store import JobConflictError, JobNotFoundError, decode_cursor, encode_cursor
+
+from conftest import finish
+
+
+def test_update_job_rejects_a_stale_version(store, make_job):
+    job = store.create_job(make_job())
+    first, second = store.get_job(job.job_id), store.get_job(job.job_id)
+
+    first.status = JobStatus.RUNNING
+    store.update_job(first)
+    assert first.version == second.version + 1
+
+    second.status = JobStatus.FAILED
+    with pytest.raises(JobConflictError) as conflict:
+        store.update_job(second)
+    assert conflict.value.current.status == JobStatus.RUNNING
+    assert store.get_job(job.job_id).status == JobStatus.RUNNING
+
+
+def test_save_job_merges_a_concurrent_cancel(store, make_job):
+    job = make_job(status=JobStatus.RUNNING)
+    job.add_event("info", "started")
+    store.create_job(job)
+    running = store.get_job(job.job_id)
+
+    _, written = store.modify_job(job.job_id, lambda j: j.cancel("Cancelled by user"))
+    assert written
+
+    running.add_event("info", "polled")
+    running.status = JobStatus.SUCCEEDED
+    saved = store.save_job(running)
+    assert saved.cancelled and saved.status == JobStatus.CANCELLED
+    stored = store.get_job(job.job_id)
+    assert stored.status == JobStatus.CANCELLED
+    assert [(e.seq, e.message) for e in stored.events] == [
+        (1, "started"), (2, "Cancelled by user"), (3, "polled")]
+
+
+def test_modify_job_leaves_finished_jobs_alone(store, make_job):
+    job = store.create_job(make_job())
+    finish(store, job)
+    stored, written = store.modify_job(job.job_id, lambda j: j.cancel("too late"))
+    assert not written
+    assert stored.status == JobStatus.SUCCEEDED
+    assert not store.is_cancelled(job.job_id)
+
+
+def test_evicted_job_is_not_resurrected(store, make_job):
+    job = store.create_job(make_job())
+    held = store.get_job(job.job_id)
+    finish(store, store.get_job(job.job_id))
+    store.evict_expired(max_jobs=0)
+    assert store.get_job(job.job_id) is None
+
+    held.add_event("info", "late write")
+    with pytest.raises(JobNotFoundError):
+        store.update_job(held)
+    with pytest.raises(JobNotFoundError):
+        store.save_job(held)
+    assert store.modify_job(job.job_id, lambda j: True) == (None, False)
+    assert store.get_job(job.job_id) is None
+
+
+def test_get_job_hands_out_snapshots(store, make_job):
+    job = store.create_job(make_job())
+    copy = store.get_job(job.job_id)
+    copy.add_event("info", "local only")
+    copy.status = JobStatus.RUNNING
+    stored = store.get_job(job.job_id)
+    assert stored.status == JobStatus.QUEUED
+    assert list(stored.events) == []
+
+
+def test_sessions_are_copied_in_and_out(store):
+    session = SessionRecord("s1", active_job_id="j1")
+    store.update_session(session)
+    session.active_job_id = "changed by caller"
+
+    stored = store.get_session("s1")
+    assert stored.active_job_id == "j1"
+    stored.active_job_id = "changed by reader"
+    assert store.get_session("s1").active_job_id == "j1"
+
+
+def test_cursor_pages_cover_every_job_once(store, make_job):
+    for n in range(5):
+        store.create_job(make_job(query=f"q{n}"))
+    store.create_job(make_job(session_id="s2"))
+
+    pages, before = [], None
+    while True:
+        page = store.list_jobs(session_id="s1", limit=2, before=before)
+        if not page:
+            break
+        pages.append([job.job_id for job in page])
+        before = decode_cursor(encode_cursor(page[-1].created_at, page[-1].job_id))
+
+    everything = [job.job_id for job in store.list_jobs(session_id="s1", limit=100)]
+    assert [len(page) for page in pages] == [2, 2, 1]
+    assert sum(pages, []) == everything
+    assert [job.input.query_or_prompt for job in store.list_jobs(session_id="s1", limit=1)] == ["q4"]
+
+
+def test_filters_and_updated_since(store, make_job):
+    jobs = [store.create_job(make_job(query=f"q{n}")) for n in range(3)]
+    creative = store.create_job(make_job(type=JobType.CREATIVE))
+    since = datetime.utcnow()
+    finish(store, jobs[0])
+
+    assert [j.job_id for j in store.list_jobs(type="creative")] == [creative.job_id]
+    assert [j.job_id for j in store.list_jobs(status="succeeded")] == [jobs[0].job_id]
+    assert [j.job_id for j in store.list_jobs(session_id="s1", updated_since=since)] == [jobs[0].job_id]
+    [summary] = store.list_job_summaries(status="succeeded")
+    assert summary.job_id == jobs[0].job_id
+
+
+def test_malformed_cursor_is_rejected():
+    with pytest.raises(ValueError):
+        decode_cursor("not-a-cursor")
@@ -0,0 +1,92 @@
+import asyncio
+import json
+
+from app.records import JobStatus
+from app.streaming import JobEventStream, sse_stream
+
+
+async def never_disconnected():
+    return False
+
+
+def parse(chunk):
+    event, data = chunk.strip().split("\n")
+    return event[len("event: "):], json.loads(data[len("data: "):])
+
+
+def stream_job(stream, job):
+    return sse_stream(stream, lambda: stream.subscribe_job(job), never_disconnected)
+
+
+def test_nothing_is_subscribed_until_the_stream_starts(make_job):
+    stream = JobEventStream()
+    job = make_job()
+
+    async def main():
+        body = stream_job(stream, job)
+        assert stream._job_subs == {}
+        # A client that goes away before the first chunk leaves nothing behind
+        await body.aclose()
+        assert stream._job_subs == {}
+
+        body = stream_job(stream, job)
+        await body.__anext__()
+        assert len(stream._job_subs[job.job_id]) == 1
+        await body.aclose()
+        assert stream._job_subs == {}
+
+    asyncio.run(main())
+
+
+def test_finished_job_gets_snapshot_then_done(make_job):
+    stream = JobEventStream()
+    job = make_job(status=JobStatus.SUCCEEDED)
+    job.add_event("info", "finished")
+
+    async def main():
+        return [parse(chunk) async for chunk in stream_job(stream, job)]
+
+    (snapshot_event, snapshot), done = asyncio.run(main())
+    assert snapshot_event == "snapshot"
+    assert snapshot["status"] == "succeeded"
+    assert [e["message"] for e in snapshot["events"]] == ["finished"]
+    assert done == ("done", {"job_id": job.job_id, "status": "succeeded"})
+    assert stream._job_subs == {}
+
+
+def test_running_job_streams_only_deltas(make_job):
+    stream = JobEventStream()
+    job = make_job(status=JobStatus.RUNNING)
+    job.add_event("info", "started")
+
+    async def main():
+        body = stream_job(stream, job)
+        chunks = [parse(await body.__anext__())]
+        job.add_event("info", "halfway")
+        stream.on_job_update(job)
+        job.status = JobStatus.SUCCEEDED
+        stream.on_job_update(job)
+        chunks += [parse(chunk) async for chunk in body]
+        return chunks
+
+    chunks = asyncio.run(main())
+    assert [event for event, _ in chunks] == ["snapshot", "job_event", "status", "done"]
+    assert chunks[1][1]["message"] == "halfway"
+    assert chunks[2][1]["status"] == "succeeded"
+
+
+def test_slow_client_is_dropped(make_job):
+    stream = JobEventStream(max_queue=2)
+    job = make_job(status=JobStatus.RUNNING)
+
+    async def main():
+        body = stream_job(stream, job)
+        await body.__anext__()
+        for n in range(3):
+            job.add_event("info", f"step {n}")
+            stream.on_job_update(job)
+        assert stream._job_subs == {}
+        return [chunk async for chunk in body]
+
+    # The backlog is discarded and the stream ends so the client reconnects
+    assert asyncio.run(main()) == []